@@ -0,0 +1,408 @@
+"""
+Sleeping Beauty Pipeline
+
+Single entry point for the pipeline, driven by a TOML config file
+(sb.toml next to this script unless --config is given):
+
+    ingest     citations_indexed.jsonl.gz -> CSR citation graph
+    curves     citation graph -> per-year citation matrix
+    identify   metrics table with candidate flags, slope fits and
+               field-normalized early / late scores
+    export     candidate CSVs, packed candidate curves, trajectory plots,
+               dashboard tiles
+
+Each command runs the stages it depends on first. Those read their
+artifacts from the cache (sb_cache.py) and rebuild them only when the KG
+files or the stage's settings changed, so `sb.py export` after a config
+edit repeats just the stages affected by it. Pipeline modules (and with
+them numpy / pandas / pyarrow) are imported inside the stages; importing
+this file does no work.
+
+Usage:
+    python sb.py [--config sb.toml] [--set section.key=value ...] \\
+                 [--shards N] [--report run.json] {ingest,curves,identify,export}
+"""
+
+import argparse
+import copy
+import time
+import tomllib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sb_instrument import Instrumentation
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+CONFIG_FILE = Path(__file__).resolve().parent / "sb.toml"
+
+# Every key a config file may set; 0 / "" mean "derive from the data"
+DEFAULT_CONFIG = {
+    "paths": {
+        "kg": "/root/.openclaw/workspace/astro-ph-kg-full",
+        "output": "/root/.openclaw/workspace/astro-ph-sleeping-beauty/data",
+        "cache": "",            # "" = SB_CACHE_DIR or ~/.cache/astro-ph-sb
+    },
+    "ingest": {
+        "workers": 1,
+    },
+    "curves": {
+        "first_year": 0,        # 0 = earliest publication year
+        "last_year": 0,         # 0 = latest citing year
+    },
+    "identify": {
+        "current_year": 0,      # 0 = latest year in the KG (horizon_year)
+        "early_years": 3,
+        "min_age": 5,
+        "early_end": 5,
+        "late_start": 8,
+        "format": "parquet",
+        "groups": "",           # CSV (paper_idx, concept) for the baseline; "" = per year
+        "min_cohort": 20,
+        "bootstrap": 0,         # replicates for p_sb / intervals (sb_bootstrap); 0 = off
+        "shards": 0,            # metrics in paper_idx shards (sb_shard); 0 = one pass
+        "workers": 0,           # processes for the bootstrap and shards; 0 = all CPUs
+    },
+    "export": {
+        "csv": True,
+        "top": 100,
+        "top_sb": 200,          # rows of top_sb_candidates.csv; 0 = skip
+        "slope_min_age": 10,
+        "curves": "sb_candidate_curves.sbc",  # "" = skip
+        "tiles": False,
+        "tiles_dir": "",        # "" = sb_tiles.TILES_DIR
+        "plots": "",            # "" = skip; .pdf, .png (sprite sheets) or a directory
+        "plot_workers": 0,      # 0 = all CPUs
+        "princes": "",          # "" = skip; CSV of ranked princes per slope SB
+    },
+}
+
+# =============================================================================
+# CONFIG FILES
+# =============================================================================
+
+def _parse_value(text: str):
+    """TOML literal if it parses as one, else the raw string."""
+    try:
+        return tomllib.loads(f"v = {text}")["v"]
+    except tomllib.TOMLDecodeError:
+        return text
+
+
+def load_config(path: Optional[Path] = None, overrides: List[str] = ()) -> Dict:
+    """
+    DEFAULT_CONFIG updated from a TOML file and "section.key=value" overrides.
+
+    Unknown sections or keys raise ValueError, so a typo in the config does
+    not silently fall back to a default.
+    """
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    updates = []
+    path = Path(path) if path else CONFIG_FILE
+    if path.exists():
+        with open(path, "rb") as f:
+            for section, values in tomllib.load(f).items():
+                if not isinstance(values, dict):
+                    raise ValueError(f"{path}: top-level key {section!r} is not a [section]")
+                updates += [(section, key, value) for key, value in values.items()]
+    for item in overrides:
+        name, sep, value = item.partition("=")
+        section, dot, key = name.strip().partition(".")
+        if not sep or not dot:
+            raise ValueError(f"--set expects section.key=value, got {item!r}")
+        updates.append((section, key, _parse_value(value.strip())))
+
+    for section, key, value in updates:
+        if key not in config.get(section, {}):
+            raise ValueError(f"unknown config key {section}.{key}")
+        config[section][key] = value
+    return config
+
+
+# =============================================================================
+# STAGES
+# =============================================================================
+
+class Pipeline:
+    """
+    Runs stages with their dependencies, each at most once per process.
+
+    Stage functions take the pipeline and their sb_instrument StageRecord
+    and return their artifact; they get upstream artifacts through
+    result(). Dependencies run (and are measured) before the stage itself.
+    """
+
+    def __init__(self, config: Dict, run: Optional[Instrumentation] = None):
+        self.config = config
+        self.run = run or Instrumentation("sb")
+        self._results = {}
+        self._cache = None
+
+    @property
+    def kg_path(self) -> Path:
+        return Path(self.config["paths"]["kg"])
+
+    @property
+    def output_dir(self) -> Path:
+        return Path(self.config["paths"]["output"])
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from sb_cache import CACHE_DIR, ArtifactCache
+            self._cache = ArtifactCache(self.config["paths"]["cache"] or CACHE_DIR)
+        return self._cache
+
+    def inputs(self, stage: str) -> List[Path]:
+        """Files a stage reads: the KG files, then the cached upstream artifacts."""
+        from sb_graph import CITATIONS_FILE, YEARS_FILE
+        from sb_index import MAPPING_FILE
+
+        if stage == "ingest":
+            return [self.kg_path / CITATIONS_FILE, self.kg_path / YEARS_FILE]
+        paths = [path for upstream in ("ingest", "curves") if upstream in DEPENDS[stage]
+                 for path in self.cache.entry_files(self._results[upstream][0])]
+        if stage == "identify":
+            paths.append(self.kg_path / MAPPING_FILE)
+        return paths
+
+    def result(self, stage: str):
+        if stage not in self._results:
+            for upstream in DEPENDS[stage]:
+                self.result(upstream)
+            print(f"\n[{stage}]")
+            start = time.perf_counter()
+            with self.run.stage(stage, paths=self.inputs(stage)) as record:
+                self._results[stage] = STAGES[stage](self, record)
+            print(f"    done in {time.perf_counter() - start:.1f}s")
+        return self._results[stage]
+
+
+def ingest(p: Pipeline, stage):
+    """(key, CitationGraph) from the cache, parsing the JSONL on a miss."""
+    from sb_cache import cached_citation_graph
+
+    key, graph = cached_citation_graph(p.cache, p.kg_path, workers=p.config["ingest"]["workers"])
+    stage.records = graph.n_papers
+    print(f"    {graph.n_papers} papers, {len(graph.citations_indices)} citations ({key})")
+    return key, graph
+
+
+def curves(p: Pipeline, stage):
+    """(key, CitationMatrix) built from the ingested graph."""
+    from sb_cache import cached_citation_matrix
+
+    graph_key, graph = p.result("ingest")
+    cfg = p.config["curves"]
+    key, matrix = cached_citation_matrix(p.cache, graph_key, graph,
+                                         cfg["first_year"] or None, cfg["last_year"] or None)
+    stage.records = matrix.counts.shape[0]
+    print(f"    years {matrix.first_year}-{matrix.last_year} ({key})")
+    return key, matrix
+
+
+def identify(p: Pipeline, stage) -> Dict:
+    """Flagged metrics, slope-fit and normalized tables, also written to the output dir."""
+    import numpy as np
+
+    from sb_baseline import cached_baseline, load_groups, normalized_metrics
+    from sb_cache import cache_key, cached_metrics
+    from sb_index import load_paper_index
+    from sb_metrics import SB_CRITERIA, horizon_year
+    from sb_output import add_flag_columns, table_path, write_table
+    from sb_slopes import SLOPES_VERSION, slope_metrics
+
+    graph_key, graph = p.result("ingest")
+    matrix_key, matrix = p.result("curves")
+    cfg = p.config["identify"]
+    years = np.asarray(graph.years)
+    index = load_paper_index(p.kg_path, years=years)
+    current_year = cfg["current_year"] or horizon_year(years)
+
+    if cfg["shards"]:
+        from sb_shard import run_sharded
+
+        metrics = run_sharded(p.kg_path, cfg["shards"], current_year, cfg["workers"] or None,
+                              early_years=cfg["early_years"], min_age=cfg["min_age"]).metrics
+    else:
+        _, metrics = cached_metrics(p.cache, p.kg_path, graph_key, graph, index,
+                                    current_year=current_year, early_years=cfg["early_years"],
+                                    min_age=cfg["min_age"])
+        metrics = add_flag_columns(metrics, SB_CRITERIA)
+
+    key = cache_key("slopes", params={"early_end": cfg["early_end"],
+                                      "late_start": cfg["late_start"]},
+                    upstream=[matrix_key], version=SLOPES_VERSION)
+    slopes = index.join(p.cache.get_or_compute(key, lambda: slope_metrics(
+        matrix, years, np.flatnonzero(graph.has_record),
+        early_end=cfg["early_end"], late_start=cfg["late_start"])))
+    slopes["paper_age"] = current_year - slopes["year"]
+    if cfg["bootstrap"]:
+        from sb_bootstrap import BOOTSTRAP_VERSION, bootstrap_metrics
+
+        key = cache_key("bootstrap", params={"replicates": cfg["bootstrap"],
+                                             "early_end": cfg["early_end"],
+                                             "late_start": cfg["late_start"]},
+                        upstream=[matrix_key], version=BOOTSTRAP_VERSION)
+        boot = p.cache.get_or_compute(key, lambda: bootstrap_metrics(
+            matrix, years, np.flatnonzero(graph.has_record), n_boot=cfg["bootstrap"],
+            early_end=cfg["early_end"], late_start=cfg["late_start"],
+            workers=cfg["workers"] or None))
+        for column in ("p_sb", "slope_ratio_lo", "slope_ratio_hi"):
+            slopes[column] = boot[column].to_numpy()
+
+    groups, labels = (load_groups(Path(cfg["groups"]), graph.n_papers)
+                      if cfg["groups"] else (None, None))
+    _, baseline = cached_baseline(p.cache, matrix_key, matrix, graph, groups, labels,
+                                  min_cohort=cfg["min_cohort"])
+    normalized = index.join(normalized_metrics(
+        matrix, years, baseline, groups, np.flatnonzero(graph.has_record),
+        early_end=cfg["early_end"], late_start=cfg["late_start"]))
+
+    p.output_dir.mkdir(parents=True, exist_ok=True)
+    for stem, df in (("all_papers_metrics", metrics), ("all_papers_slopes", slopes),
+                     ("all_papers_normalized", normalized)):
+        write_table(df, table_path(p.output_dir, stem, cfg["format"]), fmt=cfg["format"])
+    stage.records = len(metrics)
+
+    print(f"    Ages measured against: {current_year}")
+    print(f"    Metrics: {len(metrics)} papers, slope fits: {len(slopes)} papers")
+    print(f"    Baseline: {baseline.n_groups or 'no'} groups, "
+          f"{int(baseline.fallback.sum())} small cohorts pooled")
+    for name in SB_CRITERIA:
+        print(f"    {name:<10} {int(metrics['is_' + name].sum())}")
+    print(f"    {'slope':<10} {int(slopes['is_sb'].sum())}")
+    if "p_sb" in slopes:
+        print(f"    {'p_sb>0.5':<10} {int((slopes['p_sb'] > 0.5).sum())}")
+    return {"metrics": metrics, "slopes": slopes, "normalized": normalized,
+            "baseline": baseline, "index": index, "current_year": current_year}
+
+
+def export(p: Pipeline, stage) -> Dict[str, Path]:
+    """Candidate CSVs, packed candidate curves and (optionally) plots and tiles."""
+    import numpy as np
+
+    from sb_metrics import CANDIDATE_FILES
+    from sb_output import export_csv, flagged_subsets
+
+    ident = p.result("identify")
+    _, matrix = p.result("curves")
+    cfg = p.config["export"]
+    metrics, slopes = ident["metrics"], ident["slopes"]
+    out = p.output_dir
+    written = {}
+
+    subsets = flagged_subsets(metrics, CANDIDATE_FILES)
+    slope_sb = slopes[slopes["is_sb"] & (slopes["paper_age"] >= cfg["slope_min_age"])] \
+        .sort_values("slope_ratio", ascending=False, kind="stable")
+    if cfg["csv"]:
+        for name, (filename, sort_by) in CANDIDATE_FILES.items():
+            written[name] = export_csv(subsets[name], out / filename,
+                                       sort_by=sort_by, ascending=False)
+        written["top"] = export_csv(subsets["sb_ratio"], out / f"top_{cfg['top']}_sb_candidates.csv",
+                                    sort_by="beauty_ratio_est", ascending=False, head=cfg["top"])
+        if cfg["top_sb"]:
+            written["top_sb"] = export_csv(subsets["sb_ratio"], out / "top_sb_candidates.csv",
+                                           sort_by="beauty_ratio_est", ascending=False,
+                                           head=cfg["top_sb"])
+        written["slope"] = export_csv(slope_sb, out / "sb_slope_candidates.csv")
+
+    if cfg["curves"] or cfg["plots"]:
+        from sb_curvepack import from_matrix, save_curves
+
+        # Slope candidates first (by slope ratio), then the other candidates
+        ranked = slope_sb["paper_idx"].to_numpy()
+        others = np.concatenate([s["paper_idx"].to_numpy() for s in subsets.values()])
+        rows = np.concatenate([ranked, np.setdiff1d(others, ranked)]).astype(np.int64)
+        ids = ident["index"].arxiv_ids(rows).astype(object)
+        ids = [a if isinstance(a, str) else f"idx_{r}" for a, r in zip(ids, rows)]
+        candidate_curves = from_matrix(matrix, ids, rows)
+        if cfg["curves"]:
+            written["curves"] = save_curves(candidate_curves, out / cfg["curves"])
+        if cfg["plots"]:
+            from sb_plots import render_trajectories
+
+            pub = ident["index"].year[rows]
+            late = pub + p.config["identify"]["late_start"]
+            written["plots"] = render_trajectories(
+                candidate_curves, out / cfg["plots"], last_year=ident["current_year"],
+                titles=[f"{i} ({y})" for i, y in zip(ids, pub)],
+                marks={"published": pub, "late fit": late},
+                workers=cfg["plot_workers"] or None)
+
+    if cfg["princes"]:
+        from sb_princes import awakening_years, find_princes
+
+        _, graph = p.result("ingest")
+        sb = slope_sb["paper_idx"].to_numpy()
+        princes = find_princes(graph, sb, awakening_years(matrix, ident["index"].year, sb))
+        princes.insert(1, "sb_arxiv_id", ident["index"].arxiv_ids(princes["sb_idx"].to_numpy()))
+        princes.insert(princes.columns.get_loc("prince_idx") + 1, "prince_arxiv_id",
+                       ident["index"].arxiv_ids(princes["prince_idx"].to_numpy()))
+        written["princes"] = export_csv(princes, out / cfg["princes"])
+
+    if cfg["tiles"]:
+        from sb_curvepack import from_matrix
+        from sb_tiles import TILES_DIR, export_tiles, slopes_table
+
+        df = slopes_table(slopes, matrix, ident["index"], min_age=cfg["slope_min_age"])
+        tile_curves = from_matrix(matrix, df["id"].tolist(), df["paper_idx"].to_numpy())
+        written["tiles"] = export_tiles(df, tile_curves, cfg["tiles_dir"] or TILES_DIR)
+
+    stage.records = len(written)
+    for name, path in written.items():
+        print(f"    {name:<8} {path}")
+    return written
+
+
+STAGES: Dict[str, Callable] = {
+    "ingest": ingest,
+    "curves": curves,
+    "identify": identify,
+    "export": export,
+}
+
+DEPENDS = {
+    "ingest": [],
+    "curves": ["ingest"],
+    "identify": ["ingest", "curves"],
+    "export": ["identify", "curves"],
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sb", description="Sleeping beauty pipeline")
+    parser.add_argument("command", choices=list(STAGES),
+                        help="stage to run (its upstream stages run first)")
+    parser.add_argument("--config", type=Path, default=None,
+                        help=f"TOML config file (default: {CONFIG_FILE.name} next to sb.py)")
+    parser.add_argument("--set", action="append", default=[], metavar="SECTION.KEY=VALUE",
+                        help="override a config value, e.g. --set identify.min_age=10")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="compute metrics in this many paper_idx shards "
+                             "(same as --set identify.shards=N)")
+    parser.add_argument("--report", type=Path, default=None,
+                        help="write a JSON report of per-stage time / memory / throughput")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config, args.set)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.shards is not None:
+        config["identify"]["shards"] = args.shards
+
+    pipeline = Pipeline(config, Instrumentation(f"sb-{args.command}"))
+    pipeline.result(args.command)
+
+    print()
+    pipeline.run.print_summary()
+    if args.report:
+        print(f"    Run report: {pipeline.run.write_report(args.report)}")
+    return pipeline
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Field-Normalized Baselines
+
+Expected citations per year for every (publication year, group, age)
+cell, where a group is a concept / subfield label per paper. Each paper's
+curve can then be read as observed / expected, so a paper is not flagged
+just because its subfield or publication year has little citation
+activity (e.g. early-1990s astro-ph, where "early < 5" holds for most
+papers).
+
+The baseline is one grouped reduction over the citation matrix: rows are
+summed into their (publication year, group) cohort chunk by chunk, and
+only the small cohort x year sums are shifted to ages. Cohorts with fewer
+than MIN_COHORT papers fall back to the pooled (all groups) baseline of
+their year, as do papers without a group label. Without group labels the
+baseline is per publication year only.
+
+Normalized scores for the whole corpus are then a gather of each paper's
+expected row plus one vectorized divide; cached_baseline() stores the
+table in the sb_cache artifact cache.
+
+Usage:
+    python sb_baseline.py /path/to/astro-ph-kg-full [groups.csv] [out.csv]
+"""
+
+import hashlib
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sb_cache import ArtifactCache, cache_key
+from sb_curves import CitationMatrix, age_aligned_counts
+from sb_graph import CitationGraph
+from sb_slopes import EARLY_END, LATE_START, SLOPE_FLOOR
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MIN_COHORT = 20          # smaller (year, group) cohorts use the pooled year baseline
+CHUNK_ROWS = 200_000     # matrix rows per grouped reduction
+GROUP_COLUMN = "concept"
+BASELINE_VERSION = 1     # cache version of the stored Baseline (see sb_cache.py)
+
+# =============================================================================
+# DATA STRUCTURES
+# =============================================================================
+
+@dataclass
+class Baseline:
+    """
+    Expected citations at each age for each (publication year, group).
+
+    expected[y, g, a] is for papers published in first_year + y with group
+    code g, at age a; the last group slot (g = n_groups) is the pooled
+    baseline over all papers of the year. NaN marks ages past the horizon.
+    """
+    first_year: int
+    labels: np.ndarray      # (n_groups,) group names
+    n_papers: np.ndarray    # (n_years, n_groups + 1) int64 papers per cohort
+    expected: np.ndarray    # (n_years, n_groups + 1, n_ages) float64
+    fallback: np.ndarray    # (n_years, n_groups) bool, cohort uses the pooled row
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.labels)
+
+    @property
+    def n_ages(self) -> int:
+        return self.expected.shape[2]
+
+    def cohort(self, pub_years: np.ndarray, groups: Optional[np.ndarray] = None):
+        """(year slot, group slot) per paper; unlabeled papers get the pooled slot."""
+        y = np.asarray(pub_years, dtype=np.int64) - self.first_year
+        if groups is None:
+            return y, np.full(len(y), self.n_groups)
+        g = np.asarray(groups, dtype=np.int64)
+        return y, np.where(g < 0, self.n_groups, g)
+
+    def expected_for(self, pub_years: np.ndarray,
+                     groups: Optional[np.ndarray] = None) -> np.ndarray:
+        """(n, n_ages) expected citations per age for the given papers."""
+        return self.expected[self.cohort(pub_years, groups)]
+
+    def frame(self) -> pd.DataFrame:
+        """Long table: pub_year, group, age, n_papers, expected, fallback."""
+        n_years, n_slots, n_ages = self.expected.shape
+        y, g, a = np.meshgrid(np.arange(n_years), np.arange(n_slots), np.arange(n_ages),
+                              indexing="ij")
+        labels = np.append(self.labels.astype(object), "(all)")
+        fallback = np.concatenate([self.fallback, np.zeros((n_years, 1), bool)], axis=1)
+        df = pd.DataFrame({
+            "pub_year": (y + self.first_year).ravel(),
+            "group": labels[g.ravel()],
+            "age": a.ravel(),
+            "n_papers": self.n_papers[y, g].ravel(),
+            "expected": self.expected.ravel(),
+            "fallback": fallback[y, g].ravel(),
+        })
+        return df[(df["n_papers"] > 0) & df["expected"].notna()].reset_index(drop=True)
+
+
+# =============================================================================
+# GROUP LABELS
+# =============================================================================
+
+def groups_from_labels(paper_idx: np.ndarray, labels: Sequence, n_papers: int
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (codes, names) for per-paper labels; codes[p] = -1 for unlabeled papers.
+
+    For papers with several concepts pass the primary one; a paper counts
+    toward exactly one cohort.
+    """
+    codes = np.full(n_papers, -1, dtype=np.int32)
+    values = pd.Series(list(labels), dtype=object)
+    keep = values.notna().to_numpy()
+    cat = pd.Categorical(values[keep])
+    codes[np.asarray(paper_idx)[keep]] = cat.codes
+    return codes, np.asarray(cat.categories, dtype=object)
+
+
+def load_groups(path: Path, n_papers: int, column: str = GROUP_COLUMN):
+    """Group codes from a CSV with paper_idx and a label column."""
+    df = pd.read_csv(path, usecols=["paper_idx", column])
+    return groups_from_labels(df["paper_idx"].to_numpy(), df[column], n_papers)
+
+
+# =============================================================================
+# BASELINE
+# =============================================================================
+
+def build_baseline(matrix: CitationMatrix, pub_years: np.ndarray,
+                   groups: Optional[np.ndarray] = None,
+                   labels: Optional[Sequence[str]] = None,
+                   include: Optional[np.ndarray] = None,
+                   n_ages: Optional[int] = None,
+                   min_cohort: int = MIN_COHORT,
+                   chunk_rows: int = CHUNK_ROWS) -> Baseline:
+    """
+    Baseline from the citation matrix in one grouped pass.
+
+    groups holds a code per paper (-1 = unlabeled) with names in labels.
+    include masks the papers that count toward the baseline (e.g.
+    graph.has_record; papers without a citation record would only add
+    zeros).
+    """
+    pub_years = np.asarray(pub_years, dtype=np.int64)
+    n = matrix.counts.shape[0]
+    first_year = int(pub_years.min())
+    n_years = int(pub_years.max()) - first_year + 1
+    n_ages = n_ages or matrix.last_year - first_year + 1
+    if groups is None:
+        groups = np.full(n, -1, dtype=np.int32)
+        labels = np.zeros(0, dtype=object)
+    labels = np.asarray(labels, dtype=object)
+    n_groups = len(labels)
+    n_slots = n_groups + 1
+
+    # Grouped reduction: calendar-year sums per (year, group) cohort
+    slot = np.where(groups < 0, n_groups, groups)
+    cohort = (pub_years - first_year) * n_slots + slot
+    if include is not None:
+        cohort = np.where(np.asarray(include), cohort, -1)
+    # (rows sorted by cohort and summed with reduceat; ~6x faster than add.at)
+    sums = np.zeros((n_years * n_slots, matrix.n_years), dtype=np.int64)
+    for start in range(0, n, chunk_rows):
+        c = cohort[start:start + chunk_rows]
+        order = np.argsort(c, kind="stable")
+        order = order[c[order] >= 0]
+        if not len(order):
+            continue
+        sorted_c = c[order]
+        firsts = np.flatnonzero(np.r_[True, sorted_c[1:] != sorted_c[:-1]])
+        block = np.asarray(matrix.counts[start:start + chunk_rows])[order]
+        sums[sorted_c[firsts]] += np.add.reduceat(block, firsts, axis=0, dtype=np.int64)
+    sizes = np.bincount(cohort[cohort >= 0], minlength=n_years * n_slots)
+
+    sums = sums.reshape(n_years, n_slots, matrix.n_years)
+    sizes = sizes.reshape(n_years, n_slots)
+    # The pooled slot covers every paper of the year, labeled or not
+    sums[:, n_groups] = sums.sum(axis=1)
+    sizes[:, n_groups] = sizes.sum(axis=1)
+
+    # Shift each year's columns to ages
+    cols = (np.arange(n_years)[:, None] + first_year - matrix.first_year) + np.arange(n_ages)
+    valid = (cols >= 0) & (cols < matrix.n_years)
+    aged = np.take_along_axis(sums, np.clip(cols, 0, matrix.n_years - 1)[:, None, :], axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = aged / sizes[:, :, None]
+    expected[~np.broadcast_to(valid[:, None, :], expected.shape)] = np.nan
+    expected[sizes == 0] = np.nan
+
+    fallback = sizes[:, :n_groups] < min_cohort
+    expected[:, :n_groups][fallback] = expected[:, n_groups][np.nonzero(fallback)[0]]
+    return Baseline(first_year=first_year, labels=labels, n_papers=sizes,
+                    expected=expected, fallback=fallback)
+
+
+def cached_baseline(cache: ArtifactCache, matrix_key: str, matrix: CitationMatrix,
+                    graph: CitationGraph, groups: Optional[np.ndarray] = None,
+                    labels: Optional[Iterable[str]] = None,
+                    min_cohort: int = MIN_COHORT):
+    """(key, Baseline) of expected citations per (year, group, age)."""
+    groups_digest = (hashlib.sha256(np.ascontiguousarray(groups).tobytes()).hexdigest()
+                     if groups is not None else None)
+    key = cache_key("baseline",
+                    params={"groups": groups_digest,
+                            "labels": [] if labels is None else [str(x) for x in labels],
+                            "min_cohort": min_cohort},
+                    upstream=[matrix_key], version=BASELINE_VERSION)
+
+    def compute():
+        b = build_baseline(matrix, graph.years, groups, labels, include=graph.has_record,
+                           min_cohort=min_cohort)
+        return {"first_year": np.array([b.first_year]), "labels": b.labels.astype(str),
+                "n_papers": b.n_papers, "expected": b.expected, "fallback": b.fallback}
+
+    arrays = cache.get_or_compute(key, compute)
+    return key, Baseline(first_year=int(arrays["first_year"][0]),
+                         labels=np.asarray(arrays["labels"], dtype=object),
+                         n_papers=arrays["n_papers"], expected=arrays["expected"],
+                         fallback=arrays["fallback"])
+
+
+# =============================================================================
+# NORMALIZED SCORES
+# =============================================================================
+
+def normalized_curves(matrix: CitationMatrix, pub_years: np.ndarray, baseline: Baseline,
+                      groups: Optional[np.ndarray] = None,
+                      rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """(n, n_ages) observed / expected per age; NaN where nothing is expected."""
+    pub_years = np.asarray(pub_years)
+    if rows is not None:
+        pub_years = pub_years[rows]
+        groups = None if groups is None else np.asarray(groups)[rows]
+    observed, _ = age_aligned_counts(matrix, pub_years, baseline.n_ages, rows=rows)
+    expected = baseline.expected_for(pub_years, groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(expected > 0, observed / expected, np.nan)
+
+
+def normalized_metrics(matrix: CitationMatrix, pub_years: np.ndarray, baseline: Baseline,
+                       groups: Optional[np.ndarray] = None,
+                       rows: Optional[np.ndarray] = None,
+                       early_end: int = EARLY_END, late_start: int = LATE_START,
+                       floor: float = SLOPE_FLOOR) -> pd.DataFrame:
+    """
+    Early / late windows (sb_slopes ages) relative to the baseline.
+
+    early_norm = observed / expected citations over ages [0, early_end),
+    late_norm likewise over [late_start, horizon]; norm_ratio =
+    late_norm / max(early_norm, floor). A paper cited like its cohort
+    scores 1 in both windows.
+    """
+    if rows is None:
+        rows = np.arange(matrix.counts.shape[0])
+    years = np.asarray(pub_years)[rows]
+    g = None if groups is None else np.asarray(groups)[rows]
+    observed, n_observed = age_aligned_counts(matrix, years, baseline.n_ages, rows=rows)
+    expected = np.nan_to_num(baseline.expected_for(years, g))
+
+    ages = np.arange(baseline.n_ages)
+    early = ages < early_end
+    late = (ages >= late_start)[None, :] & (ages[None, :] < n_observed[:, None])
+    early_obs = observed[:, early].sum(axis=1)
+    early_exp = expected[:, early].sum(axis=1)
+    late_obs = np.where(late, observed, 0).sum(axis=1)
+    late_exp = np.where(late, expected, 0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        early_norm = np.where(early_exp > 0, early_obs / early_exp, np.nan)
+        late_norm = np.where(late_exp > 0, late_obs / late_exp, np.nan)
+        norm_ratio = late_norm / np.maximum(early_norm, floor)
+
+    df = pd.DataFrame({
+        "paper_idx": rows,
+        "year": years,
+        "early": early_obs,
+        "early_expected": early_exp,
+        "late": late_obs,
+        "late_expected": late_exp,
+        "early_norm": early_norm,
+        "late_norm": late_norm,
+        "norm_ratio": norm_ratio,
+    })
+    if g is not None:
+        labels = np.append(baseline.labels.astype(object), None)
+        df.insert(2, "group", labels[np.where(g < 0, baseline.n_groups, g)])
+    return df
+
+
+if __name__ == "__main__":
+    from sb_curves import build_citation_matrix
+    from sb_graph import load_citation_graph
+    from sb_index import load_paper_index
+
+    if len(sys.argv) not in (2, 3, 4):
+        print(__doc__)
+        sys.exit(1)
+
+    kg_path = Path(sys.argv[1])
+    graph = load_citation_graph(kg_path)
+    years = np.asarray(graph.years)
+    matrix = build_citation_matrix(graph)
+    groups, labels = (load_groups(Path(sys.argv[2]), graph.n_papers)
+                      if len(sys.argv) >= 3 else (None, None))
+
+    baseline = build_baseline(matrix, years, groups, labels, include=graph.has_record)
+    df = normalized_metrics(matrix, years, baseline, groups, np.flatnonzero(graph.has_record))
+    df = load_paper_index(kg_path, years=years).join(df)
+    top = df.sort_values("norm_ratio", ascending=False, kind="stable")
+
+    print(f"    Baseline: {baseline.expected.shape[0]} years x "
+          f"{baseline.n_groups} groups x {baseline.n_ages} ages "
+          f"({int(baseline.fallback.sum())} cohorts pooled)")
+    print(top.head(20).to_string(index=False))
+    if len(sys.argv) == 4:
+        top.to_csv(sys.argv[3], index=False)
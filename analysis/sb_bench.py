@@ -0,0 +1,146 @@
+"""
+Benchmarks
+
+Times the pipeline stages on synthetic KGs (sb_synthetic.py) of increasing
+size and checks that the injected sleeping beauties are recovered by the
+slope criteria:
+
+    ingest     citations_indexed.jsonl.gz -> CSR graph (sb_graph)
+    load       memory-mapped CSR open + citation counts
+    matrix     per-year citation matrix (sb_curves)
+    metrics    vectorized metrics table (sb_metrics)
+    slopes     piecewise slope fits (sb_slopes)
+    beauty     Ke et al. beauty coefficients (sb_beauty)
+    identify   PaperTable + the three identify_sb_* methods (sb_identification)
+
+Generated KGs are kept in the work directory and reused on later runs.
+Results are printed and written as JSON. Exits non-zero if the recall of
+injected sleeping beauties falls below --min-recall.
+
+Usage:
+    python sb_bench.py [--sizes 10000 100000 400000 2000000] [--workdir DIR]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sb_beauty import beauty_table
+from sb_curves import build_citation_matrix
+from sb_graph import convert_citations_to_csr, load_citation_graph
+from sb_identification import (PaperTable, identify_sb_by_absolute,
+                               identify_sb_by_peak_delay, identify_sb_by_ratio)
+from sb_index import load_paper_index
+from sb_instrument import Instrumentation
+from sb_metrics import compute_metrics, horizon_year
+from sb_slopes import slope_metrics
+from sb_synthetic import generate_kg, load_injected
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+SIZES = [10_000, 100_000, 400_000, 2_000_000]
+WORKDIR = Path(tempfile.gettempdir()) / "sb-bench"
+N_SLEEPING = 50
+MIN_RECALL = 0.9
+MIN_AGE = 10
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def _timed(run: Instrumentation, name: str, n_records: int, fn, *args, **kwargs):
+    with run.stage(name) as stage:
+        result = fn(*args, **kwargs)
+        stage.records = n_records
+    return result
+
+
+def bench_size(kg_path: Path, workers: int = 1) -> dict:
+    """Stage measurements (sb_instrument) and SB recovery for one generated KG."""
+    t = Instrumentation(kg_path.name)
+    n = len(np.load(kg_path / "papers_years.npy", mmap_mode="r"))
+    _timed(t, "ingest", n, convert_citations_to_csr, kg_path, verbose=False, workers=workers)
+
+    def load():
+        graph = load_citation_graph(kg_path)
+        graph.citation_counts()
+        return graph, load_paper_index(kg_path, years=np.asarray(graph.years))
+
+    graph, index = _timed(t, "load", n, load)
+    years = np.asarray(graph.years)
+    current_year = horizon_year(years)
+    matrix = _timed(t, "matrix", n, build_citation_matrix, graph)
+    _timed(t, "metrics", n, compute_metrics, np.arange(graph.n_papers),
+           graph.citations_indptr, graph.citations_indices, graph.num_references,
+           index, current_year=current_year)
+    slopes = _timed(t, "slopes", n, slope_metrics, matrix, years)
+    _timed(t, "beauty", n, beauty_table, matrix, years)
+
+    def identify():
+        table = PaperTable.from_matrix(index, matrix)
+        return (identify_sb_by_peak_delay(table), identify_sb_by_ratio(table),
+                identify_sb_by_absolute(table))
+
+    _timed(t, "identify", n, identify)
+
+    injected = load_injected(kg_path)
+    detected = slopes["paper_idx"][slopes["is_sb"] &
+                                   (current_year - slopes["year"] >= MIN_AGE)].to_numpy()
+    recovered = np.intersect1d(injected, detected)
+    return {
+        "n_papers": graph.n_papers,
+        "n_citations": int(len(graph.citations_indices)),
+        "timings": {s.name: s.wall_s for s in t.stages},
+        "stages": t.report()["stages"],
+        "injected": len(injected),
+        "recovered": len(recovered),
+        "recall": len(recovered) / max(len(injected), 1),
+        "other_detected": int(len(detected) - len(recovered)),
+    }
+
+
+def run(sizes, workdir: Path = WORKDIR, workers: int = 1, seed: int = 0) -> list:
+    results = []
+    for n in sizes:
+        kg_path = Path(workdir) / f"kg-{n}-seed{seed}"
+        if not (kg_path / "injected_sleeping_beauties.npy").exists():
+            print(f"\n[gen] {n} papers -> {kg_path}")
+            start = time.perf_counter()
+            generate_kg(kg_path, n, n_sleeping=N_SLEEPING, seed=seed)
+            print(f"    generated in {time.perf_counter() - start:.1f}s")
+
+        print(f"\n[bench] {n} papers")
+        result = bench_size(kg_path, workers=workers)
+        for stage, seconds in result["timings"].items():
+            print(f"    {stage:<10} {seconds:9.3f}s")
+        print(f"    recovered {result['recovered']}/{result['injected']} injected SBs "
+              f"(recall {result['recall']:.2f}), {result['other_detected']} other detections")
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SB pipeline on synthetic KGs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--workdir", type=Path, default=WORKDIR)
+    parser.add_argument("--workers", type=int, default=1, help="processes for JSONL ingest")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-recall", type=float, default=MIN_RECALL)
+    parser.add_argument("--output", type=Path, default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.workdir, args.workers, args.seed)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    worst = min(r["recall"] for r in results)
+    if worst < args.min_recall:
+        print(f"\nFAIL: recall {worst:.2f} below {args.min_recall}")
+        sys.exit(1)
@@ -0,0 +1,212 @@
+"""
+Bootstrap Confidence Intervals
+
+Resampling uncertainty for the SB metrics, which are often built from a
+handful of citations (early = 2, early_slope = 0.0 in sb_final.json) so
+that one citation more or less moves a paper across a threshold.
+
+Each paper's age-aligned curve is resampled B times as one array draw:
+
+    poisson      c*_t ~ Poisson(c_t + prior) for every observed age t
+    multinomial  N* ~ Poisson(N), spread over the observed ages with
+                 p_t proportional to c_t + prior
+
+and early / late sums, slopes, slope_ratio (sb_slopes) and the beauty
+coefficient (sb_beauty) are recomputed on all replicates by the same
+vectorized functions used for the point estimates, with the replicates
+stacked as extra rows. The result per paper is the point estimate, a
+percentile interval for each metric and p_sb, the fraction of replicates
+meeting the slope SB criteria.
+
+With prior = 0 years without citations stay at zero in every replicate;
+a prior of 0.5 lets them draw citations too, including for papers without
+any citation under the poisson method (multinomial totals are still drawn
+around the observed count, so uncited papers stay at zero there). Only
+curves whose rate is zero in every observed year are deterministic and
+skipped. Work is split into fixed-size tasks with their own SeedSequence
+children, so results do not depend on the number of worker processes.
+
+Usage:
+    python sb_bootstrap.py /path/to/astro-ph-kg-full [out.parquet] \\
+        [--replicates 1000] [--workers N] [--seed 0]
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from sb_beauty import beauty_coefficients
+from sb_curves import CitationMatrix, age_aligned_counts
+from sb_slopes import EARLY_END, LATE_START, fit_piecewise_slopes, sb_slope_mask
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+N_REPLICATES = 1000
+CONFIDENCE = 0.95
+METHODS = ("poisson", "multinomial")
+TASK_PAPERS = 2_000          # papers per worker task (fixes the seed layout)
+BLOCK_CELLS = 4_000_000      # papers x replicates x ages drawn at once
+BOOTSTRAP_VERSION = 1        # cache version of the bootstrap_metrics() table (see sb_cache.py)
+BOOT_METRICS = ["early", "late", "early_slope", "late_slope", "slope_ratio", "beauty"]
+
+# =============================================================================
+# RESAMPLING
+# =============================================================================
+
+def _metrics(counts: np.ndarray, n_observed: np.ndarray,
+             early_end: int, late_start: int) -> Dict[str, np.ndarray]:
+    """Metric arrays (plus is_sb) for a stack of age-aligned curves."""
+    fit = fit_piecewise_slopes(counts, n_observed, early_end, late_start)
+    return {
+        "early": fit.early_citations,
+        "late": fit.late_citations,
+        "early_slope": fit.early_slope,
+        "late_slope": fit.late_slope,
+        "slope_ratio": fit.slope_ratio,
+        "beauty": beauty_coefficients(counts, n_observed).beauty,
+        "is_sb": sb_slope_mask(fit),
+    }
+
+
+def draw_replicates(counts: np.ndarray, n_observed: np.ndarray, n_boot: int,
+                    rng: np.random.Generator, method: str = "poisson",
+                    prior: float = 0.0) -> np.ndarray:
+    """(n, n_boot, n_ages) int64 replicates of age-aligned curves."""
+    n, n_ages = counts.shape
+    observed = np.arange(n_ages)[None, :] < np.asarray(n_observed)[:, None]
+    lam = np.where(observed, counts + prior, 0.0)
+    if method == "poisson":
+        return rng.poisson(lam[:, None, :], size=(n, n_boot, n_ages))
+    if method == "multinomial":
+        totals = rng.poisson(counts.sum(axis=1)[:, None], size=(n, n_boot))
+        weight = lam.sum(axis=1, keepdims=True)
+        pvals = np.divide(lam, weight, out=np.zeros_like(lam), where=weight > 0)
+        pvals[weight[:, 0] == 0, 0] = 1.0  # empty curves: all mass on age 0 (totals are 0)
+        return rng.multinomial(totals, pvals[:, None, :])
+    raise ValueError(f"unknown bootstrap method {method!r}; expected one of {METHODS}")
+
+
+def _bootstrap_task(task) -> Dict[str, np.ndarray]:
+    """Point estimates, intervals and p_sb for one task's papers."""
+    counts, n_observed, seed, params = task
+    n_boot, method, prior = params["n_boot"], params["method"], params["prior"]
+    early_end, late_start = params["early_end"], params["late_start"]
+    q = [(1 - params["confidence"]) / 2, (1 + params["confidence"]) / 2]
+    rng = np.random.default_rng(seed)
+
+    out = _metrics(counts, n_observed, early_end, late_start)
+    out["p_sb"] = out.pop("is_sb").astype(np.float64)
+    for name in BOOT_METRICS:
+        out[f"{name}_lo"] = out[name].astype(np.float64)
+        out[f"{name}_hi"] = out[name].astype(np.float64)
+
+    # Curves with zero rate everywhere (no citations and no prior, or no
+    # observed years) resample to themselves
+    observed = np.arange(counts.shape[1])[None, :] < n_observed[:, None]
+    active = np.flatnonzero(np.where(observed, counts + prior, 0).sum(axis=1) > 0)
+    block = max(1, BLOCK_CELLS // (n_boot * counts.shape[1]))
+    for start in range(0, len(active), block):
+        rows = active[start:start + block]
+        reps = draw_replicates(counts[rows], n_observed[rows], n_boot, rng, method, prior)
+        m = _metrics(reps.reshape(-1, counts.shape[1]),
+                     np.repeat(n_observed[rows], n_boot), early_end, late_start)
+        out["p_sb"][rows] = m["is_sb"].reshape(len(rows), n_boot).mean(axis=1)
+        for name in BOOT_METRICS:
+            lo, hi = np.quantile(m[name].reshape(len(rows), n_boot), q, axis=1)
+            out[f"{name}_lo"][rows] = lo
+            out[f"{name}_hi"][rows] = hi
+    return out
+
+
+def bootstrap_curves(counts: np.ndarray, n_observed: np.ndarray,
+                     n_boot: int = N_REPLICATES, method: str = "poisson",
+                     prior: float = 0.0, confidence: float = CONFIDENCE,
+                     early_end: int = EARLY_END, late_start: int = LATE_START,
+                     seed: int = 0, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Bootstrap table for age-aligned curves (rows of counts).
+
+    Columns: every BOOT_METRICS name with _lo / _hi percentile bounds at
+    the given confidence, plus p_sb.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown bootstrap method {method!r}; expected one of {METHODS}")
+    counts = np.asarray(counts)
+    n_observed = np.asarray(n_observed)
+    params = {"n_boot": n_boot, "method": method, "prior": prior, "confidence": confidence,
+              "early_end": early_end, "late_start": late_start}
+    starts = range(0, len(counts), TASK_PAPERS)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    tasks = [(counts[s:s + TASK_PAPERS], n_observed[s:s + TASK_PAPERS], ss, params)
+             for s, ss in zip(starts, seeds)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        parts = [_bootstrap_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_bootstrap_task, tasks))
+
+    columns = ["p_sb"] + [f"{name}{suffix}" for name in BOOT_METRICS
+                          for suffix in ("", "_lo", "_hi")]
+    if not parts:
+        return pd.DataFrame({c: np.zeros(0) for c in columns})
+    return pd.DataFrame({c: np.concatenate([p[c] for p in parts]) for c in columns})
+
+
+def bootstrap_metrics(matrix: CitationMatrix, pub_years: np.ndarray,
+                      paper_indices: Optional[np.ndarray] = None,
+                      **kwargs) -> pd.DataFrame:
+    """bootstrap_curves() for matrix rows, with paper_idx and year columns."""
+    if paper_indices is None:
+        paper_indices = np.arange(matrix.counts.shape[0])
+    pub_years = np.asarray(pub_years)[paper_indices]
+    counts, n_observed = age_aligned_counts(matrix, pub_years, rows=paper_indices)
+    df = bootstrap_curves(counts, n_observed, **kwargs)
+    df.insert(0, "paper_idx", paper_indices)
+    df.insert(1, "year", pub_years)
+    return df
+
+
+if __name__ == "__main__":
+    import time
+
+    from sb_curves import build_citation_matrix
+    from sb_graph import load_citation_graph
+    from sb_index import load_paper_index
+    from sb_output import write_table
+
+    parser = argparse.ArgumentParser(description="Bootstrap intervals for the SB metrics")
+    parser.add_argument("kg_path", type=Path)
+    parser.add_argument("out", type=Path, nargs="?", default=None,
+                        help="output table (.parquet, .feather or .csv)")
+    parser.add_argument("--replicates", type=int, default=N_REPLICATES)
+    parser.add_argument("--method", choices=METHODS, default="poisson")
+    parser.add_argument("--prior", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    graph = load_citation_graph(args.kg_path)
+    matrix = build_citation_matrix(graph)
+    start = time.perf_counter()
+    df = bootstrap_metrics(matrix, graph.years, np.flatnonzero(graph.has_record),
+                           n_boot=args.replicates, method=args.method, prior=args.prior,
+                           seed=args.seed, workers=args.workers)
+    df = load_paper_index(args.kg_path, years=np.asarray(graph.years)).join(df)
+    print(f"    {len(df)} papers x {args.replicates} replicates "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    top = df[df["p_sb"] > 0].sort_values("p_sb", ascending=False, kind="stable")
+    print(top.head(20)[["arxiv_id", "year", "p_sb", "early", "early_hi",
+                        "slope_ratio", "slope_ratio_lo", "slope_ratio_hi"]].to_string(index=False))
+    if args.out:
+        fmt = {".feather": "feather", ".csv": "csv"}.get(args.out.suffix, "parquet")
+        write_table(df, args.out, fmt=fmt)
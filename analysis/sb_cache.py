@@ -0,0 +1,269 @@
+"""
+Artifact Cache
+
+Content-addressed cache for the intermediate artifacts of the pipeline:
+the CSR citation graph (with the loaded years), the per-year citation
+matrix and the per-paper metrics table. Modules with their own artifacts
+build on ArtifactCache and cache_key() (sb_baseline.cached_baseline(),
+sb_text.cached_term_counts()).
+
+Each entry is keyed on a hash of
+    - the SHA-256 of its input files (memoized by size + mtime),
+    - the parameters that affect it,
+    - the keys of the upstream entries it was built from, and
+    - the artifact's VERSION constant (GRAPH_VERSION, SLOPES_VERSION, ...),
+so editing an input file or a parameter automatically produces a new key,
+while changing only a downstream threshold (SB_THRESHOLDS, the age filter,
+...) reuses everything up to the final filter. Inputs and parameters cannot
+see a change to the code that builds an artifact or to its stored layout;
+whoever makes one bumps the VERSION next to it, which also retires every
+key built on top of it. Least-recently-used entries are evicted once the
+cache exceeds its size limit.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sb_curves import CitationMatrix, build_citation_matrix
+from sb_graph import (CITATIONS_FILE, YEARS_FILE, CitationGraph,
+                      convert_citations_to_csr)
+from sb_index import MAPPING_FILE, PaperIndex
+from sb_metrics import CURRENT_YEAR, EARLY_YEARS, MIN_PAPER_AGE, compute_metrics
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+CACHE_DIR = Path(os.environ.get("SB_CACHE_DIR", Path.home() / ".cache" / "astro-ph-sb"))
+MAX_CACHE_BYTES = int(os.environ.get("SB_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+
+DIGESTS_FILE = "_digests.json"
+HASH_BLOCK = 8 * 1024 * 1024
+
+# Bump when the code or stored layout of the artifact changes
+GRAPH_VERSION = 1
+MATRIX_VERSION = 1
+METRICS_VERSION = 2     # 2: num_references is the record's own count
+
+# =============================================================================
+# KEYS
+# =============================================================================
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(stage: str, input_digests: Iterable[str] = (),
+              params: Optional[Dict] = None, upstream: Iterable[str] = (), *,
+              version: int) -> str:
+    """Deterministic key for a stage given its version, inputs, parameters and upstream keys."""
+    payload = json.dumps({
+        "stage": stage,
+        "version": version,
+        "inputs": list(input_digests),
+        "params": params or {},
+        "upstream": list(upstream),
+    }, sort_keys=True, default=str)
+    return f"{stage}-{hashlib.sha256(payload.encode()).hexdigest()[:32]}"
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class ArtifactCache:
+    """
+    Directory of cache entries, one subdirectory per key.
+
+    Array entries are stored as .npy files and loaded memory-mapped; frame
+    entries are pickled DataFrames. Entries are written to a temporary
+    directory and renamed into place, so a crashed run never leaves a
+    half-written entry behind.
+    """
+
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._digests_path = self.root / DIGESTS_FILE
+        self._digests = (json.loads(self._digests_path.read_text())
+                         if self._digests_path.exists() else {})
+
+    # -- input hashing -------------------------------------------------------
+
+    def file_digest(self, path: Path) -> str:
+        """SHA-256 of a file, recomputed only when its size or mtime changes."""
+        path = Path(path).resolve()
+        stat = path.stat()
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        known = self._digests.get(str(path))
+        if known and known["stamp"] == stamp:
+            return known["sha256"]
+
+        digest = _sha256_file(path)
+        self._digests[str(path)] = {"stamp": stamp, "sha256": digest}
+        tmp = self._digests_path.with_name(DIGESTS_FILE + ".tmp")
+        tmp.write_text(json.dumps(self._digests))
+        os.replace(tmp, self._digests_path)
+        return digest
+
+    # -- entries -------------------------------------------------------------
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key
+
+    def __contains__(self, key: str) -> bool:
+        return self._entry(key).is_dir()
+
+    def entry_files(self, key: str) -> List[Path]:
+        """Files of the entry for key (none if it is not cached)."""
+        entry = self._entry(key)
+        return sorted(entry.iterdir()) if entry.is_dir() else []
+
+    def get(self, key: str):
+        """Return the cached arrays dict / DataFrame for key, or None."""
+        entry = self._entry(key)
+        if not entry.is_dir():
+            return None
+        os.utime(entry)  # mark as recently used
+        meta = json.loads((entry / "meta.json").read_text())
+        if meta["kind"] == "frame":
+            return pd.read_pickle(entry / "frame.pkl")
+        return {name: np.load(entry / f"{name}.npy", mmap_mode="r") for name in meta["arrays"]}
+
+    def put(self, key: str, value) -> None:
+        """Store a dict of arrays or a DataFrame under key, then enforce the size limit."""
+        entry = self._entry(key)
+        tmp = self.root / f".tmp-{key}-{os.getpid()}"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir()
+
+        if isinstance(value, pd.DataFrame):
+            value.to_pickle(tmp / "frame.pkl", protocol=pickle.HIGHEST_PROTOCOL)
+            meta = {"kind": "frame"}
+        else:
+            for name, arr in value.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(arr))
+            meta = {"kind": "arrays", "arrays": list(value)}
+        meta["created"] = time.time()
+        (tmp / "meta.json").write_text(json.dumps(meta))
+
+        if entry.exists():
+            shutil.rmtree(entry)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def get_or_compute(self, key: str, compute: Callable[[], object]):
+        """Cached value for key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            self.put(key, compute())
+            value = self.get(key)
+        return value
+
+    # -- eviction ------------------------------------------------------------
+
+    def _size(self, entry: Path) -> int:
+        return sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+
+    def total_bytes(self) -> int:
+        return sum(self._size(e) for e in self.root.iterdir()
+                   if e.is_dir() and not e.name.startswith("."))
+
+    def evict(self) -> int:
+        """Delete least-recently-used entries until under max_bytes; returns count."""
+        entries = [e for e in self.root.iterdir() if e.is_dir() and not e.name.startswith(".")]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        sizes = {e: self._size(e) for e in entries}
+        total = sum(sizes.values())
+
+        removed = 0
+        for entry in entries[:-1]:  # never evict the newest entry
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+            removed += 1
+        return removed
+
+    def clear(self):
+        for entry in self.root.iterdir():
+            if entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+
+
+# =============================================================================
+# PIPELINE STAGES
+# =============================================================================
+
+GRAPH_ARRAYS = ("years", "citations_indptr", "citations_indices",
+                "references_indptr", "references_indices",
+                "num_references", "has_record")
+
+
+def cached_citation_graph(cache: ArtifactCache, kg_path: Path, workers: int = 1):
+    """(key, CitationGraph) for the KG directory, built from the JSONL on a miss."""
+    kg_path = Path(kg_path)
+    key = cache_key("graph", [cache.file_digest(kg_path / CITATIONS_FILE),
+                              cache.file_digest(kg_path / YEARS_FILE)],
+                    version=GRAPH_VERSION)
+
+    def compute():
+        graph = convert_citations_to_csr(kg_path, workers=workers, save=False)
+        return {name: getattr(graph, name) for name in GRAPH_ARRAYS}
+
+    arrays = cache.get_or_compute(key, compute)
+    return key, CitationGraph(**arrays)
+
+
+def cached_citation_matrix(cache: ArtifactCache, graph_key: str, graph: CitationGraph,
+                           first_year: Optional[int] = None,
+                           last_year: Optional[int] = None):
+    """(key, CitationMatrix) derived from a cached graph."""
+    key = cache_key("matrix", params={"first_year": first_year, "last_year": last_year},
+                    upstream=[graph_key], version=MATRIX_VERSION)
+
+    def compute():
+        matrix = build_citation_matrix(graph, first_year, last_year)
+        return {"counts": matrix.counts, "first_year": np.array([matrix.first_year])}
+
+    arrays = cache.get_or_compute(key, compute)
+    return key, CitationMatrix(counts=arrays["counts"], first_year=int(arrays["first_year"][0]))
+
+
+def cached_metrics(cache: ArtifactCache, kg_path: Path, graph_key: str,
+                   graph: CitationGraph, index: PaperIndex,
+                   current_year: int = CURRENT_YEAR,
+                   early_years: int = EARLY_YEARS,
+                   min_age: int = MIN_PAPER_AGE):
+    """(key, metrics DataFrame) for every recorded paper (the sb.py identify stage)."""
+    key = cache_key(
+        "metrics",
+        [cache.file_digest(Path(kg_path) / MAPPING_FILE)],
+        params={"current_year": current_year, "early_years": early_years, "min_age": min_age},
+        upstream=[graph_key],
+        version=METRICS_VERSION,
+    )
+
+    def compute():
+        df = compute_metrics(np.arange(graph.n_papers), graph.citations_indptr,
+                             graph.citations_indices, graph.num_references, index,
+                             current_year=current_year, early_years=early_years,
+                             min_age=min_age)
+        return df[graph.has_record[df["paper_idx"]]].reset_index(drop=True)
+
+    return key, cache.get_or_compute(key, compute)
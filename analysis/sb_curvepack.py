@@ -0,0 +1,364 @@
+"""
+Compact Curve Encoding
+
+Binary storage for per-year citation curves, replacing the "year:count"
+strings of sb_curves.json / sb_final.json and the float lists of
+sb_normalized.json once curves are exported for every paper.
+
+Each curve is stored as its first non-zero year (base_year) and the dense
+counts from there to its last non-zero year. Counts are delta-encoded
+within the curve, zigzag-mapped to unsigned and written as LEB128 varints
+into one shared byte array; offsets[i]:offsets[i+1] is curve i's byte
+range. Typical curves take about one byte per year. Encoding and decoding
+are vectorized over all curves and round-trip exactly. Years with zero
+citations are implicit, as in the "year:count" strings.
+
+Two containers:
+    .npz  ids, base_year, offsets, data (for the analysis code)
+    .sbc  single little-endian blob for the dashboard:
+              char[4]   magic "SBC1"
+              uint32    n_curves, ids_bytes, data_bytes
+              uint32    offsets[n_curves + 1]
+              int16     base_year[n_curves]   (+2 pad bytes if n is odd)
+              uint8     ids[ids_bytes]        (UTF-8, newline-separated)
+              uint8     data[data_bytes]
+
+Usage:
+    python sb_curvepack.py /path/to/astro-ph-kg-full curves.sbc
+    python sb_curvepack.py sb_curves.json curves.npz
+"""
+
+import json
+import struct
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from sb_curves import CitationMatrix
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MAGIC = b"SBC1"
+HEADER = struct.Struct("<4sIII")
+CHUNK_ROWS = 100_000  # matrix rows encoded per block
+
+# =============================================================================
+# VARINTS
+# =============================================================================
+
+def _zigzag(d: np.ndarray) -> np.ndarray:
+    d = d.astype(np.int64)
+    return ((d << 1) ^ (d >> 63)).astype(np.uint64)
+
+
+def _unzigzag(u: np.ndarray) -> np.ndarray:
+    return (u >> np.uint64(1)).astype(np.int64) ^ -(u & np.uint64(1)).astype(np.int64)
+
+
+def _varint_lengths(u: np.ndarray) -> np.ndarray:
+    n = np.ones(len(u), dtype=np.int64)
+    for k in range(1, 10):
+        n += u >= np.uint64(1 << (7 * k))
+    return n
+
+
+def varint_encode(u: np.ndarray) -> np.ndarray:
+    """LEB128 bytes of unsigned values, concatenated."""
+    u = np.asarray(u, dtype=np.uint64)
+    lengths = _varint_lengths(u)
+    starts = np.cumsum(lengths) - lengths
+    owner = np.repeat(np.arange(len(u)), lengths)
+    pos = np.arange(len(owner)) - starts[owner]
+    out = (u[owner] >> (np.uint64(7) * pos.astype(np.uint64))) & np.uint64(0x7F)
+    more = pos < lengths[owner] - 1
+    return (out | (more.astype(np.uint64) << np.uint64(7))).astype(np.uint8)
+
+
+def varint_decode(data: np.ndarray) -> np.ndarray:
+    """Unsigned values of a concatenated LEB128 byte array."""
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    last = (data & 0x80) == 0
+    owner = np.concatenate([[0], np.cumsum(last)[:-1]])
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    pos = np.arange(len(data)) - starts[owner]
+    parts = (data & 0x7F).astype(np.uint64) << (np.uint64(7) * pos.astype(np.uint64))
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+# =============================================================================
+# DATA STRUCTURES
+# =============================================================================
+
+@dataclass
+class CurveSet:
+    """Encoded curves; see the module docstring for the layout."""
+    ids: np.ndarray        # str keys (arXiv id, bibcode, ...)
+    base_year: np.ndarray  # int16, first non-zero year (0 for empty curves)
+    offsets: np.ndarray    # int64 (n + 1), byte ranges into data
+    data: np.ndarray       # uint8 varints
+
+    def __len__(self) -> int:
+        return len(self.base_year)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes + self.base_year.nbytes
+
+    def position(self, key: str) -> int:
+        if not hasattr(self, "_positions"):
+            self._positions = {k: i for i, k in enumerate(self.ids.tolist())}
+        return self._positions[key]
+
+    def dense(self, i: int) -> np.ndarray:
+        """Counts for years base_year[i] .. base_year[i] + len - 1."""
+        deltas = _unzigzag(varint_decode(self.data[self.offsets[i]:self.offsets[i + 1]]))
+        return np.cumsum(deltas)
+
+    def curve(self, i: int) -> Dict[int, int]:
+        """{year: count} for curve i, non-zero years only."""
+        counts = self.dense(i)
+        years = np.flatnonzero(counts) + int(self.base_year[i])
+        return dict(zip(years.tolist(), counts[counts != 0].tolist()))
+
+    def decode(self):
+        """All curves at once: (flat counts, lengths) in curve order."""
+        values = varint_decode(self.data)
+        last = (self.data & 0x80) == 0
+        ends = np.concatenate([[0], np.cumsum(last)])
+        lengths = np.diff(ends[self.offsets])
+        deltas = _unzigzag(values)
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        cum = np.cumsum(deltas)
+        before = np.concatenate([[0], cum])[starts]
+        return cum - before, lengths
+
+    def to_dicts(self) -> List[Dict[int, int]]:
+        values, lengths = self.decode()
+        bounds = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+        base = self.base_year.tolist()
+        out = []
+        for i in range(len(self)):
+            counts = values[bounds[i]:bounds[i + 1]]
+            nz = np.flatnonzero(counts)
+            out.append(dict(zip((nz + base[i]).tolist(), counts[nz].tolist())))
+        return out
+
+
+# =============================================================================
+# ENCODING
+# =============================================================================
+
+def encode_curves(ids: Sequence[str], base_year: np.ndarray,
+                  values: np.ndarray, lengths: np.ndarray) -> CurveSet:
+    """
+    Encode dense curves given as one flat count array plus per-curve lengths.
+
+    Curve i covers values[sum(lengths[:i]) : sum(lengths[:i+1])], starting
+    at base_year[i].
+    """
+    values = np.asarray(values, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+
+    deltas = np.diff(values, prepend=0)
+    first = starts[lengths > 0]
+    deltas[first] = values[first]  # each curve restarts from zero
+    u = _zigzag(deltas)
+
+    nbytes = _varint_lengths(u)
+    value_ends = np.concatenate([[0], np.cumsum(nbytes)])
+    offsets = value_ends[np.concatenate([starts, [len(values)]])]
+    return CurveSet(ids=np.asarray(ids, dtype=str),
+                    base_year=np.asarray(base_year, dtype=np.int16),
+                    offsets=offsets.astype(np.int64),
+                    data=varint_encode(u))
+
+
+def from_dicts(ids: Sequence[str], curves: Sequence[Dict[int, int]]) -> CurveSet:
+    """Encode {year: count} dicts (e.g. Paper.citations_by_year)."""
+    base, lengths, parts = [], [], []
+    for curve in curves:
+        curve = {y: c for y, c in curve.items() if c}
+        if not curve:
+            base.append(0)
+            lengths.append(0)
+            continue
+        lo, hi = min(curve), max(curve)
+        dense = np.zeros(hi - lo + 1, dtype=np.int64)
+        dense[np.array(list(curve)) - lo] = list(curve.values())
+        base.append(lo)
+        lengths.append(len(dense))
+        parts.append(dense)
+    values = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+    return encode_curves(ids, np.array(base), values, np.array(lengths))
+
+
+def from_matrix(matrix: CitationMatrix, ids: Sequence[str],
+                rows: Optional[np.ndarray] = None) -> CurveSet:
+    """Encode rows of a citation matrix, trimmed to their non-zero span."""
+    if rows is None:
+        rows = np.arange(matrix.counts.shape[0])
+    rows = np.asarray(rows)
+    base, lengths, parts = [], [], []
+    cols = np.arange(matrix.n_years)
+
+    for start in range(0, len(rows), CHUNK_ROWS):
+        block = np.asarray(matrix.counts[rows[start:start + CHUNK_ROWS]])
+        nz = block != 0
+        any_nz = nz.any(axis=1)
+        first = np.argmax(nz, axis=1)
+        last = matrix.n_years - 1 - np.argmax(nz[:, ::-1], axis=1)
+        span = (cols >= first[:, None]) & (cols <= last[:, None]) & any_nz[:, None]
+        parts.append(block[span])
+        lengths.append(np.where(any_nz, last - first + 1, 0))
+        base.append(np.where(any_nz, first + matrix.first_year, 0))
+
+    if not parts:
+        return encode_curves(ids, np.zeros(0), np.zeros(0), np.zeros(0))
+    return encode_curves(ids, np.concatenate(base), np.concatenate(parts),
+                         np.concatenate(lengths))
+
+
+# =============================================================================
+# JSON COMPATIBILITY
+# =============================================================================
+
+def parse_curve_string(text: str) -> Dict[int, int]:
+    """ "2008:1 2010:1 ..." -> {2008: 1, 2010: 1, ...} """
+    out = {}
+    for item in text.split():
+        year, count = item.split(":")
+        out[int(year)] = int(count)
+    return out
+
+
+def curve_string(curve: Dict[int, int]) -> str:
+    """Inverse of parse_curve_string(), years ascending."""
+    return " ".join(f"{y}:{c}" for y, c in sorted(curve.items()) if c)
+
+
+def normalized_curve(curve: Dict[int, int], pub_year: int, last_year: int) -> List[float]:
+    """Cumulative fraction of citations per year, as in sb_normalized.json."""
+    total = sum(curve.values())
+    cum, out = 0, []
+    for year in range(pub_year, last_year + 1):
+        cum += curve.get(year, 0)
+        out.append(cum / total if total else 0.0)
+    return out
+
+
+def from_records(records: List[Dict], id_field: str = "bibcode") -> CurveSet:
+    """Encode the "curve" strings of sb_curves.json / sb_final.json records."""
+    return from_dicts([r[id_field] for r in records],
+                      [parse_curve_string(r["curve"]) for r in records])
+
+
+def to_records(curves: CurveSet, records: List[Dict], id_field: str = "bibcode",
+               normalized_to: Optional[int] = None) -> List[Dict]:
+    """
+    Copies of records with "curve" rewritten from the encoded curves.
+
+    With normalized_to=<last year> a "normalized" list is written instead
+    of "curve", reproducing sb_normalized.json.
+    """
+    out = []
+    for record in records:
+        curve = curves.curve(curves.position(record[id_field]))
+        record = dict(record)
+        if normalized_to is None:
+            record["curve"] = curve_string(curve)
+        else:
+            record.pop("curve", None)
+            record["normalized"] = normalized_curve(curve, record["pub_year"], normalized_to)
+        out.append(record)
+    return out
+
+
+# =============================================================================
+# FILES
+# =============================================================================
+
+def save_npz(curves: CurveSet, path: Path) -> Path:
+    np.savez(path, ids=curves.ids, base_year=curves.base_year,
+             offsets=curves.offsets, data=curves.data)
+    return Path(path)
+
+
+def load_npz(path: Path) -> CurveSet:
+    with np.load(path) as f:
+        return CurveSet(ids=f["ids"], base_year=f["base_year"],
+                        offsets=f["offsets"], data=f["data"])
+
+
+def write_blob(curves: CurveSet, path: Path) -> Path:
+    """Write the single-file .sbc layout read by the dashboard."""
+    ids = "\n".join(curves.ids.tolist()).encode("utf-8")
+    n = len(curves)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, n, len(ids), len(curves.data)))
+        f.write(curves.offsets.astype("<u4").tobytes())
+        f.write(curves.base_year.astype("<i2").tobytes())
+        if n % 2:
+            f.write(b"\0\0")
+        f.write(ids)
+        f.write(curves.data.tobytes())
+    return Path(path)
+
+
+def read_blob(path: Path) -> CurveSet:
+    buf = Path(path).read_bytes()
+    magic, n, ids_len, data_len = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a curve blob")
+    pos = HEADER.size
+    offsets = np.frombuffer(buf, "<u4", n + 1, pos).astype(np.int64)
+    pos += 4 * (n + 1)
+    base_year = np.frombuffer(buf, "<i2", n, pos).copy()
+    pos += 2 * n + 2 * (n % 2)
+    ids = buf[pos:pos + ids_len].decode("utf-8").split("\n") if n else []
+    pos += ids_len
+    data = np.frombuffer(buf, np.uint8, data_len, pos).copy()
+    return CurveSet(ids=np.asarray(ids, dtype=str), base_year=base_year,
+                    offsets=offsets, data=data)
+
+
+def save_curves(curves: CurveSet, path: Path) -> Path:
+    path = Path(path)
+    return save_npz(curves, path) if path.suffix == ".npz" else write_blob(curves, path)
+
+
+def load_curves(path: Path) -> CurveSet:
+    path = Path(path)
+    return load_npz(path) if path.suffix == ".npz" else read_blob(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+
+    source, output = Path(sys.argv[1]), Path(sys.argv[2])
+    if source.suffix == ".json":
+        curves = from_records(json.loads(source.read_text()))
+    else:
+        from sb_curves import build_citation_matrix
+        from sb_graph import load_citation_graph
+        from sb_index import load_paper_index
+
+        graph = load_citation_graph(source)
+        index = load_paper_index(source, years=np.asarray(graph.years))
+        rows = np.flatnonzero(graph.has_record)
+        ids = index.arxiv_ids(rows).astype(object)
+        ids = [a if isinstance(a, str) else f"idx_{r}" for a, r in zip(ids, rows)]
+        curves = from_matrix(build_citation_matrix(graph), ids, rows)
+
+    save_curves(curves, output)
+    print(f"    Curves: {len(curves)}")
+    print(f"    Encoded size: {output.stat().st_size / 1024:.1f} KB")
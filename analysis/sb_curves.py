@@ -0,0 +1,187 @@
+"""
+Per-Year Citation Curves
+
+Builds a dense (n_papers, n_years) int32 matrix of citations received per
+calendar year from the CSR citation graph. The year of each citation is the
+publication year of the citing paper, papers_years.npy[citing_idx].
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from sb_graph import CitationGraph
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Upper bound on citation edges handled per bincount call (bounds temporaries)
+EDGES_PER_CHUNK = 8_000_000
+
+# =============================================================================
+# DATA STRUCTURES
+# =============================================================================
+
+@dataclass
+class CitationMatrix:
+    """Citations per paper per calendar year; column j is first_year + j."""
+    counts: np.ndarray  # (n_papers, n_years) int32
+    first_year: int
+
+    @property
+    def n_years(self) -> int:
+        return self.counts.shape[1]
+
+    @property
+    def last_year(self) -> int:
+        return self.first_year + self.n_years - 1
+
+    @property
+    def year_labels(self) -> np.ndarray:
+        return np.arange(self.first_year, self.last_year + 1)
+
+    def totals(self) -> np.ndarray:
+        """Total citations per paper within the matrix horizon."""
+        return self.counts.sum(axis=1, dtype=np.int64)
+
+
+# =============================================================================
+# MATRIX CONSTRUCTION
+# =============================================================================
+
+def build_citation_matrix(graph: CitationGraph,
+                          first_year: Optional[int] = None,
+                          last_year: Optional[int] = None) -> CitationMatrix:
+    """
+    Count citations per (cited paper, citing year) with one bincount per chunk.
+
+    The flat bin is cited_idx * n_years + (years[citing_idx] - first_year).
+    Citations whose citing year falls outside [first_year, last_year] are
+    dropped. Rows are processed in chunks of roughly EDGES_PER_CHUNK edges so
+    the int64 temporaries stay bounded on the full corpus.
+    """
+    years = np.asarray(graph.years)
+    first_year = int(years.min()) if first_year is None else int(first_year)
+    last_year = int(years.max()) if last_year is None else int(last_year)
+    n_years = last_year - first_year + 1
+    n_papers = graph.n_papers
+
+    counts = np.zeros((n_papers, n_years), dtype=np.int32)
+    indptr = np.asarray(graph.citations_indptr)
+    indices = graph.citations_indices
+
+    row_start = 0
+    while row_start < n_papers:
+        # Largest row_end whose edge count stays within the chunk budget
+        limit = indptr[row_start] + EDGES_PER_CHUNK
+        row_end = int(np.searchsorted(indptr, limit, side="right")) - 1
+        row_end = min(max(row_end, row_start + 1), n_papers)
+
+        lo, hi = indptr[row_start], indptr[row_end]
+        cited = np.repeat(np.arange(row_end - row_start, dtype=np.int64),
+                          np.diff(indptr[row_start:row_end + 1]))
+        cite_year = years[indices[lo:hi]].astype(np.int64) - first_year
+        keep = (cite_year >= 0) & (cite_year < n_years)
+
+        flat = cited[keep] * n_years + cite_year[keep]
+        block = np.bincount(flat, minlength=(row_end - row_start) * n_years)
+        counts[row_start:row_end] = block.reshape(-1, n_years)
+        row_start = row_end
+
+    return CitationMatrix(counts=counts, first_year=first_year)
+
+
+# =============================================================================
+# WINDOW SUMS
+# =============================================================================
+
+def window_sums(matrix: CitationMatrix, pub_years: np.ndarray,
+                start_age: int, end_age: Optional[int] = None,
+                rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Citations received at ages [start_age, end_age) for each paper.
+
+    Age is citing year minus publication year. end_age=None runs to the end
+    of the matrix horizon. pub_years and rows are aligned; rows defaults to
+    all papers.
+    """
+    counts = matrix.counts if rows is None else matrix.counts[rows]
+    cum = np.zeros((counts.shape[0], matrix.n_years + 1), dtype=np.int64)
+    np.cumsum(counts, axis=1, out=cum[:, 1:])
+
+    pub_col = np.asarray(pub_years, dtype=np.int64) - matrix.first_year
+    lo = np.clip(pub_col + start_age, 0, matrix.n_years)
+    hi = (np.full_like(lo, matrix.n_years) if end_age is None
+          else np.clip(pub_col + end_age, 0, matrix.n_years))
+    hi = np.maximum(hi, lo)
+
+    r = np.arange(counts.shape[0])
+    return cum[r, hi] - cum[r, lo]
+
+
+def early_late_sums(matrix: CitationMatrix, pub_years: np.ndarray,
+                    early_years: int = 3, rows: Optional[np.ndarray] = None):
+    """
+    Early (ages 0..early_years-1) and late (ages >= early_years) citations.
+
+    Returns (early, late) int64 arrays aligned with pub_years.
+    """
+    early = window_sums(matrix, pub_years, 0, early_years, rows=rows)
+    late = window_sums(matrix, pub_years, early_years, None, rows=rows)
+    return early, late
+
+
+def age_aligned_counts(matrix: CitationMatrix, pub_years: np.ndarray,
+                       n_ages: Optional[int] = None,
+                       rows: Optional[np.ndarray] = None,
+                       chunk_rows: int = 100_000):
+    """
+    Shift each row so column k holds citations at age k.
+
+    Returns (counts, n_observed): counts is (n, n_ages) int32 with zeros past
+    the matrix horizon, and n_observed[i] is the number of ages actually
+    covered by the matrix for paper i (last_year - pub_year + 1, clipped).
+    """
+    pub_col = np.asarray(pub_years, dtype=np.int64) - matrix.first_year
+    if n_ages is None:
+        n_ages = matrix.n_years
+    n_rows = len(pub_col)
+    source = matrix.counts if rows is None else matrix.counts[rows]
+
+    aligned = np.zeros((n_rows, n_ages), dtype=np.int32)
+    ages = np.arange(n_ages)
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        cols = pub_col[start:stop, None] + ages[None, :]
+        valid = (cols >= 0) & (cols < matrix.n_years)
+        taken = np.take_along_axis(source[start:stop], np.clip(cols, 0, matrix.n_years - 1), axis=1)
+        aligned[start:stop] = np.where(valid, taken, 0)
+
+    n_observed = np.clip(matrix.n_years - pub_col, 0, n_ages)
+    return aligned, n_observed
+
+
+# =============================================================================
+# PER-PAPER DICTS
+# =============================================================================
+
+def citations_by_year_dicts(matrix: CitationMatrix,
+                            rows: Optional[np.ndarray] = None) -> List[Dict[int, int]]:
+    """
+    {year: count} dicts (non-zero years only) for the requested rows.
+
+    Intended for filling Paper.citations_by_year; all the index work is done
+    with one np.nonzero over the matrix.
+    """
+    counts = matrix.counts if rows is None else matrix.counts[rows]
+    nz_rows, nz_cols = np.nonzero(counts)
+    values = counts[nz_rows, nz_cols].tolist()
+    labels = (nz_cols + matrix.first_year).tolist()
+    bounds = np.searchsorted(nz_rows, np.arange(counts.shape[0] + 1)).tolist()
+
+    return [
+        dict(zip(labels[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]]))
+        for i in range(counts.shape[0])
+    ]
@@ -0,0 +1,359 @@
+"""
+Citation Fetch Client
+
+Asyncio client for per-year citation curves from NASA ADS and Semantic
+Scholar. One pooled aiohttp session per run, a token-bucket limiter per
+service, batched id requests and retry with exponential backoff on 429 /
+5xx / connection errors. Every answer is stored in a SQLite cache, so
+re-runs only request ids that are not cached yet; "not found" answers
+expire after NOT_FOUND_TTL (miss_ttl) so a bad response is retried later.
+
+    ADS:              bibcodes: POST /v1/search/bigquery, 2000 per request;
+                      arXiv ids: GET /v1/search/query on identifier:,
+                      100 per request (bigquery only matches bibcodes);
+                      citing years are read from the citing bibcodes
+    Semantic Scholar: POST /graph/v1/paper/batch, 500 ids per request,
+                      100 requests/minute on the free tier
+
+At these batch sizes 400k papers are 200 ADS or 800 Semantic Scholar
+requests, i.e. minutes of quota rather than days (4000 ADS requests when
+the ids are arXiv ids). base_url is configurable so the client can be
+pointed at a local mock server (test_sb_fetch.py).
+
+aiohttp is only needed when a fetch actually runs and is imported there.
+
+Usage:
+    python sb_fetch.py {ads,s2} ids.txt [output.json]
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sb_cache import CACHE_DIR
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+FETCH_CACHE = CACHE_DIR / "fetch.sqlite"
+
+ADS_URL = "https://api.adsabs.harvard.edu"
+ADS_BATCH = 2000                    # bibcodes per bigquery
+ADS_QUERY_BATCH = 100               # arXiv ids per identifier: query (URL length)
+ADS_RATE = (5000, 86400.0)          # requests per period (daily quota)
+
+S2_URL = "https://api.semanticscholar.org"
+S2_BATCH = 500
+S2_RATE = (100, 60.0)               # free tier: 100 requests/minute
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0                  # seconds, doubled per attempt
+BACKOFF_MAX = 60.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+NOT_FOUND_TTL = 30 * 86400.0        # seconds before a "not found" is re-fetched
+
+Curve = Dict[int, int]  # year -> citation count
+
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+
+class TokenBucket:
+    """Allow `rate` acquisitions per `period` seconds, with bursts up to `capacity`."""
+
+    def __init__(self, rate: int, period: float, capacity: Optional[int] = None):
+        self.fill_rate = rate / period
+        self.capacity = capacity or rate
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+
+
+# =============================================================================
+# RESPONSE CACHE
+# =============================================================================
+
+class ResponseCache:
+    """SQLite table of (source, id) -> curve JSON; found=0 records a miss."""
+
+    def __init__(self, path: Path = FETCH_CACHE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS curves ("
+            " source TEXT, id TEXT, found INTEGER, curve TEXT, fetched REAL,"
+            " PRIMARY KEY (source, id))")
+
+    def get_many(self, source: str, ids: Iterable[str],
+                 miss_ttl: Optional[float] = None) -> Dict[str, Optional[Curve]]:
+        """
+        Cached entries among ids; misses recorded as not found map to None.
+
+        Not-found entries older than miss_ttl seconds are left out, as if
+        never fetched (miss_ttl=None keeps them forever).
+        """
+        ids = list(ids)
+        out = {}
+        expired = time.time() - miss_ttl if miss_ttl is not None else None
+        for start in range(0, len(ids), 900):  # SQLite host-parameter limit
+            chunk = ids[start:start + 900]
+            rows = self.conn.execute(
+                f"SELECT id, found, curve, fetched FROM curves WHERE source = ? "
+                f"AND id IN ({','.join('?' * len(chunk))})", [source, *chunk])
+            for pid, found, curve, fetched in rows:
+                if found:
+                    out[pid] = {int(y): c for y, c in json.loads(curve).items()}
+                elif expired is None or fetched > expired:
+                    out[pid] = None
+        return out
+
+    def put_many(self, source: str, results: Dict[str, Optional[Curve]]):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO curves VALUES (?, ?, ?, ?, ?)",
+                [(source, pid, curve is not None, json.dumps(curve or {}), now)
+                 for pid, curve in results.items()])
+
+    def close(self):
+        self.conn.close()
+
+
+# =============================================================================
+# CLIENTS
+# =============================================================================
+
+class FetchError(RuntimeError):
+    """A batch still failed after MAX_RETRIES attempts."""
+
+
+class CitationFetcher:
+    """
+    Base client: cache lookup, batching, rate limiting and retries.
+
+    Subclasses define how a batch of ids becomes a request and how the
+    response becomes {id: curve or None}.
+    """
+    source = ""
+
+    def __init__(self, base_url: str, batch_size: int, rate: Tuple[int, float],
+                 cache: Optional[ResponseCache] = None, concurrency: int = 4,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 miss_ttl: Optional[float] = NOT_FOUND_TTL,
+                 headers: Optional[Dict[str, str]] = None, verbose: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.bucket_rate = rate
+        self.cache = cache if cache is not None else ResponseCache()
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.miss_ttl = miss_ttl
+        self.headers = headers or {}
+        self.verbose = verbose
+        self.requests_sent = 0
+
+    # -- subclass hooks --------------------------------------------------
+
+    def batches(self, ids: List[str]) -> List[List[str]]:
+        """Split the uncached ids into request batches."""
+        return [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+
+    def request(self, ids: List[str]) -> Dict:
+        """Keyword arguments for session.request() for one batch."""
+        raise NotImplementedError
+
+    def parse(self, ids: List[str], payload) -> Dict[str, Optional[Curve]]:
+        raise NotImplementedError
+
+    # -- fetching --------------------------------------------------------
+
+    async def _fetch_batch(self, session, bucket: TokenBucket,
+                           ids: List[str]) -> Dict[str, Optional[Curve]]:
+        import aiohttp
+
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            self.requests_sent += 1
+            delay = min(BACKOFF_MAX, self.backoff_base * 2 ** attempt)
+            try:
+                async with session.request(**self.request(ids)) as resp:
+                    if resp.status in RETRY_STATUS:
+                        retry_after = resp.headers.get("Retry-After")
+                        if retry_after and retry_after.isdigit():
+                            delay = max(delay, float(retry_after))
+                    else:
+                        resp.raise_for_status()
+                        return self.parse(ids, await resp.json(content_type=None))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                pass
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+        raise FetchError(f"{self.source}: batch of {len(ids)} ids failed "
+                         f"after {self.max_retries + 1} attempts")
+
+    async def fetch_async(self, ids: Iterable[str]) -> Dict[str, Optional[Curve]]:
+        """Curves for ids (None = not found), fetching only uncached ids."""
+        import aiohttp
+
+        ids = list(dict.fromkeys(ids))
+        results = self.cache.get_many(self.source, ids, miss_ttl=self.miss_ttl)
+        todo = [pid for pid in ids if pid not in results]
+        batches = self.batches(todo)
+        if self.verbose:
+            print(f"    {self.source}: {len(results)} cached, "
+                  f"{len(todo)} to fetch in {len(batches)} requests")
+        if not batches:
+            return results
+
+        bucket = TokenBucket(*self.bucket_rate)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=300)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=self.headers) as session:
+            async def run(batch):
+                async with semaphore:
+                    found = await self._fetch_batch(session, bucket, batch)
+                # ids the service did not return are cached as not found
+                found = {pid: found.get(pid) for pid in batch}
+                self.cache.put_many(self.source, found)
+                results.update(found)
+
+            await asyncio.gather(*(run(b) for b in batches))
+        return results
+
+    def fetch(self, ids: Iterable[str]) -> Dict[str, Optional[Curve]]:
+        return asyncio.run(self.fetch_async(ids))
+
+
+def is_bibcode(pid: str) -> bool:
+    """19-character ADS bibcode (YYYYJJJJJVVVVMPPPPA) rather than an arXiv id."""
+    return len(pid) == 19 and pid[:4].isdigit()
+
+
+class AdsFetcher(CitationFetcher):
+    """
+    NASA ADS: citing bibcodes per paper, dated by their first 4 characters.
+
+    Bibcodes go through bigquery; arXiv ids, which bigquery does not
+    match, through an identifier: search in smaller batches.
+    """
+    source = "ads"
+
+    def __init__(self, token: Optional[str] = None, base_url: str = ADS_URL,
+                 batch_size: int = ADS_BATCH, query_batch_size: int = ADS_QUERY_BATCH,
+                 rate: Tuple[int, float] = ADS_RATE, **kwargs):
+        token = token or os.environ.get("ADS_API_TOKEN", "")
+        super().__init__(base_url, batch_size, rate,
+                         headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        self.query_batch_size = query_batch_size
+
+    def batches(self, ids):
+        bibcodes = [pid for pid in ids if is_bibcode(pid)]
+        arxiv = [pid for pid in ids if not is_bibcode(pid)]
+        return (super().batches(bibcodes) +
+                [arxiv[i:i + self.query_batch_size]
+                 for i in range(0, len(arxiv), self.query_batch_size)])
+
+    def request(self, ids):
+        fields = "bibcode,identifier,citation"
+        if not is_bibcode(ids[0]):
+            terms = " OR ".join(f'"arXiv:{pid}"' for pid in ids)
+            return {
+                "method": "GET",
+                "url": f"{self.base_url}/v1/search/query",
+                "params": {"q": f"identifier:({terms})", "fl": fields,
+                           "rows": str(len(ids))},
+            }
+        return {
+            "method": "POST",
+            "url": f"{self.base_url}/v1/search/bigquery",
+            "params": {"q": "*:*", "fl": fields, "rows": str(len(ids))},
+            "data": "bibcode\n" + "\n".join(ids),
+            "headers": {"Content-Type": "big-query/csv"},
+        }
+
+    def parse(self, ids, payload):
+        wanted = set(ids)
+        out = {}
+        for doc in payload.get("response", {}).get("docs", []):
+            names = [doc.get("bibcode", "")] + list(doc.get("identifier", []))
+            names += [n[len("arXiv:"):] for n in names if n.startswith("arXiv:")]
+            curve = Counter(int(b[:4]) for b in doc.get("citation", []) if b[:4].isdigit())
+            for name in wanted.intersection(names):
+                out[name] = dict(sorted(curve.items()))
+        return out
+
+
+class SemanticScholarFetcher(CitationFetcher):
+    """Semantic Scholar paper batch endpoint with citations.year."""
+    source = "s2"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = S2_URL,
+                 batch_size: int = S2_BATCH, rate: Tuple[int, float] = S2_RATE, **kwargs):
+        api_key = api_key or os.environ.get("S2_API_KEY")
+        super().__init__(base_url, batch_size, rate,
+                         headers={"x-api-key": api_key} if api_key else None, **kwargs)
+
+    def request(self, ids):
+        return {
+            "method": "POST",
+            "url": f"{self.base_url}/graph/v1/paper/batch",
+            "params": {"fields": "citations.year"},
+            "json": {"ids": [f"arXiv:{pid}" for pid in ids]},
+        }
+
+    def parse(self, ids, payload):
+        out = {}
+        for pid, paper in zip(ids, payload):  # results are aligned with the request
+            if paper is None:
+                continue
+            curve = Counter(c["year"] for c in paper.get("citations") or []
+                            if c.get("year") is not None)
+            out[pid] = dict(sorted(curve.items()))
+        return out
+
+
+FETCHERS = {"ads": AdsFetcher, "s2": SemanticScholarFetcher}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4) or sys.argv[1] not in FETCHERS:
+        print(__doc__)
+        sys.exit(1)
+
+    ids = [line.strip() for line in open(sys.argv[2]) if line.strip()]
+    fetcher = FETCHERS[sys.argv[1]]()
+    t0 = time.time()
+    curves = fetcher.fetch(ids)
+    found = {pid: curve for pid, curve in curves.items() if curve is not None}
+
+    print(f"    Found: {len(found)} / {len(ids)}")
+    print(f"    Requests sent: {fetcher.requests_sent} in {time.time() - t0:.1f}s")
+    if len(sys.argv) == 4:
+        with open(sys.argv[3], "w") as f:
+            json.dump(found, f)
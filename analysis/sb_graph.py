@@ -0,0 +1,388 @@
+"""
+Citation Graph Store
+
+Converts citations_indexed.jsonl.gz into memory-mapped NumPy CSR arrays
+(indptr + int32 indices) stored next to papers_years.npy, and loads them
+back without any parsing.
+
+Usage:
+    python sb_graph.py /path/to/astro-ph-kg-full [--workers N]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Optional faster JSON parser; the stdlib parser is the fallback
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    json_loads = json.loads
+    JSON_BACKEND = "json"
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+CITATIONS_FILE = "citations_indexed.jsonl.gz"
+YEARS_FILE = "papers_years.npy"
+
+SHARDS_PER_WORKER = 4            # More shards than workers evens out load
+DECOMPRESS_BUFFER = 16 * 1024 * 1024
+
+# Files written by convert_citations_to_csr(), relative to the KG directory
+GRAPH_FILES = {
+    "citations_indptr": "csr_citations_indptr.npy",
+    "citations_indices": "csr_citations_indices.npy",
+    "references_indptr": "csr_references_indptr.npy",
+    "references_indices": "csr_references_indices.npy",
+    "num_references": "csr_num_references.npy",
+    "has_record": "csr_has_record.npy",
+}
+
+# =============================================================================
+# DATA STRUCTURES
+# =============================================================================
+
+@dataclass
+class CitationGraph:
+    """
+    paper_idx -> citations / references lists in CSR form.
+
+    Row i of the citation arrays lists the papers citing paper i; row i of
+    the reference arrays lists the papers cited by paper i.
+    """
+    years: np.ndarray
+    citations_indptr: np.ndarray
+    citations_indices: np.ndarray
+    references_indptr: np.ndarray
+    references_indices: np.ndarray
+    num_references: np.ndarray
+    has_record: np.ndarray  # True where the JSONL had a record for the paper
+
+    @property
+    def n_papers(self) -> int:
+        return len(self.citations_indptr) - 1
+
+    def citations_of(self, paper_idx: int) -> np.ndarray:
+        """Indices of papers citing paper_idx."""
+        start, end = self.citations_indptr[paper_idx], self.citations_indptr[paper_idx + 1]
+        return self.citations_indices[start:end]
+
+    def references_of(self, paper_idx: int) -> np.ndarray:
+        """Indices of papers cited by paper_idx."""
+        start, end = self.references_indptr[paper_idx], self.references_indptr[paper_idx + 1]
+        return self.references_indices[start:end]
+
+    def citation_counts(self) -> np.ndarray:
+        """Total citations per paper (length of each citation row)."""
+        return np.diff(self.citations_indptr)
+
+    def reference_counts(self) -> np.ndarray:
+        """Number of in-corpus references per paper."""
+        return np.diff(self.references_indptr)
+
+
+# =============================================================================
+# CONVERSION
+# =============================================================================
+
+def _to_csr(rows: np.ndarray, lengths: np.ndarray, flat: np.ndarray,
+            n_papers: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Group a record-ordered flat edge list into CSR rows ordered by paper_idx."""
+    edge_rows = np.repeat(rows, lengths)
+    keep = (flat >= 0) & (flat < n_papers)
+    edge_rows, flat = edge_rows[keep], flat[keep]
+
+    order = np.argsort(edge_rows, kind="stable")
+    indices = flat[order].astype(np.int32)
+    indptr = np.zeros(n_papers + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_rows, minlength=n_papers), out=indptr[1:])
+    return indptr, indices
+
+
+def _save_atomic(path: Path, arr: np.ndarray):
+    """Write an .npy file so readers never see a partial array."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+def _parse_lines(lines: Iterable[bytes], n_papers: int,
+                 verbose: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Parse JSONL records into flat per-record arrays.
+
+    Returns rows, cit_len, cit_flat, ref_len, ref_flat and num_refs as
+    int64 arrays in record order. Used directly for the single-process path
+    and by each worker on its shard.
+    """
+    rec_idx = array("q")
+    cit_len, ref_len, num_refs = array("q"), array("q"), array("q")
+    cit_flat, ref_flat = array("q"), array("q")
+
+    count = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        item = json_loads(line)
+        paper_idx = item["paper_idx"]
+        if paper_idx >= n_papers:
+            continue
+
+        citations = item.get("citations", [])
+        references = item.get("references", [])
+        rec_idx.append(paper_idx)
+        cit_len.append(len(citations))
+        ref_len.append(len(references))
+        num_refs.append(item.get("num_references", 0))
+        cit_flat.extend(citations)
+        ref_flat.extend(references)
+
+        count += 1
+        if verbose and count % 50000 == 0:
+            print(f"    Converted {count} papers...")
+
+    return {
+        name: np.frombuffer(buf, dtype=np.int64) if len(buf) else np.zeros(0, dtype=np.int64)
+        for name, buf in (("rows", rec_idx), ("cit_len", cit_len), ("cit_flat", cit_flat),
+                          ("ref_len", ref_len), ("ref_flat", ref_flat), ("num_refs", num_refs))
+    }
+
+
+def _parse_byte_range(args) -> Dict[str, np.ndarray]:
+    """Worker: parse the whole lines of a plain JSONL file in [start, end)."""
+    path, start, end, n_papers = args
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = iter(lambda: f.readline() if f.tell() < end else b"", b"")
+        return _parse_lines(lines, n_papers)
+
+
+def _shard_offsets(path: Path, n_shards: int) -> List[int]:
+    """Byte offsets splitting a file into ~n_shards pieces on line boundaries."""
+    size = path.stat().st_size
+    offsets = [0]
+    with open(path, "rb") as f:
+        for k in range(1, n_shards):
+            f.seek(max(size * k // n_shards, offsets[-1]))
+            f.readline()
+            offsets.append(min(f.tell(), size))
+    offsets.append(size)
+    return sorted(set(offsets))
+
+
+def _source_stamp(path: Path) -> Dict[str, int]:
+    stat = Path(path).stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _sidecar(plain: Path) -> Path:
+    return plain.with_name(plain.name + ".source.json")
+
+
+def decompress_citations(kg_path: Path, out_path: Optional[Path] = None) -> Path:
+    """
+    Decompress citations_indexed.jsonl.gz once so it can be split by offset.
+
+    Gzip streams cannot be entered mid-way, so this single sequential pass is
+    what makes the parallel parse possible. The output is written to a
+    temporary file and renamed into place when complete, and a
+    <name>.source.json sidecar records the size / mtime of the .gz it came
+    from and of the finished plain file (see decompressed_is_current()).
+    Returns the plain JSONL path.
+    """
+    kg_path = Path(kg_path)
+    source = kg_path / CITATIONS_FILE
+    out_path = Path(out_path) if out_path else kg_path / CITATIONS_FILE[:-len(".gz")]
+    _sidecar(out_path).unlink(missing_ok=True)
+    stamp = _source_stamp(source)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with gzip.open(source, "rb") as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst, length=DECOMPRESS_BUFFER)
+    os.replace(tmp, out_path)
+    _sidecar(out_path).write_text(json.dumps({"source": stamp,
+                                              "output": _source_stamp(out_path)}))
+    return out_path
+
+
+def decompressed_is_current(kg_path: Path, plain: Path) -> bool:
+    """
+    True if plain is a complete decompression of the current .gz.
+
+    Requires the sidecar written by decompress_citations() to match the
+    .gz's size / mtime and the plain file's own size / mtime, so a file
+    from an older snapshot, an interrupted or foreign decompression, or a
+    later edit is not reused.
+    """
+    plain, sidecar = Path(plain), _sidecar(Path(plain))
+    if not plain.exists() or not sidecar.exists():
+        return False
+    try:
+        recorded = json.loads(sidecar.read_text())
+    except ValueError:
+        return False
+    return (recorded.get("source") == _source_stamp(Path(kg_path) / CITATIONS_FILE)
+            and recorded.get("output") == _source_stamp(plain))
+
+
+def _merge_partials(partials: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Concatenate per-shard record arrays, preserving shard (file) order."""
+    return {name: np.concatenate([p[name] for p in partials]) for name in partials[0]}
+
+
+def convert_citations_to_csr(kg_path: Path, verbose: bool = True,
+                             workers: int = 1,
+                             keep_decompressed: bool = False,
+                             save: bool = True) -> CitationGraph:
+    """
+    One-time conversion of citations_indexed.jsonl.gz into CSR arrays.
+
+    Neighbour indices outside [0, n_papers) are dropped, as are records
+    whose paper_idx has no entry in papers_years.npy.
+
+    With workers > 1 the file is decompressed once, split on line
+    boundaries into shards, and each shard is parsed in a separate process;
+    the per-shard arrays are merged before the CSR build. The result is
+    identical to the single-process conversion. A plain
+    citations_indexed.jsonl next to the .gz is reused only if its sidecar
+    shows it is a complete decompression of the current .gz
+    (decompressed_is_current()); otherwise it is decompressed again.
+    save=False returns the graph without writing the CSR files.
+    """
+    kg_path = Path(kg_path)
+    years = np.load(kg_path / YEARS_FILE)
+    n_papers = len(years)
+
+    if workers <= 1:
+        with gzip.open(kg_path / CITATIONS_FILE, "rb") as f:
+            records = _parse_lines(f, n_papers, verbose=verbose)
+    else:
+        plain = kg_path / CITATIONS_FILE[:-len(".gz")]
+        reuse = decompressed_is_current(kg_path, plain)
+        if not reuse:
+            if verbose:
+                print("    Decompressing citations...")
+            decompress_citations(kg_path, plain)
+
+        offsets = _shard_offsets(plain, workers * SHARDS_PER_WORKER)
+        tasks = [(str(plain), a, b, n_papers) for a, b in zip(offsets[:-1], offsets[1:])]
+        if verbose:
+            print(f"    Parsing {len(tasks)} shards on {workers} workers ({JSON_BACKEND})...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            records = _merge_partials(list(pool.map(_parse_byte_range, tasks)))
+
+        if not reuse and not keep_decompressed:
+            plain.unlink()
+            _sidecar(plain).unlink(missing_ok=True)
+
+    graph = _records_to_graph(
+        years, records["rows"],
+        records["cit_len"], records["cit_flat"],
+        records["ref_len"], records["ref_flat"],
+        records["num_refs"],
+    )
+    if save:
+        save_citation_graph(graph, kg_path)
+
+    if verbose:
+        print(f"    Built CSR graph: {len(records['rows'])} records, "
+              f"{len(graph.citations_indices)} citations, "
+              f"{len(graph.references_indices)} references")
+    return graph
+
+
+def _records_to_graph(years: np.ndarray, rows: np.ndarray,
+                      cit_len: np.ndarray, cit_flat: np.ndarray,
+                      ref_len: np.ndarray, ref_flat: np.ndarray,
+                      num_refs: np.ndarray) -> CitationGraph:
+    """Assemble a CitationGraph from per-record lengths and flat edge lists."""
+    n_papers = len(years)
+    cit_indptr, cit_indices = _to_csr(rows, cit_len, cit_flat, n_papers)
+    ref_indptr, ref_indices = _to_csr(rows, ref_len, ref_flat, n_papers)
+
+    num_references = np.zeros(n_papers, dtype=np.int32)
+    num_references[rows] = num_refs
+    has_record = np.zeros(n_papers, dtype=bool)
+    has_record[rows] = True
+
+    return CitationGraph(
+        years=years,
+        citations_indptr=cit_indptr,
+        citations_indices=cit_indices,
+        references_indptr=ref_indptr,
+        references_indices=ref_indices,
+        num_references=num_references,
+        has_record=has_record,
+    )
+
+
+def save_citation_graph(graph: CitationGraph, kg_path: Path):
+    """Write the CSR arrays of a graph next to papers_years.npy."""
+    kg_path = Path(kg_path)
+    for field, filename in GRAPH_FILES.items():
+        _save_atomic(kg_path / filename, np.ascontiguousarray(getattr(graph, field)))
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+def has_citation_graph(kg_path: Path) -> bool:
+    """True if the CSR store exists in kg_path."""
+    return all((Path(kg_path) / name).exists() for name in GRAPH_FILES.values())
+
+
+def load_citation_graph(kg_path: Path, mmap: bool = True,
+                        convert: bool = False) -> CitationGraph:
+    """
+    Open the CSR citation graph stored in kg_path.
+
+    With mmap=True the arrays are memory-mapped read-only, so opening is
+    near-instant and the pages are shared between processes. If convert is
+    True and the store is missing, it is built from the JSONL first.
+    """
+    kg_path = Path(kg_path)
+    if not has_citation_graph(kg_path):
+        if not convert:
+            raise FileNotFoundError(
+                f"No CSR citation graph in {kg_path}; "
+                f"run `python sb_graph.py {kg_path}` first"
+            )
+        convert_citations_to_csr(kg_path)
+
+    mmap_mode = "r" if mmap else None
+    arrays = {
+        field: np.load(kg_path / filename, mmap_mode=mmap_mode)
+        for field, filename in GRAPH_FILES.items()
+    }
+    years = np.load(kg_path / YEARS_FILE, mmap_mode=mmap_mode)
+    return CitationGraph(years=years, **arrays)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the citation JSONL to CSR arrays")
+    parser.add_argument("kg_path", type=Path)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="parse in parallel with this many processes")
+    parser.add_argument("--keep-decompressed", action="store_true",
+                        help="keep the plain JSONL written for parallel parsing")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("CONVERTING CITATION GRAPH TO CSR")
+    print("=" * 70)
+    convert_citations_to_csr(args.kg_path, workers=args.workers,
+                             keep_decompressed=args.keep_decompressed)
@@ -11,11 +11,14 @@ PI: YS
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 from dataclasses import dataclass
 from datetime import datetime
 import json
 
+from sb_curves import CitationMatrix, citations_by_year_dicts, window_sums
+from sb_index import PaperIndex
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -35,7 +38,6 @@ SB_THRESHOLDS = {
 
 # Year ranges for "early" and "late" periods
 EARLY_YEARS = 3  # First N years for early citations
-RECENT_CUTOFF = 2025  # Papers published up to this year
 
 # =============================================================================
 # DATA STRUCTURES
@@ -97,6 +99,201 @@ class SleepingBeautyCandidate:
     proposed_rationale: Optional[str] = None
 
 
+def _object_array(values: list) -> np.ndarray:
+    """1-D object array, even when the elements are equal-length lists."""
+    arr = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        arr[i] = value
+    return arr
+
+
+class PaperTable:
+    """
+    Struct-of-arrays collection of papers exposing the Paper fields.
+    
+    Row i of every array (and of matrix.counts) describes one paper. The
+    derived Paper properties are computed once for all rows as arrays, with
+    NaN where the Paper property would be None. Use view(i) / views() where
+    code still expects a per-paper object.
+    """
+    
+    def __init__(self, arxiv_id: np.ndarray, year: np.ndarray,
+                 total_citations: np.ndarray, matrix: CitationMatrix,
+                 title: Optional[np.ndarray] = None,
+                 abstract: Optional[np.ndarray] = None,
+                 concepts: Optional[np.ndarray] = None):
+        self.arxiv_id = np.asarray(arxiv_id, dtype=object)
+        self.year = np.asarray(year, dtype=np.int64)
+        self.total_citations = np.asarray(total_citations, dtype=np.int64)
+        self.matrix = matrix
+        self.title = title
+        self.abstract = abstract
+        self.concepts = concepts
+        self._cache = {}
+    
+    def __len__(self) -> int:
+        return len(self.year)
+    
+    @classmethod
+    def from_matrix(cls, index: PaperIndex, matrix: CitationMatrix,
+                    paper_indices: Optional[np.ndarray] = None) -> "PaperTable":
+        """Table over papers of the corpus citation matrix (default: all known)."""
+        if paper_indices is None:
+            paper_indices = np.flatnonzero(index.known)
+        paper_indices = np.asarray(paper_indices)
+        counts = matrix.counts[paper_indices]
+        return cls(
+            arxiv_id=index.arxiv_ids(paper_indices).astype(object),
+            year=index.year[paper_indices],
+            total_citations=counts.sum(axis=1),
+            matrix=CitationMatrix(counts=counts, first_year=matrix.first_year),
+        )
+    
+    @classmethod
+    def from_papers(cls, papers: List[Paper]) -> "PaperTable":
+        """Table built from Paper objects (copies their citations_by_year)."""
+        all_years = [y for p in papers for y in p.citations_by_year]
+        all_years += [p.year for p in papers]
+        first_year = min(all_years, default=0)
+        last_year = max(all_years, default=0)
+        
+        counts = np.zeros((len(papers), last_year - first_year + 1), dtype=np.int32)
+        for i, paper in enumerate(papers):
+            if paper.citations_by_year:
+                cols = np.fromiter(paper.citations_by_year.keys(), dtype=np.int64) - first_year
+                counts[i, cols] = np.fromiter(paper.citations_by_year.values(), dtype=np.int64)
+        
+        return cls(
+            arxiv_id=_object_array([p.arxiv_id for p in papers]),
+            year=np.array([p.year for p in papers], dtype=np.int64),
+            total_citations=np.array([p.total_citations for p in papers], dtype=np.int64),
+            matrix=CitationMatrix(counts=counts, first_year=first_year),
+            title=_object_array([p.title for p in papers]),
+            abstract=_object_array([p.abstract for p in papers]),
+            concepts=_object_array([p.concepts for p in papers]),
+        )
+    
+    def _cached(self, name: str, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+    
+    @property
+    def early_citations(self) -> np.ndarray:
+        """Citations in first EARLY_YEARS years (Paper.early_citations)."""
+        return self._cached("early", lambda: window_sums(
+            self.matrix, self.year, 0, EARLY_YEARS + 1))
+    
+    @property
+    def late_citations(self) -> np.ndarray:
+        """Citations from year + EARLY_YEARS through the last year of the matrix."""
+        return self._cached("late", lambda: window_sums(
+            self.matrix, self.year, EARLY_YEARS, self.matrix.last_year + 1 - self.year))
+    
+    @property
+    def peak_citations(self) -> np.ndarray:
+        """Maximum citations in any year (NaN if never cited)."""
+        def compute():
+            peak = self.matrix.counts.max(axis=1, initial=0).astype(np.float64)
+            peak[~self._has_citations] = np.nan
+            return peak
+        return self._cached("peak_citations", compute)
+    
+    @property
+    def peak_year(self) -> np.ndarray:
+        """First year with maximum citations (NaN if never cited)."""
+        def compute():
+            peak = (np.argmax(self.matrix.counts, axis=1) + self.matrix.first_year).astype(np.float64)
+            peak[~self._has_citations] = np.nan
+            return peak
+        return self._cached("peak_year", compute)
+    
+    @property
+    def delay_to_peak(self) -> np.ndarray:
+        """Years from publication to citation peak."""
+        return self.peak_year - self.year
+    
+    @property
+    def beauty_coefficient(self) -> np.ndarray:
+        """Ratio of peak to early citations (NaN where Paper gives None)."""
+        def compute():
+            early = self.early_citations.astype(np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(early > 0, self.peak_citations / early, np.nan)
+        return self._cached("beauty", compute)
+    
+    @property
+    def _has_citations(self) -> np.ndarray:
+        return self._cached("has_citations", lambda: self.matrix.counts.any(axis=1))
+    
+    def view(self, i: int) -> "PaperView":
+        return PaperView(self, i)
+    
+    def views(self, rows: Optional[np.ndarray] = None) -> List["PaperView"]:
+        rows = range(len(self)) if rows is None else rows
+        return [PaperView(self, int(i)) for i in rows]
+
+
+class PaperView:
+    """Read-only per-row view of a PaperTable with the Paper interface."""
+    __slots__ = ("_table", "_row")
+    
+    def __init__(self, table: PaperTable, row: int):
+        self._table = table
+        self._row = row
+    
+    def _field(self, name, default=None):
+        values = getattr(self._table, name)
+        return default if values is None else values[self._row]
+    
+    @staticmethod
+    def _optional(value):
+        return None if np.isnan(value) else value
+    
+    arxiv_id = property(lambda self: str(self._table.arxiv_id[self._row]))
+    year = property(lambda self: int(self._table.year[self._row]))
+    title = property(lambda self: self._field("title", ""))
+    abstract = property(lambda self: self._field("abstract", ""))
+    concepts = property(lambda self: self._field("concepts", []))
+    total_citations = property(lambda self: int(self._table.total_citations[self._row]))
+    early_citations = property(lambda self: int(self._table.early_citations[self._row]))
+    
+    @property
+    def citations_by_year(self) -> Dict[int, int]:
+        return citations_by_year_dicts(self._table.matrix, rows=np.array([self._row]))[0]
+    
+    @property
+    def peak_year(self) -> Optional[int]:
+        value = self._optional(self._table.peak_year[self._row])
+        return None if value is None else int(value)
+    
+    @property
+    def peak_citations(self) -> Optional[int]:
+        value = self._optional(self._table.peak_citations[self._row])
+        return None if value is None else int(value)
+    
+    @property
+    def delay_to_peak(self) -> Optional[int]:
+        value = self._optional(self._table.delay_to_peak[self._row])
+        return None if value is None else int(value)
+    
+    @property
+    def beauty_coefficient(self) -> Optional[float]:
+        return self._optional(float(self._table.beauty_coefficient[self._row]))
+    
+    def to_paper(self) -> Paper:
+        """Materialize a standalone Paper dataclass for this row."""
+        return Paper(
+            arxiv_id=self.arxiv_id,
+            year=self.year,
+            title=self.title,
+            abstract=self.abstract,
+            concepts=list(self.concepts),
+            total_citations=self.total_citations,
+            citations_by_year=self.citations_by_year,
+        )
+
+
 # =============================================================================
 # DATA LOADING
 # =============================================================================
@@ -135,29 +332,123 @@ def fetch_citations_from_ads(arxiv_ids: List[str],
     """
     Fetch citation data from NASA ADS API.
     
-    This is a placeholder - actual implementation needs ADS API key.
+    Needs an ADS API key in ADS_API_TOKEN. arXiv ids are looked up with
+    identifier: queries through sb_fetch.AdsFetcher (bibcodes go in
+    bigquery batches of batch_size); responses are cached on disk, so
+    repeated calls only hit the API for new ids. Ids ADS does not know are
+    left out of the result and asked for again once the cached miss expires.
     """
-    # TODO: Implement ADS API call
-    # ADS API: https://ads.readthedocs.io/
-    pass
+    from sb_fetch import AdsFetcher
+    curves = AdsFetcher(batch_size=batch_size).fetch(arxiv_ids)
+    return {pid: curve for pid, curve in curves.items() if curve is not None}
 
 
 def fetch_citations_from_semanticscholar(arxiv_ids: List[str]) -> Dict[str, Dict[int, int]]:
     """
     Fetch citation data from Semantic Scholar API.
     
-    Free tier: 100 requests/minute, 100K/year
+    Free tier: 100 requests/minute, 100K/year. Uses the 500-id batch
+    endpoint through sb_fetch.SemanticScholarFetcher (S2_API_KEY optional),
+    with the same on-disk cache as the ADS fetch.
     """
-    # TODO: Implement Semantic Scholar API
-    # API: https://api.semanticscholar.org/
-    pass
+    from sb_fetch import SemanticScholarFetcher
+    curves = SemanticScholarFetcher().fetch(arxiv_ids)
+    return {pid: curve for pid, curve in curves.items() if curve is not None}
+
+
+def build_paper_list(index: PaperIndex,
+                     matrix: CitationMatrix,
+                     paper_indices: Optional[np.ndarray] = None) -> List[Paper]:
+    """
+    Build Paper objects with citations_by_year filled from a citation matrix.
+    
+    index comes from sb_index.load_paper_index() and the matrix from
+    sb_curves.build_citation_matrix(). Defaults to every paper in the index
+    mapping. Titles, abstracts and concepts are left empty.
+    """
+    if paper_indices is None:
+        paper_indices = np.flatnonzero(index.known)
+    paper_indices = np.asarray(paper_indices)
+    
+    arxiv_ids = index.arxiv_ids(paper_indices).astype(object)
+    by_year = citations_by_year_dicts(matrix, rows=paper_indices)
+    totals = matrix.counts[paper_indices].sum(axis=1).tolist()
+    
+    return [
+        Paper(
+            arxiv_id=str(arxiv_id),
+            year=int(year),
+            title="",
+            abstract="",
+            concepts=[],
+            total_citations=total,
+            citations_by_year=curve,
+        )
+        for arxiv_id, year, total, curve in zip(
+            arxiv_ids, index.year[paper_indices].tolist(), totals, by_year
+        )
+    ]
 
 
 # =============================================================================
 # IDENTIFICATION ALGORITHMS
 # =============================================================================
 
-def identify_sb_by_peak_delay(papers: List[Paper], 
+PaperCollection = Union[List[Paper], PaperTable]
+
+
+def _as_table(papers: PaperCollection):
+    """Return (table, row -> paper object) for a list of Papers or a PaperTable."""
+    if isinstance(papers, PaperTable):
+        return papers, papers.view
+    return PaperTable.from_papers(papers), papers.__getitem__
+
+
+def _ranked_candidates(row_object, mask: np.ndarray, score: np.ndarray,
+                       method: str) -> List[SleepingBeautyCandidate]:
+    """Candidates for the masked rows, highest score first (stable on ties)."""
+    rows = np.flatnonzero(mask)
+    rows = rows[np.argsort(-score[rows], kind="stable")]
+    return [
+        SleepingBeautyCandidate(paper=row_object(int(i)), method=method, score=float(score[i]))
+        for i in rows
+    ]
+
+
+def peak_delay_mask(table: PaperTable,
+                    threshold_years: int = 10,
+                    min_late_citations: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Boolean mask and score array for identify_sb_by_peak_delay."""
+    with np.errstate(invalid="ignore"):
+        mask = ((table.delay_to_peak >= threshold_years) &
+                (table.late_citations >= min_late_citations))
+    score = table.delay_to_peak * np.log1p(np.nan_to_num(table.peak_citations))
+    return mask, score
+
+
+def ratio_mask(table: PaperTable,
+               ratio_threshold: float = 10,
+               min_early: int = 1,
+               min_total: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+    """Boolean mask and score array for identify_sb_by_ratio."""
+    with np.errstate(invalid="ignore"):
+        mask = ((table.beauty_coefficient >= ratio_threshold) &
+                (table.early_citations >= min_early) &
+                (table.total_citations >= min_total))
+    score = table.beauty_coefficient * np.log1p(table.total_citations)
+    return mask, score
+
+
+def absolute_mask(table: PaperTable,
+                  max_early: int = 5,
+                  min_late: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+    """Boolean mask and score array for identify_sb_by_absolute."""
+    mask = (table.early_citations <= max_early) & (table.late_citations >= min_late)
+    score = table.late_citations / (table.early_citations + 1)
+    return mask, score
+
+
+def identify_sb_by_peak_delay(papers: PaperCollection, 
                                threshold_years: int = 10,
                                min_late_citations: int = 10) -> List[SleepingBeautyCandidate]:
     """
@@ -165,32 +456,12 @@ def identify_sb_by_peak_delay(papers: List[Paper],
     
     Paper is SB if peak citations occur >= threshold_years after publication.
     """
-    candidates = []
-    
-    for paper in papers:
-        if paper.delay_to_peak is None:
-            continue
-            
-        # Check if peak is delayed enough
-        if paper.delay_to_peak >= threshold_years:
-            # Additional check: has meaningful late citations
-            late_citations = sum(
-                paper.citations_by_year.get(y, 0)
-                for y in range(paper.year + EARLY_YEARS, 2026)
-            )
-            
-            if late_citations >= min_late_candidates:
-                score = paper.delay_to_peak * np.log1p(paper.peak_citations or 0)
-                candidates.append(SleepingBeautyCandidate(
-                    paper=paper,
-                    method=f"peak-delay-{threshold_years}y",
-                    score=score
-                ))
-    
-    return sorted(candidates, key=lambda x: x.score, reverse=True)
-
-
-def identify_sb_by_ratio(papers: List[Paper],
+    table, row_object = _as_table(papers)
+    mask, score = peak_delay_mask(table, threshold_years, min_late_citations)
+    return _ranked_candidates(row_object, mask, score, f"peak-delay-{threshold_years}y")
+
+
+def identify_sb_by_ratio(papers: PaperCollection,
                          ratio_threshold: float = 10,
                          min_early: int = 1,
                          min_total: int = 20) -> List[SleepingBeautyCandidate]:
@@ -199,27 +470,12 @@ def identify_sb_by_ratio(papers: List[Paper],
     
     Paper is SB if beauty coefficient >= ratio_threshold.
     """
-    candidates = []
-    
-    for paper in papers:
-        if paper.beauty_coefficient is None:
-            continue
-            
-        if (paper.beauty_coefficient >= ratio_threshold and
-            paper.early_citations >= min_early and
-            paper.total_citations >= min_total):
-            
-            score = paper.beauty_coefficient * np.log1p(paper.total_citations)
-            candidates.append(SleepingBeautyCandidate(
-                paper=paper,
-                method=f"ratio-{ratio_threshold}x",
-                score=score
-            ))
-    
-    return sorted(candidates, key=lambda x: x.score, reverse=True)
-
-
-def identify_sb_by_absolute(papers: List[Paper],
+    table, row_object = _as_table(papers)
+    mask, score = ratio_mask(table, ratio_threshold, min_early, min_total)
+    return _ranked_candidates(row_object, mask, score, f"ratio-{ratio_threshold}x")
+
+
+def identify_sb_by_absolute(papers: PaperCollection,
                             max_early: int = 5,
                             min_late: int = 50) -> List[SleepingBeautyCandidate]:
     """
@@ -227,24 +483,9 @@ def identify_sb_by_absolute(papers: List[Paper],
     
     Paper is SB if: few early citations (< max_early) but many later (> min_late).
     """
-    candidates = []
-    
-    for paper in papers:
-        if paper.early_citations <= max_early:
-            late_citations = sum(
-                paper.citations_by_year.get(y, 0)
-                for y in range(paper.year + EARLY_YEARS, 2026)
-            )
-            
-            if late_citations >= min_late:
-                score = late_citations / (paper.early_citations + 1)
-                candidates.append(SleepingBeautyCandidate(
-                    paper=paper,
-                    method="absolute",
-                    score=score
-                ))
-    
-    return sorted(candidates, key=lambda x: x.score, reverse=True)
+    table, row_object = _as_table(papers)
+    mask, score = absolute_mask(table, max_early, min_late)
+    return _ranked_candidates(row_object, mask, score, "absolute")
 
 
 # =============================================================================
@@ -269,23 +510,70 @@ def analyze_concept_correlation(candidates: List[SleepingBeautyCandidate]) -> Di
     }
 
 
-def classify_by_rationale(candidates: List[SleepingBeautyCandidate]) -> Dict[str, List]:
+def group_by_literature(candidates: List[SleepingBeautyCandidate], graph,
+                        index: PaperIndex, **kwargs) -> Dict[int, List[SleepingBeautyCandidate]]:
+    """
+    Group candidates by shared citing and cited literature.
+
+    Clusters of co-citation / bibliographic-coupling neighbours from
+    sb_similarity.cluster_papers() (kwargs are passed on), largest first;
+    candidates missing from the index are left out.
+    """
+    from sb_similarity import cluster_papers
+
+    positions = pd.Index(np.asarray(index.arxiv_id)).get_indexer(
+        [c.paper.arxiv_id for c in candidates])
+    known = [(c, p) for c, p in zip(candidates, positions) if p >= 0]
+    paper_indices = np.unique([p for _, p in known])
+    clusters = cluster_papers(graph, paper_indices, **kwargs)
+    label = dict(zip(clusters["paper_idx"], clusters["cluster"]))
+
+    groups: Dict[int, List[SleepingBeautyCandidate]] = {}
+    for cand, p in known:
+        groups.setdefault(int(label[p]), []).append(cand)
+    return dict(sorted(groups.items()))
+
+
+def classify_by_rationale(candidates: List[SleepingBeautyCandidate],
+                          corpus: Optional[Path] = None,
+                          workers: Optional[int] = None) -> Dict[str, List]:
     """
     Classify SBs by their proposed awakening rationale.
     
-    This requires manual curation + NLP analysis.
+    Candidates that already carry a proposed_rationale (manual curation)
+    keep it; the others are pre-classified from title, abstract and
+    concepts by the hashed tf-idf nearest-centroid model in sb_text.py and
+    get proposed_rationale set. With a metadata corpus file, idf weights
+    come from the whole corpus (cached) and candidates without text of
+    their own use their corpus entry.
     """
-    # Placeholder - to be implemented with text analysis
-    classifications = {
-        "premature_discovery": [],
-        "methodological_innovation": [],
-        "data_release": [],
-        "theoretical_framework": [],
-        "observational_discovery": [],
-        "negative_results": [],
-        "review_synthesis": [],
-        "unclassified": []
-    }
+    from sb_text import RATIONALES, NearestCentroid, TfidfModel, paper_text, term_counts
+
+    classifications = {name: [] for name in RATIONALES}
+    if not candidates:
+        return classifications
+
+    counts = term_counts([paper_text(c.paper) for c in candidates], workers=workers)
+    fit_on = counts
+    if corpus is not None:
+        from scipy import sparse
+
+        from sb_cache import ArtifactCache
+        from sb_text import cached_term_counts
+
+        _, ids, fit_on = cached_term_counts(ArtifactCache(), corpus, workers=workers)
+        rows = pd.Index(ids).get_indexer([c.paper.arxiv_id for c in candidates])
+        use_corpus = (rows >= 0) & (np.diff(counts.indptr) == 0)
+        stacked = sparse.vstack([counts, fit_on[np.maximum(rows, 0)]]).tocsr()
+        n = len(candidates)
+        counts = stacked[np.where(use_corpus, n + np.arange(n), np.arange(n))]
+
+    tfidf = TfidfModel.fit(fit_on)
+    predicted = NearestCentroid.from_keywords(tfidf).predict(tfidf.transform(counts))
+    for cand, label in zip(candidates, predicted["rationale"]):
+        if cand.proposed_rationale is None:
+            cand.proposed_rationale = label
+        classifications.setdefault(cand.proposed_rationale, []).append(cand)
     
     return classifications
 
@@ -297,6 +585,8 @@ def classify_by_rationale(candidates: List[SleepingBeautyCandidate]) -> Dict[str
 def plot_citation_trajectory(paper: Paper, save_path: Optional[Path] = None):
     """
     Plot citation trajectory over time.
+
+    For more than a handful of papers use sb_plots.render_trajectories().
     """
     import matplotlib.pyplot as plt
     
@@ -353,45 +643,19 @@ def plot_sb_distribution(candidates: List[SleepingBeautyCandidate],
 # MAIN PIPELINE
 # =============================================================================
 
-def run_pipeline():
+def run_pipeline(config_path: Optional[Path] = None, overrides: List[str] = ()):
     """
     Main pipeline to identify and analyze sleeping beauties.
+
+    Runs ingest -> curves -> identify -> export of sb.py with the given
+    config file (default sb.toml) and returns the exported paths.
     """
-    print("=" * 60)
-    print("Astro-ph Sleeping Beauty Pipeline")
-    print("=" * 60)
-    
-    # Step 1: Load data
-    print("\n[1/5] Loading knowledge graph data...")
-    kg_data = load_knowledge_graph_data()
-    
-    # Step 2: Fetch citations (placeholder)
-    print("\n[2/5] Fetching citation data...")
-    # citations = fetch_citations_from_ads(...) 
-    
-    # Step 3: Identify SBs
-    print("\n[3/5] Identifying sleeping beauties...")
-    # papers = build_paper_list(...)
-    # sb_peak = identify_sb_by_peak_delay(papers)
-    # sb_ratio = identify_sb_by_ratio(papers)
-    # sb_abs = identify_sb_by_absolute(papers)
-    
-    # Step 4: Analyze
-    print("\n[4/5] Analyzing concepts and rationale...")
-    # concept_analysis = analyze_concept_correlation(all_sb)
-    
-    # Step 5: Visualize
-    print("\n[5/5] Generating visualizations...")
-    # plot_sb_distribution(...)
-    
-    print("\n" + "=" * 60)
-    print("Pipeline complete!")
-    print("=" * 60)
-    
-    return {
-        "status": "needs_data",
-        "message": "Full pipeline requires citation data from ADS/Semantic Scholar"
-    }
+    from sb import Pipeline, load_config
+
+    pipeline = Pipeline(load_config(config_path, overrides))
+    exported = pipeline.result("export")
+    pipeline.run.print_summary()
+    return exported
 
 
 if __name__ == "__main__":
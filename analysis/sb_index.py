@@ -0,0 +1,108 @@
+"""
+Paper Index
+
+arxiv_id and publication year as arrays aligned on paper_idx, built once
+from papers_index_mapping.csv.gz and papers_years.npy. Replaces the
+per-row dict lookups (paper_info / paper_lookup) with array takes and
+vectorized joins.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MAPPING_FILE = "papers_index_mapping.csv.gz"
+YEARS_FILE = "papers_years.npy"
+
+# =============================================================================
+# DATA STRUCTURES
+# =============================================================================
+
+@dataclass
+class PaperIndex:
+    """
+    Per-paper attributes aligned on paper_idx (position i = paper i).
+
+    arxiv_id is a pandas Categorical, so the ~400k ids are stored once as
+    categories plus an int32 code per paper; code -1 means the paper has no
+    row in the mapping file.
+    """
+    arxiv_id: pd.Categorical
+    year: np.ndarray
+
+    @property
+    def n_papers(self) -> int:
+        return len(self.year)
+
+    @property
+    def known(self) -> np.ndarray:
+        """True where the paper appears in the index mapping."""
+        return self.arxiv_id.codes >= 0
+
+    def arxiv_ids(self, paper_idx: np.ndarray) -> pd.Categorical:
+        """arxiv_id for each paper_idx (NaN where unknown)."""
+        return self.arxiv_id.take(np.asarray(paper_idx, dtype=np.int64))
+
+    def join(self, df: pd.DataFrame, on: str = "paper_idx",
+             columns: Sequence[str] = ("arxiv_id",)) -> pd.DataFrame:
+        """
+        Return df with the requested index columns inserted after `on`.
+
+        The join is a positional take on df[on], not a hash merge.
+        """
+        positions = df[on].to_numpy(dtype=np.int64)
+        out = df.copy()
+        loc = out.columns.get_loc(on) + 1
+        for offset, column in enumerate(columns):
+            if column == "arxiv_id":
+                values = self.arxiv_ids(positions)
+            elif column == "year":
+                values = self.year[positions]
+            else:
+                raise KeyError(f"PaperIndex has no column {column!r}")
+            if column in out.columns:
+                out[column] = values
+            else:
+                out.insert(loc + offset, column, values)
+        return out
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+def build_paper_index(mapping: pd.DataFrame, years: np.ndarray) -> PaperIndex:
+    """Align a (paper_idx, arxiv_id) mapping frame with the years array."""
+    n_papers = len(years)
+    paper_idx = mapping["paper_idx"].to_numpy(dtype=np.int64)
+    in_range = (paper_idx >= 0) & (paper_idx < n_papers)
+
+    codes_in_mapping, categories = pd.factorize(mapping["arxiv_id"].to_numpy()[in_range])
+    codes = np.full(n_papers, -1, dtype=np.int32)
+    codes[paper_idx[in_range]] = codes_in_mapping
+
+    return PaperIndex(
+        arxiv_id=pd.Categorical.from_codes(codes, categories=categories),
+        year=np.asarray(years),
+    )
+
+
+def load_paper_index(kg_path: Path, years: Optional[np.ndarray] = None) -> PaperIndex:
+    """
+    Load the paper index from a knowledge-graph directory.
+
+    arxiv_id is read as a string so old-style ids such as 0705.1780 keep
+    their leading zero and trailing digits.
+    """
+    kg_path = Path(kg_path)
+    if years is None:
+        years = np.load(kg_path / YEARS_FILE)
+    mapping = pd.read_csv(kg_path / MAPPING_FILE, dtype={"arxiv_id": str})
+    return build_paper_index(mapping, years)
@@ -0,0 +1,224 @@
+"""
+Stage Instrumentation
+
+Lightweight per-stage measurements for the pipeline scripts:
+
+    with run.stage("compute metrics") as s:
+        df = compute_metrics(...)
+        s.records = len(df)
+
+Each stage records wall and CPU time, the process peak RSS (including
+worker processes) and its growth during the stage, records/sec when the
+stage reports a record count, two read figures for the process and its
+finished worker processes, and the total size of the input paths given:
+
+    logical read   bytes returned by read() calls (rchar in /proc/self/io),
+                   page-cache hits and pipe / IPC traffic included
+    disk read      bytes read from the block device (getrusage block
+                   input), i.e. only what the page cache did not serve
+
+Pages of memory-mapped files (the CSR arrays) are faulted in rather than
+read(), so they count as disk reads when they come from the device but
+never as logical reads. cProfile and tracemalloc can be switched on per
+run; profiles are written as .prof files and the top functions are
+included in the JSON run report, so runs can be compared for regressions.
+"""
+
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+PROFILE_TOP = 15  # functions per stage listed in the report
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+BLOCK_SIZE = 512  # ru_inblock unit
+
+# =============================================================================
+# MEASUREMENTS
+# =============================================================================
+
+def peak_rss() -> int:
+    """Peak resident set size in bytes of this process and its children."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * RSS_UNIT
+
+
+def cpu_seconds() -> float:
+    """User + system CPU time of this process and its finished children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def bytes_read() -> int:
+    """
+    Bytes read from storage so far by this process and its waited-for children.
+
+    Block input operations from getrusage (512-byte units), the same
+    quantity as read_bytes in /proc/<pid>/io. Reads served from the page
+    cache and pipe / IPC traffic (e.g. ProcessPoolExecutor results) are not
+    included.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (own.ru_inblock + children.ru_inblock) * BLOCK_SIZE
+
+
+def logical_bytes_read() -> Optional[int]:
+    """
+    Bytes read through read() calls so far by this process and its waited-for
+    children (rchar in /proc/self/io; the kernel adds reaped children to it).
+    None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=Path(__file__).resolve().parent, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+@dataclass
+class StageRecord:
+    """Measurements of one pipeline stage."""
+    name: str
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_bytes: int = 0
+    rss_growth_bytes: int = 0
+    logical_bytes_read: Optional[int] = None  # read() calls, incl. finished workers
+    bytes_read: Optional[int] = None        # from storage, incl. finished workers
+    input_bytes: Optional[int] = None       # size of the stage's input paths
+    records: Optional[int] = None
+    records_per_s: Optional[float] = None
+    tracemalloc_peak_bytes: Optional[int] = None
+    profile: Optional[List[Dict]] = None
+    extra: Dict = field(default_factory=dict)
+
+
+# =============================================================================
+# RUN
+# =============================================================================
+
+class Instrumentation:
+    """Collects StageRecords for one run and writes the JSON report."""
+
+    def __init__(self, name: str, profile: bool = False, trace_memory: bool = False,
+                 profile_dir: Optional[Path] = None):
+        self.name = name
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.stages: List[StageRecord] = []
+        self.started = datetime.now()
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, paths: Iterable[Path] = ()):
+        """Measure the enclosed block; set .records on the yielded record."""
+        record = StageRecord(name=name)
+        rss_before, read_before = peak_rss(), bytes_read()
+        logical_before = logical_bytes_read()
+        if self.trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile() if self.profile else None
+        wall, cpu = time.perf_counter(), cpu_seconds()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            record.wall_s = time.perf_counter() - wall
+            record.cpu_s = cpu_seconds() - cpu
+            record.peak_rss_bytes = peak_rss()
+            record.rss_growth_bytes = record.peak_rss_bytes - rss_before
+
+            record.bytes_read = bytes_read() - read_before
+            if logical_before is not None:
+                record.logical_bytes_read = logical_bytes_read() - logical_before
+            sizes = [Path(p).stat().st_size for p in paths if Path(p).is_file()]
+            record.input_bytes = sum(sizes) if sizes else None
+            if record.records is not None and record.wall_s > 0:
+                record.records_per_s = record.records / record.wall_s
+            if self.trace_memory:
+                record.tracemalloc_peak_bytes = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if profiler:
+                record.profile = self._profile_summary(name, profiler)
+            self.stages.append(record)
+
+    def _profile_summary(self, name: str, profiler: cProfile.Profile) -> List[Dict]:
+        if self.profile_dir:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            slug = "".join(c if c.isalnum() else "_" for c in name)
+            profiler.dump_stats(str(self.profile_dir / f"{self.name}-{slug}.prof"))
+        stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats("cumulative")
+        top = []
+        for func in stats.fcn_list[:PROFILE_TOP]:
+            calls, _, tottime, cumtime, _ = stats.stats[func]
+            top.append({"function": f"{func[0]}:{func[1]}({func[2]})", "calls": calls,
+                        "tottime_s": round(tottime, 4), "cumtime_s": round(cumtime, 4)})
+        return top
+
+    def report(self) -> Dict:
+        return {
+            "run": self.name,
+            "started": self.started.isoformat(timespec="seconds"),
+            "total_wall_s": time.perf_counter() - self._t0,
+            "peak_rss_bytes": peak_rss(),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git_revision": _git_revision(),
+            "pid": os.getpid(),
+            "stages": [asdict(s) for s in self.stages],
+        }
+
+    def write_report(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), indent=2))
+        return path
+
+    def print_summary(self):
+        print(f"    {'stage':<22}{'wall s':>9}{'cpu s':>9}{'peak RSS':>11}{'rec/s':>12}"
+              f"{'logical read':>14}{'disk read':>11}{'input':>11}")
+        for s in self.stages:
+            rate = f"{s.records_per_s:,.0f}" if s.records_per_s else "-"
+            logical = (f"{s.logical_bytes_read / 1e6:.1f} MB"
+                       if s.logical_bytes_read is not None else "-")
+            read = f"{s.bytes_read / 1e6:.1f} MB" if s.bytes_read is not None else "-"
+            size = f"{s.input_bytes / 1e6:.1f} MB" if s.input_bytes is not None else "-"
+            print(f"    {s.name:<22}{s.wall_s:>9.2f}{s.cpu_s:>9.2f}"
+                  f"{s.peak_rss_bytes / 1e6:>8.0f} MB{rate:>12}{logical:>14}{read:>11}{size:>11}")
@@ -0,0 +1,264 @@
+"""
+Sleeping Beauty Metrics
+
+Vectorized per-paper metrics (age, totals, early/late citations, beauty
+ratio) computed from citation rows, plus a streaming stage that reads
+citations_indexed.jsonl.gz in fixed-size chunks and appends the metrics of
+each chunk to the output, so peak memory does not grow with the input.
+
+Run as a script, the streaming stage writes the all_papers_metrics table
+and candidate CSVs without building the citation graph (sb.py builds it
+for the slope and baseline stages).
+
+Usage:
+    python sb_metrics.py /path/to/astro-ph-kg-full out_dir [--csv] \\
+        [--chunk-size 50000] [--format parquet] [--current-year 2025] \\
+        [--early-years 3] [--min-age 5]
+"""
+
+import gzip
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sb_index import PaperIndex
+from sb_output import TableWriter, add_flag_columns, flag_column
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+CURRENT_YEAR = 2025    # Fallback only; scripts use horizon_year() of the snapshot
+EARLY_YEARS = 3       # Early window = ages 0..EARLY_YEARS-1
+MIN_PAPER_AGE = 5     # Papers younger than this are not scored
+CHUNK_SIZE = 50_000   # Records per streaming chunk
+
+METRIC_COLUMNS = [
+    "paper_idx", "arxiv_id", "year", "paper_age", "total_citations",
+    "num_references", "citations_per_year", "early_citations_est",
+    "late_citations_est", "beauty_ratio_est",
+]
+
+# early/late_citations_est are exact counts of citations at ages
+# [0, early_years) and >= early_years (dated by the citing paper's year);
+# the _est names are kept so the columns of the existing CSVs stay the same.
+# num_references is the record's own reference count (num_references in
+# citations_indexed.jsonl.gz), not only the references inside the corpus.
+
+# Candidate criteria on the metrics table (flag columns is_<name>)
+SB_CRITERIA = {
+    # SB-10: 10+ years old, peak delayed
+    "sb_10": lambda d: (d['paper_age'] >= 10) & (d['total_citations'] >= 10),
+    # SB-15: 15+ years old
+    "sb_15": lambda d: (d['paper_age'] >= 15) & (d['total_citations'] >= 20),
+    # SB-conservative: 10+ years, beauty ratio > 3, at least 20 citations
+    "sb_ratio": lambda d: ((d['paper_age'] >= 10) &
+                           (d['beauty_ratio_est'] > 3) &
+                           (d['total_citations'] >= 20)),
+    # SB-absolute: old papers with few early but decent late
+    "sb_abs": lambda d: ((d['paper_age'] >= 10) &
+                         (d['early_citations_est'] < 10) &
+                         (d['late_citations_est'] > 30)),
+    # Pilot: 15+ years, moderately cited (not famous, not ignored)
+    "sb_pilot": lambda d: ((d['paper_age'] >= 15) &
+                           (d['total_citations'] >= 20) &
+                           (d['total_citations'] <= 200)),
+}
+
+# Per-criterion candidate CSV (file name, sort column, descending)
+CANDIDATE_FILES = {
+    "sb_10": ("sb_candidates_10yr.csv", "beauty_ratio_est"),
+    "sb_15": ("sb_candidates_15yr.csv", "beauty_ratio_est"),
+    "sb_ratio": ("sb_candidates_ratio.csv", "beauty_ratio_est"),
+    "sb_abs": ("sb_candidates_absolute.csv", "late_citations_est"),
+    "sb_pilot": ("sb_candidates_pilot.csv", "total_citations"),
+}
+
+# =============================================================================
+# METRICS
+# =============================================================================
+
+def horizon_year(years: np.ndarray) -> int:
+    """Latest publication year in a snapshot; paper ages are measured against it."""
+    return int(np.max(years))
+
+
+def compute_metrics(paper_idx: np.ndarray,
+                    indptr: np.ndarray,
+                    indices: np.ndarray,
+                    num_references: np.ndarray,
+                    index: PaperIndex,
+                    current_year: int = CURRENT_YEAR,
+                    early_years: int = EARLY_YEARS,
+                    min_age: int = MIN_PAPER_AGE) -> pd.DataFrame:
+    """
+    Metrics for a batch of papers given their citing-paper rows.
+
+    Row k (indices[indptr[k]:indptr[k+1]]) lists the papers citing
+    paper_idx[k]. Papers missing from the index mapping or younger than
+    min_age are dropped. Columns follow METRIC_COLUMNS.
+    """
+    paper_idx = np.asarray(paper_idx, dtype=np.int64)
+    indptr = np.asarray(indptr, dtype=np.int64)
+    n_rows = len(paper_idx)
+    years = index.year
+    n_papers = index.n_papers
+
+    row_of_edge = np.repeat(np.arange(n_rows), np.diff(indptr))
+    citing = np.asarray(indices[indptr[0]:indptr[-1]], dtype=np.int64)
+    in_corpus = (citing >= 0) & (citing < n_papers)
+    row_of_edge, citing = row_of_edge[in_corpus], citing[in_corpus]
+
+    pub_year = years[paper_idx].astype(np.int64)
+    age_at_citation = years[citing] - pub_year[row_of_edge]
+
+    total = np.bincount(row_of_edge, minlength=n_rows)
+    early = np.bincount(row_of_edge[(age_at_citation >= 0) & (age_at_citation < early_years)],
+                        minlength=n_rows)
+    late = np.bincount(row_of_edge[age_at_citation >= early_years], minlength=n_rows)
+
+    df = pd.DataFrame({
+        "paper_idx": paper_idx,
+        "arxiv_id": index.arxiv_ids(paper_idx),
+        "year": pub_year,
+        "paper_age": current_year - pub_year,
+        "total_citations": total,
+        "num_references": np.asarray(num_references, dtype=np.int64),
+        "early_citations_est": early,
+        "late_citations_est": late,
+    })
+    df = df[index.known[paper_idx] & (df["paper_age"] >= min_age).to_numpy()]
+
+    df["citations_per_year"] = df["total_citations"] / (df["paper_age"] + 1)
+    early_f = df["early_citations_est"].to_numpy(dtype=float)
+    late_f = df["late_citations_est"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["beauty_ratio_est"] = np.where(
+            early_f > 0, late_f / early_f, np.where(late_f > 0, np.inf, 0.0)
+        )
+
+    return df[METRIC_COLUMNS].reset_index(drop=True)
+
+
+# =============================================================================
+# STREAMING
+# =============================================================================
+
+def iter_record_chunks(citations_path: Path, n_papers: int,
+                       chunk_size: int = CHUNK_SIZE
+                       ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yield (paper_idx, indptr, citing_indices, num_references) per chunk.
+
+    num_references is the record's num_references field, as stored in
+    CitationGraph.num_references. Records with paper_idx >= n_papers are
+    skipped.
+    """
+    def flush(rows, lengths, flat, refs):
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return (np.asarray(rows, dtype=np.int64), indptr,
+                np.asarray(flat, dtype=np.int64), np.asarray(refs, dtype=np.int64))
+
+    rows, lengths, flat, refs = [], [], [], []
+    with gzip.open(citations_path, "rt") as f:
+        for line in f:
+            item = json.loads(line)
+            paper_idx = item["paper_idx"]
+            if paper_idx >= n_papers:
+                continue
+
+            citations = item.get("citations", [])
+            rows.append(paper_idx)
+            lengths.append(len(citations))
+            flat.extend(citations)
+            refs.append(item.get("num_references", 0))
+
+            if len(rows) >= chunk_size:
+                yield flush(rows, lengths, flat, refs)
+                rows, lengths, flat, refs = [], [], [], []
+
+    if rows:
+        yield flush(rows, lengths, flat, refs)
+
+
+def stream_metrics(citations_path: Path,
+                   index: PaperIndex,
+                   output_path: Path,
+                   chunk_size: int = CHUNK_SIZE,
+                   current_year: int = CURRENT_YEAR,
+                   verbose: bool = True,
+                   fmt: str = "csv",
+                   criteria: Optional[Dict[str, Callable]] = None,
+                   early_years: int = EARLY_YEARS,
+                   min_age: int = MIN_PAPER_AGE) -> int:
+    """
+    Compute metrics chunk by chunk and append them to output_path.
+
+    Only one chunk of records is held in memory at a time. fmt is any
+    sb_output format; criteria, if given, are evaluated per chunk and stored
+    as is_<name> flag columns. Rows are written in input order. Returns the
+    number of rows written.
+    """
+    flag_names = [flag_column(name) for name in (criteria or {})]
+    processed = 0
+
+    writer = TableWriter(output_path, fmt)
+    for paper_idx, indptr, citing, num_refs in iter_record_chunks(
+            citations_path, index.n_papers, chunk_size):
+        chunk = compute_metrics(paper_idx, indptr, citing, num_refs, index,
+                                current_year=current_year, early_years=early_years,
+                                min_age=min_age)
+        if criteria:
+            chunk = add_flag_columns(chunk, criteria)
+        writer.write(chunk)
+        processed += len(paper_idx)
+        if verbose:
+            print(f"    Processed {processed} papers...")
+
+    writer.close(empty_columns=METRIC_COLUMNS + flag_names)
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sb_index import load_paper_index
+    from sb_output import FORMATS, export_csv, read_table, table_path
+
+    parser = argparse.ArgumentParser(description="Bounded-memory SB metrics and candidates")
+    parser.add_argument("kg_path", type=Path)
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--csv", action="store_true",
+                        help="also export the per-criterion sb_candidates_*.csv files")
+    parser.add_argument("--top", type=int, default=100)
+    parser.add_argument("--current-year", type=int, default=None)
+    parser.add_argument("--early-years", type=int, default=EARLY_YEARS)
+    parser.add_argument("--min-age", type=int, default=MIN_PAPER_AGE)
+    args = parser.parse_args()
+
+    years = np.load(args.kg_path / "papers_years.npy")
+    index = load_paper_index(args.kg_path, years=years)
+    current_year = args.current_year or horizon_year(years)
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    metrics_path = table_path(args.out_dir, "all_papers_metrics", args.format)
+    n_rows = stream_metrics(args.kg_path / "citations_indexed.jsonl.gz", index, metrics_path,
+                            chunk_size=args.chunk_size, current_year=current_year,
+                            fmt=args.format, criteria=SB_CRITERIA,
+                            early_years=args.early_years, min_age=args.min_age)
+    print(f"    {n_rows} papers -> {metrics_path}")
+
+    flagged = read_table(metrics_path, any_flag=SB_CRITERIA)
+    for name, (filename, sort_by) in CANDIDATE_FILES.items():
+        subset = flagged[flagged[flag_column(name)]]
+        print(f"    {name:<9} {len(subset)}")
+        if args.csv:
+            export_csv(subset, args.out_dir / filename, sort_by=sort_by)
+    export_csv(flagged[flagged[flag_column("sb_ratio")]],
+               args.out_dir / f"top_{args.top}_sb_candidates.csv",
+               sort_by="beauty_ratio_est", head=args.top)
@@ -0,0 +1,232 @@
+"""
+Columnar Outputs
+
+One metrics table per run, written as a year-partitioned Parquet dataset
+(or a single Feather file), with candidate sets stored as boolean flag
+columns (is_sb_10, is_sb_ratio, ...) instead of overlapping CSV copies.
+CSV export is kept for the data/top_*.csv files.
+
+pyarrow is only needed for the Parquet / Feather formats and is imported
+when they are used.
+"""
+
+import json
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+FORMATS = ("parquet", "feather", "csv")
+SUFFIXES = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+PARTITION_COLS = ("year",)
+COLUMNS_FILE = "_columns.json"  # column order of a partitioned dataset
+FLAG_PREFIX = "is_"
+
+# =============================================================================
+# FLAGS
+# =============================================================================
+
+def flag_column(name: str) -> str:
+    """Column holding the membership flag for candidate set `name`."""
+    return FLAG_PREFIX + name
+
+
+def add_flag_columns(df: pd.DataFrame,
+                     criteria: Dict[str, Callable[[pd.DataFrame], pd.Series]]) -> pd.DataFrame:
+    """Return df with one boolean is_<name> column per criterion."""
+    return df.assign(**{
+        flag_column(name): np.asarray(predicate(df), dtype=bool)
+        for name, predicate in criteria.items()
+    })
+
+
+# =============================================================================
+# WRITING
+# =============================================================================
+
+def table_path(directory: Path, stem: str, fmt: str) -> Path:
+    """Output path for a table in the given format (a directory for parquet)."""
+    return Path(directory) / (stem + SUFFIXES[fmt])
+
+
+def _plain_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Categoricals -> plain values so every chunk has the same Arrow schema."""
+    categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    return df.assign(**{c: df[c].astype(object) for c in categorical})
+
+
+class TableWriter:
+    """
+    Append DataFrame chunks to a metrics table.
+
+    parquet: a hive-partitioned dataset directory (one file per partition
+             per chunk), column order recorded in _columns.json
+    feather: a single Arrow IPC file, one record batch per chunk
+    csv:     a single CSV file with one header
+    Any existing output at the path is replaced.
+    """
+
+    def __init__(self, path: Path, fmt: str = "parquet",
+                 partition_cols: Sequence[str] = PARTITION_COLS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+        self.path = Path(path)
+        self.fmt = fmt
+        self.partition_cols = list(partition_cols)
+        self.rows_written = 0
+        self._chunks = 0
+        self._columns: Optional[List[str]] = None
+        self._ipc_writer = None
+
+        if self.path.is_dir():
+            shutil.rmtree(self.path)
+        elif self.path.exists():
+            self.path.unlink()
+
+    def write(self, df: pd.DataFrame):
+        df = _plain_columns(df)
+        if self._columns is None:
+            self._columns = list(df.columns)
+
+        if self.fmt == "csv":
+            df.to_csv(self.path, mode="a" if self._chunks else "w",
+                      header=not self._chunks, index=False)
+        elif self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_to_dataset(
+                pa.Table.from_pandas(df, preserve_index=False),
+                root_path=str(self.path),
+                partition_cols=self.partition_cols,
+                basename_template=f"part-{self._chunks:05d}-{{i}}.parquet",
+            )
+        else:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._ipc_writer is None:
+                self._ipc_writer = pa.ipc.new_file(str(self.path), table.schema)
+            self._ipc_writer.write_table(table)
+
+        self._chunks += 1
+        self.rows_written += len(df)
+
+    def close(self, empty_columns: Optional[Sequence[str]] = None):
+        """Finish the table; empty_columns defines the schema if nothing was written."""
+        if self._columns is None and empty_columns is not None:
+            self.write(pd.DataFrame(columns=list(empty_columns)))
+            self.rows_written = 0
+        if self._ipc_writer is not None:
+            self._ipc_writer.close()
+        if self.fmt == "parquet" and self._columns is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            (self.path / COLUMNS_FILE).write_text(json.dumps(self._columns))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_table(df: pd.DataFrame, path: Path, fmt: str = "parquet",
+                partition_cols: Sequence[str] = PARTITION_COLS) -> Path:
+    """Write a whole DataFrame as one table."""
+    with TableWriter(path, fmt, partition_cols) as writer:
+        writer.write(df)
+    return Path(path)
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def _infer_format(path: Path) -> str:
+    for fmt, suffix in SUFFIXES.items():
+        if path.suffix == suffix:
+            return fmt
+    return "parquet" if path.is_dir() else "csv"
+
+
+def read_table(path: Path, columns: Optional[Iterable[str]] = None,
+               any_flag: Optional[Iterable[str]] = None,
+               fmt: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read a metrics table written by TableWriter.
+
+    columns restricts the columns read; any_flag keeps only rows where at
+    least one of the named flag columns is True (pushed down as a filter
+    for Parquet). Rows come back sorted by paper_idx when present.
+    """
+    path = Path(path)
+    fmt = fmt or _infer_format(path)
+    columns = list(columns) if columns is not None else None
+    flags = [flag_column(f) if not f.startswith(FLAG_PREFIX) else f
+             for f in (any_flag or [])]
+
+    if fmt == "csv":
+        parts = []
+        for chunk in pd.read_csv(path, chunksize=200_000, dtype={"arxiv_id": str},
+                                 float_precision="round_trip"):
+            if flags:
+                chunk = chunk[chunk[flags].any(axis=1)]
+            parts.append(chunk if columns is None else chunk[columns])
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        order = json.loads((path / COLUMNS_FILE).read_text())
+        filters = [[(f, "=", True)] for f in flags] or None
+        read_cols = None if columns is None else sorted(set(columns) | set(flags), key=order.index)
+        df = pq.read_table(str(path), columns=read_cols, filters=filters).to_pandas()
+        for col in PARTITION_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype(np.int64)
+        df = df[[c for c in order if c in df.columns]]
+        if columns is not None:
+            df = df[columns]
+    else:
+        import pyarrow as pa
+        with pa.ipc.open_file(str(path)) as reader:
+            df = reader.read_all().to_pandas()
+        if flags:
+            df = df[df[flags].any(axis=1)]
+        if columns is not None:
+            df = df[columns]
+
+    if "paper_idx" in df.columns:
+        df = df.sort_values("paper_idx", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def flagged_subsets(df: pd.DataFrame, names: Iterable[str]) -> Dict[str, pd.DataFrame]:
+    """Candidate set name -> rows whose is_<name> flag is set."""
+    return {name: df[df[flag_column(name)]] for name in names}
+
+
+# =============================================================================
+# CSV EXPORT
+# =============================================================================
+
+def export_csv(df: pd.DataFrame, path: Path,
+               sort_by: Optional[str] = None, ascending: bool = False,
+               head: Optional[int] = None, drop_flags: bool = True) -> Path:
+    """
+    Write a CSV slice for compatibility with the data/top_*.csv files.
+
+    Flag columns are dropped by default so the columns match the old files.
+    """
+    if drop_flags:
+        df = df[[c for c in df.columns if not c.startswith(FLAG_PREFIX)]]
+    if sort_by is not None:
+        df = df.sort_values(sort_by, ascending=ascending, kind="stable")
+    if head is not None:
+        df = df.head(head)
+    df.to_csv(path, index=False)
+    return Path(path)
@@ -0,0 +1,322 @@
+"""
+Batch Trajectory Plots
+
+Renders citation trajectories for thousands of papers as small-multiple
+grid pages (rows x cols cells, one paper per cell) for candidate review:
+
+    png      one PNG per page in an output directory
+    pdf      all pages in one multi-page PDF
+    sprite   pages stacked PAGES_PER_SHEET at a time into PNG sprite
+             sheets (sprite_000.png, sprite_001.png, ...), plus a JSON
+             index of the sheets and each paper's cell
+
+Pages are drawn with the Agg canvas directly (no pyplot state). Each
+worker process builds one page figure and reuses its artists, updating
+the bars, marker lines, limits and titles per page instead of creating
+new figures, and pages are spread over a process pool. Curves come from
+an sb_curvepack.CurveSet, so workers get compact encoded curves rather
+than the citation matrix.
+
+Rendering streams: at most MAX_PENDING tasks per worker are in flight,
+and the pdf / sprite writer holds one page (or one sprite sheet) at a
+time, writing each to disk as soon as it is complete, so memory does not
+grow with the number of candidates.
+
+matplotlib is imported in the workers when rendering starts.
+
+Usage:
+    python sb_plots.py curves.sbc out.pdf|sprite.png|page_dir [--workers N]
+                       [--pages-per-sheet 16]
+"""
+
+import argparse
+import json
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+from sb_curvepack import CurveSet, load_curves
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+ROWS, COLS = 4, 5
+CELL_SIZE = (2.4, 1.6)   # inches per cell
+DPI = 100
+PAGES_PER_TASK = 2
+MAX_PENDING = 4          # tasks in flight per worker
+PAGES_PER_SHEET = 16     # grid pages per sprite sheet
+
+# Marker lines, in order of the marks dict passed to render_trajectories()
+MARK_COLORS = ["green", "red", "darkorange", "purple"]
+
+# Axes inside a cell, as fractions of the cell: left, bottom, right, top
+CELL_PAD = (0.05, 0.06, 0.05, 0.26)
+
+# =============================================================================
+# PAGE RENDERER
+# =============================================================================
+
+class GridPage:
+    """One reusable rows x cols figure; draw() fills it with a page of curves."""
+
+    def __init__(self, rows: int = ROWS, cols: int = COLS,
+                 cell_size=CELL_SIZE, dpi: int = DPI, mark_labels: Sequence[str] = ()):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import NullLocator
+
+        self.rows, self.cols = rows, cols
+        self.fig = Figure(figsize=(cols * cell_size[0], rows * cell_size[1]), dpi=dpi)
+        FigureCanvasAgg(self.fig)
+
+        left, bottom, right, top = CELL_PAD
+        self.cells = []
+        for r in range(rows):
+            for c in range(cols):
+                ax = self.fig.add_axes([(c + left) / cols, (rows - r - 1 + bottom) / rows,
+                                        (1 - left - right) / cols, (1 - bottom - top) / rows])
+                # Ticks and their labels dominate the draw time, so cells are
+                # sparkline-style: the year span and peak go into the title
+                ax.xaxis.set_major_locator(NullLocator())
+                ax.yaxis.set_major_locator(NullLocator())
+                bars = ax.stairs([0], [0, 1], fill=True, alpha=0.7)
+                lines = [ax.axvline(0, color=MARK_COLORS[k % len(MARK_COLORS)],
+                                    linestyle="--", linewidth=0.8, label=label)
+                         for k, label in enumerate(mark_labels)]
+                title = ax.set_title("", fontsize=6.5, pad=2, linespacing=1.1)
+                self.cells.append((ax, bars, lines, title))
+        if mark_labels:
+            self.cells[0][0].legend(fontsize=5, loc="upper left", frameon=False)
+
+    @property
+    def pixel_size(self):
+        w, h = self.fig.canvas.get_width_height()
+        return w, h
+
+    def draw(self, items) -> np.ndarray:
+        """
+        Render items and return the page as an (h, w, 3) uint8 array.
+
+        Each item is (title, first_year, counts, mark_years); unused cells
+        of the last page are hidden.
+        """
+        for k, (ax, bars, lines, title) in enumerate(self.cells):
+            if k >= len(items):
+                ax.set_visible(False)
+                continue
+            label, first_year, counts, mark_years = items[k]
+            ax.set_visible(True)
+            edges = np.arange(first_year, first_year + len(counts) + 1) - 0.5
+            bars.set_data(counts, edges)
+            for line, year in zip(lines, mark_years):
+                line.set_visible(year > 0)
+                line.set_xdata([year, year])
+            ax.set_xlim(edges[0], edges[-1])
+            ax.set_ylim(0, max(1, counts.max(initial=0)) * 1.15)
+            title.set_text(f"{label}\n{edges[0] + 0.5:.0f}-{edges[-1] - 0.5:.0f}, "
+                           f"peak {counts.max(initial=0)}")
+        self.fig.canvas.draw()
+        return np.asarray(self.fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+# =============================================================================
+# WORKERS
+# =============================================================================
+
+_WORKER = {}
+
+
+def _init_worker(curves: CurveSet, titles, marks, last_year, layout):
+    import matplotlib
+    matplotlib.use("Agg")
+    _WORKER.update(curves=curves, titles=titles, marks=marks, last_year=last_year,
+                   layout=layout, page=None)
+
+
+def _page_items(page: int):
+    curves, marks = _WORKER["curves"], _WORKER["marks"]
+    rows, cols = _WORKER["layout"]["rows"], _WORKER["layout"]["cols"]
+    last_year = _WORKER["last_year"]
+    items = []
+    for i in range(page * rows * cols, min((page + 1) * rows * cols, len(curves))):
+        dense = curves.dense(i)
+        base = int(curves.base_year[i]) if len(dense) else last_year
+        mark_years = [int(m[i]) for m in marks]
+        start = min([base] + [y for y in mark_years if y > 0])
+        counts = np.zeros(last_year - start + 1, dtype=np.int64)
+        counts[base - start:base - start + len(dense)] = dense
+        items.append((_WORKER["titles"][i], start, counts, mark_years))
+    return items
+
+
+def _render_pages(task):
+    """Render pages [lo, hi); write PNGs to out_dir or return the arrays."""
+    lo, hi, out_dir = task
+    if _WORKER["page"] is None:
+        _WORKER["page"] = GridPage(**_WORKER["layout"])
+    results = []
+    for page in range(lo, hi):
+        image = _WORKER["page"].draw(_page_items(page))
+        if out_dir is None:
+            results.append(image)
+        else:
+            import matplotlib.image
+            path = Path(out_dir) / f"page_{page:05d}.png"
+            matplotlib.image.imsave(path, image)
+            results.append(path)
+    return results
+
+
+# =============================================================================
+# BATCH RENDERING
+# =============================================================================
+
+def render_trajectories(curves: CurveSet, out: Path, fmt: Optional[str] = None,
+                        titles: Optional[Sequence[str]] = None,
+                        marks: Optional[Dict[str, np.ndarray]] = None,
+                        last_year: Optional[int] = None,
+                        rows: int = ROWS, cols: int = COLS,
+                        cell_size=CELL_SIZE, dpi: int = DPI,
+                        workers: Optional[int] = None,
+                        pages_per_sheet: int = PAGES_PER_SHEET) -> Path:
+    """
+    Render every curve of curves into grid pages written to out.
+
+    fmt is "png" (out is a directory), "pdf" or "sprite"; by default it
+    follows the suffix of out. For "sprite", out names the sheets: out =
+    dir/sprite.png writes dir/sprite_000.png, ... with pages_per_sheet
+    pages each and the index dir/sprite.json, whose path is returned. titles default to the curve ids. marks maps a label
+    to per-curve years drawn as dashed vertical lines (0 = none), e.g.
+    {"published": pub_years}. Curves run to last_year (default: the latest
+    year of any curve) so trailing zero years stay visible.
+    """
+    out = Path(out)
+    if fmt is None:
+        fmt = {".pdf": "pdf", ".png": "sprite"}.get(out.suffix.lower(), "png")
+    if fmt not in ("png", "pdf", "sprite"):
+        raise ValueError(f"unknown plot format {fmt!r}")
+
+    n = len(curves)
+    titles = list(curves.ids) if titles is None else list(titles)
+    marks = marks or {}
+    mark_arrays = [np.asarray(v, dtype=np.int64) for v in marks.values()]
+    if last_year is None:
+        values, lengths = curves.decode()
+        ends = curves.base_year.astype(np.int64) + lengths - 1
+        last_year = int(max([ends[lengths > 0].max(initial=0)] +
+                            [m.max(initial=0) for m in mark_arrays]))
+    layout = {"rows": rows, "cols": cols, "cell_size": tuple(cell_size), "dpi": dpi,
+              "mark_labels": tuple(marks)}
+
+    per_page = rows * cols
+    n_pages = max(1, math.ceil(n / per_page))
+    workers = workers or os.cpu_count() or 1
+    page_dir = None
+    if fmt == "png":
+        out.mkdir(parents=True, exist_ok=True)
+        page_dir = out
+    else:
+        out.parent.mkdir(parents=True, exist_ok=True)
+    tasks = [(lo, min(lo + PAGES_PER_TASK, n_pages), page_dir)
+             for lo in range(0, n_pages, PAGES_PER_TASK)]
+    init = (curves, titles, mark_arrays, last_year, layout)
+
+    if workers <= 1:
+        _init_worker(*init)
+        pages = (p for task in tasks for p in _render_pages(task))
+        return _collect(pages, out, fmt, n_pages, curves, layout, pages_per_sheet)
+    workers = min(workers, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker, initargs=init) as pool:
+        pages = (p for chunk in _in_order(pool, tasks, workers) for p in chunk)
+        return _collect(pages, out, fmt, n_pages, curves, layout, pages_per_sheet)
+
+
+def _in_order(pool, tasks, workers: int) -> Iterator:
+    """Results of _render_pages over tasks, in order, with a bounded number in flight."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(_render_pages, task))
+        if len(pending) >= workers * MAX_PENDING:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _collect(pages, out: Path, fmt: str, n_pages: int, curves: CurveSet, layout,
+             pages_per_sheet: int = PAGES_PER_SHEET) -> Path:
+    """Consume rendered pages in order and write the pdf / sprite container."""
+    if fmt == "png":
+        for _ in pages:
+            pass
+        return out
+
+    if fmt == "pdf":
+        from matplotlib.backends.backend_pdf import PdfPages
+        from matplotlib.figure import Figure
+
+        with PdfPages(out) as pdf:
+            fig, image = None, None
+            for page in pages:
+                if fig is None:
+                    h, w = page.shape[:2]
+                    fig = Figure(figsize=(w / layout["dpi"], h / layout["dpi"]),
+                                 dpi=layout["dpi"])
+                    image = fig.figimage(page)
+                else:
+                    image.set_data(page)
+                pdf.savefig(fig, dpi=layout["dpi"])
+        return out
+
+    import matplotlib.image
+
+    per_sheet = max(1, pages_per_sheet)
+    sheets, sheet = [], None
+    for k, page in enumerate(pages):
+        slot = k % per_sheet
+        if slot == 0:
+            h, w = page.shape[:2]
+            sheet = np.empty((min(per_sheet, n_pages - k) * h, w, 3), dtype=np.uint8)
+        sheet[slot * h:(slot + 1) * h] = page
+        if (slot + 1) * h == sheet.shape[0]:
+            path = out.with_name(f"{out.stem}_{len(sheets):03d}.png")
+            matplotlib.image.imsave(path, sheet)
+            sheets.append(path.name)
+            sheet = None
+    index = out.with_suffix(".json")
+    index.write_text(json.dumps({
+        "sheets": sheets,
+        "cell": [w // layout["cols"], h // layout["rows"]],
+        "columns": layout["cols"],
+        "rows": per_sheet * layout["rows"],
+        # cell k is on sheet k // (rows * columns), at row (k // columns) % rows,
+        # column k % columns
+        "ids": curves.ids.tolist(),
+    }))
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render citation trajectory grid pages")
+    parser.add_argument("curves", type=Path, help=".sbc or .npz curves (sb_curvepack)")
+    parser.add_argument("out", type=Path, help="out.pdf, sprite.png or a page directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--cols", type=int, default=COLS)
+    parser.add_argument("--dpi", type=int, default=DPI)
+    parser.add_argument("--pages-per-sheet", type=int, default=PAGES_PER_SHEET,
+                        help="grid pages per sprite sheet")
+    args = parser.parse_args()
+
+    curves = load_curves(args.curves)
+    path = render_trajectories(curves, args.out, rows=args.rows, cols=args.cols,
+                               dpi=args.dpi, workers=args.workers,
+                               pages_per_sheet=args.pages_per_sheet)
+    print(f"    {len(curves)} trajectories -> {path}")
@@ -0,0 +1,170 @@
+"""
+Prince Detection
+
+Candidate "princes" for each sleeping beauty: the papers that triggered
+its awakening (van Raan 2004; Ke et al. 2015). A prince of SB s with
+awakening year a is a paper that
+
+    - cites s and is published in [a - BEFORE, a + AFTER], and
+    - is co-cited with s afterwards: papers citing s in [a, a + WINDOW]
+      also cite the prince.
+
+The score is the co-citation share, the fraction of s's citers in the
+post-awakening window that also cite the prince, with the prince's total
+citations as tie-break. All SBs of a batch are processed together on the
+CSR graph: the citers of every SB come from one gather over the citation
+(reverse adjacency) arrays, the references of their post-awakening citers
+from one gather over the reference arrays, and co-citations are counted
+with np.unique over (sb, reference) keys, so thousands of SBs take
+seconds.
+
+Awakening years default to the Ke et al. awakening time t_a (sb_beauty).
+
+Usage:
+    python sb_princes.py /path/to/astro-ph-kg-full [sb_candidates.csv] [out.csv]
+"""
+
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from sb_beauty import beauty_coefficients
+from sb_curves import CitationMatrix, age_aligned_counts
+from sb_graph import CitationGraph
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+BEFORE = 2            # princes published up to BEFORE years before awakening
+AFTER = 2             # ... and up to AFTER years after it
+WINDOW = 5            # co-citations counted over [awakening, awakening + WINDOW]
+MIN_COCITATIONS = 2
+TOP_K = 5             # princes kept per SB (None keeps all)
+SB_CHUNK = 5_000      # SBs per batch
+
+# =============================================================================
+# GRAPH GATHERS
+# =============================================================================
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray):
+    """(owner, value): CSR rows[owner] concatenated, without a Python loop."""
+    indptr = np.asarray(indptr)
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return owner, np.asarray(indices)[np.repeat(starts, lengths) + offsets]
+
+
+def awakening_years(matrix: CitationMatrix, pub_years: np.ndarray,
+                    paper_indices: np.ndarray) -> np.ndarray:
+    """Calendar awakening year (Ke et al. t_a) of the given papers."""
+    years = np.asarray(pub_years)[paper_indices]
+    counts, n_observed = age_aligned_counts(matrix, years, rows=paper_indices)
+    return years + beauty_coefficients(counts, n_observed).awakening_age
+
+
+# =============================================================================
+# PRINCES
+# =============================================================================
+
+def _princes_batch(graph: CitationGraph, years: np.ndarray, totals: np.ndarray,
+                   sb: np.ndarray, awake: np.ndarray,
+                   before: int, after: int, window: int, min_cocitations: int):
+    n = graph.n_papers
+    owner, citer = _gather(graph.citations_indptr, graph.citations_indices, sb)
+    offset = years[citer] - awake[owner]
+
+    # Candidates: citers near the awakening year
+    near = (offset >= -before) & (offset <= after)
+    cand_keys = np.unique(owner[near].astype(np.int64) * n + citer[near])
+
+    # Post-awakening citers and everything they cite
+    post = (offset >= 0) & (offset <= window)
+    n_post = np.bincount(owner[post], minlength=len(sb))
+    ref_owner, ref = _gather(graph.references_indptr, graph.references_indices, citer[post])
+    keys, counts = np.unique(owner[post][ref_owner].astype(np.int64) * n + ref,
+                             return_counts=True)
+
+    pos = np.clip(np.searchsorted(keys, cand_keys), 0, max(len(keys) - 1, 0))
+    cocited = (np.where(keys[pos] == cand_keys, counts[pos], 0)
+               if len(keys) else np.zeros(len(cand_keys), dtype=np.int64))
+    keep = cocited >= min_cocitations
+    k, prince = np.divmod(cand_keys[keep], n)
+    return pd.DataFrame({
+        "sb_idx": sb[k],
+        "awakening_year": awake[k],
+        "prince_idx": prince,
+        "prince_year": years[prince],
+        "prince_citations": totals[prince],
+        "cocitations": cocited[keep],
+        "post_citers": n_post[k],
+        "cocitation_share": cocited[keep] / np.maximum(n_post[k], 1),
+    })
+
+
+def find_princes(graph: CitationGraph, sb_indices: np.ndarray,
+                 awakening: np.ndarray,
+                 before: int = BEFORE, after: int = AFTER, window: int = WINDOW,
+                 min_cocitations: int = MIN_COCITATIONS,
+                 top_k: Optional[int] = TOP_K,
+                 chunk: int = SB_CHUNK) -> pd.DataFrame:
+    """
+    Ranked prince candidates for each SB (paper_idx) given its awakening year.
+
+    One row per (SB, prince) with at least min_cocitations co-citations,
+    ordered by SB, then cocitation_share and prince_citations descending;
+    rank starts at 1.
+    """
+    years = np.asarray(graph.years)
+    totals = graph.citation_counts()
+    sb_indices = np.asarray(sb_indices, dtype=np.int64)
+    awakening = np.asarray(awakening, dtype=np.int64)
+
+    parts = [_princes_batch(graph, years, totals, sb_indices[s:s + chunk],
+                            awakening[s:s + chunk], before, after, window, min_cocitations)
+             for s in range(0, len(sb_indices), chunk)]
+    df = pd.concat(parts, ignore_index=True) if parts else _princes_batch(
+        graph, years, totals, sb_indices, awakening, before, after, window, min_cocitations)
+    df = df.sort_values(["sb_idx", "cocitation_share", "prince_citations", "prince_idx"],
+                        ascending=[True, False, False, True], kind="stable")
+    df.insert(1, "rank", df.groupby("sb_idx").cumcount() + 1)
+    if top_k is not None:
+        df = df[df["rank"] <= top_k]
+    return df.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    from sb_curves import build_citation_matrix
+    from sb_graph import load_citation_graph
+    from sb_index import load_paper_index
+    from sb_slopes import slope_metrics
+
+    if len(sys.argv) not in (2, 3, 4):
+        print(__doc__)
+        sys.exit(1)
+
+    kg_path = Path(sys.argv[1])
+    graph = load_citation_graph(kg_path)
+    years = np.asarray(graph.years)
+    matrix = build_citation_matrix(graph)
+    if len(sys.argv) >= 3:
+        sb = pd.read_csv(sys.argv[2], usecols=["paper_idx"])["paper_idx"].to_numpy()
+    else:
+        slopes = slope_metrics(matrix, years, np.flatnonzero(graph.has_record))
+        sb = slopes["paper_idx"][slopes["is_sb"]].to_numpy()
+
+    df = find_princes(graph, sb, awakening_years(matrix, years, sb))
+    index = load_paper_index(kg_path, years=years)
+    df.insert(1, "sb_arxiv_id", index.arxiv_ids(df["sb_idx"].to_numpy()))
+    df.insert(df.columns.get_loc("prince_idx") + 1, "prince_arxiv_id",
+              index.arxiv_ids(df["prince_idx"].to_numpy()))
+
+    print(f"    SBs: {len(sb)}, with princes: {df['sb_idx'].nunique()}")
+    print(df[df["rank"] == 1].head(20).to_string(index=False))
+    if len(sys.argv) == 4:
+        df.to_csv(sys.argv[3], index=False)
@@ -0,0 +1,296 @@
+"""
+Sharded Execution
+
+Map-reduce form of the metrics and candidate flags of the sb.py identify
+stage (identify.shards, or sb.py --shards), for runs (e.g. all of arXiv,
+~2M papers) that should be spread over several processes or machines.
+Papers are split into contiguous paper_idx ranges, one per shard:
+
+    map     a shard computes the metrics of its papers from its rows of the
+            memory-mapped CSR graph, adds the SB_CRITERIA flags and keeps,
+            per criterion, the candidate count, a bitmap of its candidates
+            over its paper_idx range and its candidates ranked by the
+            export sort column (the first TOP_K of which are its top-k)
+    reduce  concatenates the metrics parts in shard order, sums the
+            counts, concatenates the bitmaps into the union of all
+            candidates and merges the per-shard rankings with a k-way heap
+            merge, bounded to TOP_K unless the full lists are asked for
+
+Rankings break ties by paper_idx, the order the stable sort of the
+single-process run leaves equal keys in, so the reduced tables, counts,
+rankings and CSVs equal the single-process ones exactly.
+
+Shards run as local worker processes (run) or as separate jobs sharing the
+KG directory, each writing a shard directory that a reduce job collects.
+
+Usage:
+    python sb_shard.py map /path/to/kg shard_dir --shard 3 --of 16 [--current-year 2025]
+    python sb_shard.py reduce shard_dir out_dir [--format parquet] [--csv]
+    python sb_shard.py run /path/to/kg out_dir --shards 16 [--workers N]
+"""
+
+import argparse
+import heapq
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sb_graph import load_citation_graph
+from sb_index import load_paper_index
+from sb_metrics import (CANDIDATE_FILES, EARLY_YEARS, MIN_PAPER_AGE, SB_CRITERIA,
+                        compute_metrics, horizon_year)
+from sb_output import FORMATS, add_flag_columns, export_csv, flag_column, table_path, write_table
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+TOP_K = 100
+SHARD_PATTERN = "shard-{:05d}-of-{:05d}"
+
+# =============================================================================
+# MAP
+# =============================================================================
+
+@dataclass
+class ShardResult:
+    """Everything a shard hands to the reducer."""
+    shard: int
+    n_shards: int
+    lo: int                                   # paper_idx range [lo, hi)
+    hi: int
+    metrics: pd.DataFrame                     # metrics + is_<name> flags
+    counts: Dict[str, int] = field(default_factory=dict)
+    bitmaps: Dict[str, np.ndarray] = field(default_factory=dict)   # packed bits over [lo, hi)
+    ranked: Dict[str, np.ndarray] = field(default_factory=dict)    # metrics rows, export order
+
+
+def shard_range(n_papers: int, shard: int, n_shards: int):
+    """paper_idx range [lo, hi) of a shard; ranges are contiguous and cover all papers."""
+    bounds = np.linspace(0, n_papers, n_shards + 1).astype(np.int64)
+    return int(bounds[shard]), int(bounds[shard + 1])
+
+
+def _rank_order(df: pd.DataFrame, column: str) -> np.ndarray:
+    """Row order of a descending stable sort on column (NaN last, ties by row)."""
+    key = df[column].to_numpy(dtype=np.float64)
+    return np.lexsort((np.arange(len(df)), -key, np.isnan(key)))
+
+
+def map_shard(graph, paper_index, shard: int, n_shards: int, current_year: int,
+              early_years: int = EARLY_YEARS, min_age: int = MIN_PAPER_AGE) -> ShardResult:
+    """Metrics, flags, counts, bitmaps and rankings for one shard's papers."""
+    lo, hi = shard_range(graph.n_papers, shard, n_shards)
+    indptr = graph.citations_indptr[lo:hi + 1]
+    df = compute_metrics(np.arange(lo, hi), indptr, graph.citations_indices,
+                         graph.num_references[lo:hi],
+                         paper_index, current_year=current_year,
+                         early_years=early_years, min_age=min_age)
+    df = df[graph.has_record[df["paper_idx"]]].reset_index(drop=True)
+    df = add_flag_columns(df, SB_CRITERIA)
+
+    result = ShardResult(shard, n_shards, lo, hi, df)
+    for name in SB_CRITERIA:
+        flags = df[flag_column(name)].to_numpy()
+        bits = np.zeros(hi - lo, dtype=bool)
+        bits[df["paper_idx"].to_numpy()[flags] - lo] = True
+        result.counts[name] = int(flags.sum())
+        result.bitmaps[name] = np.packbits(bits)
+        rows = np.flatnonzero(flags)
+        result.ranked[name] = rows[_rank_order(df.iloc[rows], CANDIDATE_FILES[name][1])]
+    return result
+
+
+def save_shard(result: ShardResult, shard_dir: Path) -> Path:
+    """Write a shard result to shard_dir/shard-XXXXX-of-YYYYY/."""
+    path = Path(shard_dir) / SHARD_PATTERN.format(result.shard, result.n_shards)
+    path.mkdir(parents=True, exist_ok=True)
+    result.metrics.to_pickle(path / "metrics.pkl")
+    np.savez(path / "arrays.npz",
+             **{f"bitmap_{n}": b for n, b in result.bitmaps.items()},
+             **{f"ranked_{n}": r for n, r in result.ranked.items()})
+    (path / "summary.json").write_text(json.dumps({
+        "shard": result.shard, "n_shards": result.n_shards,
+        "lo": result.lo, "hi": result.hi, "counts": result.counts,
+    }, indent=2))
+    return path
+
+
+def load_shard(path: Path) -> ShardResult:
+    path = Path(path)
+    summary = json.loads((path / "summary.json").read_text())
+    arrays = np.load(path / "arrays.npz")
+    return ShardResult(
+        shard=summary["shard"], n_shards=summary["n_shards"],
+        lo=summary["lo"], hi=summary["hi"],
+        metrics=pd.read_pickle(path / "metrics.pkl"),
+        counts=summary["counts"],
+        bitmaps={n: arrays[f"bitmap_{n}"] for n in summary["counts"]},
+        ranked={n: arrays[f"ranked_{n}"] for n in summary["counts"]},
+    )
+
+
+def load_shards(shard_dir: Path) -> List[ShardResult]:
+    """All shard results in shard_dir, checked to form one complete run."""
+    results = sorted((load_shard(p) for p in Path(shard_dir).glob("shard-*-of-*")),
+                     key=lambda r: r.shard)
+    if not results:
+        raise FileNotFoundError(f"no shard results in {shard_dir}")
+    n_shards = results[0].n_shards
+    if [r.shard for r in results] != list(range(n_shards)) or \
+            any(r.n_shards != n_shards for r in results):
+        raise ValueError(f"incomplete shard set in {shard_dir}: "
+                         f"have {[r.shard for r in results]} of {n_shards}")
+    return results
+
+
+# =============================================================================
+# REDUCE
+# =============================================================================
+
+@dataclass
+class Reduced:
+    """Merged shard results, equal to the single-process run."""
+    metrics: pd.DataFrame
+    counts: Dict[str, int]
+    candidates: np.ndarray                    # paper_idx of the union of all criteria
+    parts: List[ShardResult]
+
+    def ranked(self, name: str, k: Optional[int] = None) -> pd.DataFrame:
+        """Candidates of a criterion in export order; the first k with k set."""
+        column = CANDIDATE_FILES[name][1]
+        offsets = np.cumsum([0] + [len(p.metrics) for p in self.parts])
+
+        def stream(s, part):
+            rows = part.ranked[name][:k]
+            key = part.metrics[column].to_numpy(dtype=np.float64)[rows]
+            # Same order as _rank_order(): NaN last, descending key, then paper_idx
+            nan = np.isnan(key)
+            return zip(nan.tolist(), np.where(nan, 0.0, -key).tolist(),
+                       (offsets[s] + rows).tolist())
+
+        merged = islice(heapq.merge(*(stream(s, p) for s, p in enumerate(self.parts))), k)
+        return self.metrics.iloc[[row for _, _, row in merged]]
+
+    def top(self, name: str, k: int = TOP_K) -> pd.DataFrame:
+        return self.ranked(name, k)
+
+
+def reduce_shards(results: List[ShardResult]) -> Reduced:
+    """Merge shard results (in shard order) into one run."""
+    results = sorted(results, key=lambda r: r.shard)
+    metrics = pd.concat([r.metrics for r in results], ignore_index=True)
+    counts = {name: sum(r.counts[name] for r in results) for name in SB_CRITERIA}
+
+    union = np.zeros(results[-1].hi - results[0].lo, dtype=bool)
+    for r in results:
+        for name in SB_CRITERIA:
+            bits = np.unpackbits(r.bitmaps[name], count=r.hi - r.lo).astype(bool)
+            if int(bits.sum()) != r.counts[name]:
+                raise ValueError(f"shard {r.shard}: {name} bitmap does not match its count")
+            union[r.lo - results[0].lo:r.hi - results[0].lo] |= bits
+    return Reduced(metrics, counts, results[0].lo + np.flatnonzero(union), results)
+
+
+# =============================================================================
+# LOCAL EXECUTION
+# =============================================================================
+
+_WORKER = {}
+
+
+def _init_worker(kg_path: Path):
+    graph = load_citation_graph(kg_path)
+    _WORKER.update(graph=graph,
+                   index=load_paper_index(kg_path, years=np.asarray(graph.years)))
+
+
+def _map_task(task) -> ShardResult:
+    shard, n_shards, current_year, early_years, min_age = task
+    return map_shard(_WORKER["graph"], _WORKER["index"], shard, n_shards, current_year,
+                     early_years=early_years, min_age=min_age)
+
+
+def run_sharded(kg_path: Path, n_shards: int, current_year: Optional[int] = None,
+                workers: Optional[int] = None, early_years: int = EARLY_YEARS,
+                min_age: int = MIN_PAPER_AGE) -> Reduced:
+    """Map every shard over a local process pool and reduce the results."""
+    if current_year is None:
+        current_year = horizon_year(np.load(Path(kg_path) / "papers_years.npy", mmap_mode="r"))
+    tasks = [(s, n_shards, current_year, early_years, min_age) for s in range(n_shards)]
+    workers = min(workers or os.cpu_count() or 1, n_shards)
+    if workers <= 1:
+        _init_worker(kg_path)
+        results = [_map_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(kg_path,)) as pool:
+            results = list(pool.map(_map_task, tasks))
+    return reduce_shards(results)
+
+
+def write_outputs(reduced: Reduced, out_dir: Path, fmt: str = "parquet",
+                  csv: bool = False, top: int = TOP_K) -> Dict[str, Path]:
+    """The all_papers_metrics table and candidate CSVs, as the sb.py export writes them."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = {"metrics": write_table(reduced.metrics,
+                                      table_path(out_dir, "all_papers_metrics", fmt), fmt=fmt)}
+    if csv:
+        for name, (filename, _) in CANDIDATE_FILES.items():
+            written[name] = export_csv(reduced.ranked(name), out_dir / filename)
+    written["top"] = export_csv(reduced.top("sb_ratio", top),
+                                out_dir / f"top_{top}_sb_candidates.csv")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded SB metrics and candidates")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_map = sub.add_parser("map", help="compute one shard")
+    p_map.add_argument("kg_path", type=Path)
+    p_map.add_argument("shard_dir", type=Path)
+    p_map.add_argument("--shard", type=int, required=True)
+    p_map.add_argument("--of", type=int, required=True, dest="n_shards")
+    p_map.add_argument("--current-year", type=int, default=None)
+
+    p_reduce = sub.add_parser("reduce", help="merge shard results")
+    p_reduce.add_argument("shard_dir", type=Path)
+    p_reduce.add_argument("out_dir", type=Path)
+
+    p_run = sub.add_parser("run", help="map all shards locally, then reduce")
+    p_run.add_argument("kg_path", type=Path)
+    p_run.add_argument("out_dir", type=Path)
+    p_run.add_argument("--shards", type=int, required=True)
+    p_run.add_argument("--workers", type=int, default=None)
+    p_run.add_argument("--current-year", type=int, default=None)
+
+    for p in (p_reduce, p_run):
+        p.add_argument("--format", choices=FORMATS, default="parquet")
+        p.add_argument("--csv", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "map":
+        _init_worker(args.kg_path)
+        current_year = args.current_year or horizon_year(_WORKER["graph"].years)
+        result = map_shard(_WORKER["graph"], _WORKER["index"], args.shard, args.n_shards,
+                           current_year)
+        path = save_shard(result, args.shard_dir)
+        print(f"    shard {args.shard}/{args.n_shards} [{result.lo}, {result.hi}): "
+              f"{len(result.metrics)} papers, {result.counts} -> {path}")
+    else:
+        reduced = (reduce_shards(load_shards(args.shard_dir)) if args.command == "reduce" else
+                   run_sharded(args.kg_path, args.shards, args.current_year, args.workers))
+        for name, count in reduced.counts.items():
+            print(f"    {name:<9} {count}")
+        print(f"    unique candidates: {len(reduced.candidates)}")
+        for name, path in write_outputs(reduced, args.out_dir, args.format, args.csv).items():
+            print(f"    {name:<9} {path}")
@@ -0,0 +1,206 @@
+"""
+Citation Similarity
+
+Co-citation and bibliographic-coupling neighbours from the CSR arrays of
+sb_graph.CitationGraph, for grouping SB candidates by the literature that
+cites them and the literature they cite:
+
+    cocitation   papers citing both a and b      C[S] @ R
+    coupling     references shared by a and b    R[S] @ C
+
+with C the citation matrix (row i = papers citing i) and R the reference
+matrix (row i = papers cited by i), both n x n sparse 0/1 matrices sharing
+the graph's arrays. Rows of S are multiplied in chunks and each chunk is
+cut down to its min_count / top-k entries before the next one, so memory
+is bounded by the chunk rather than by |S| x n. Scores are raw counts or
+Salton's cosine, count / sqrt(deg a * deg b).
+
+within=True restricts neighbours to S itself (C[S] @ C[S].T and
+R[S] @ R[S].T), which is what cluster_papers() uses: connected components
+of the thresholded top-k neighbour graph.
+
+Usage:
+    python sb_similarity.py /path/to/astro-ph-kg-full sb_candidates.csv [out.csv] \\
+        [--kind cocitation|coupling|both] [--top-k 10] [--min-count 2]
+"""
+
+import argparse
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from sb_graph import CitationGraph
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+KINDS = ("cocitation", "coupling")
+TOP_K = 10
+MIN_COUNT = 2            # shared citers / references for a pair to count
+MIN_SIMILARITY = 0.05    # edges kept by cluster_papers() (salton scores)
+ROW_CHUNK = 2_000        # rows of S per sparse product
+
+# =============================================================================
+# SPARSE MATRICES
+# =============================================================================
+
+def adjacency(graph: CitationGraph, kind: str) -> sparse.csr_matrix:
+    """n x n 0/1 matrix: citations (row i = citers of i) or references."""
+    n = graph.n_papers
+    if kind == "citations":
+        indptr, indices = graph.citations_indptr, graph.citations_indices
+    elif kind == "references":
+        indptr, indices = graph.references_indptr, graph.references_indices
+    else:
+        raise ValueError(f"unknown adjacency {kind!r}")
+    data = np.ones(len(indices), dtype=np.int32)
+    return sparse.csr_matrix((data, np.asarray(indices), np.asarray(indptr)), shape=(n, n))
+
+
+def _factors(graph: CitationGraph, kind: str):
+    """(left, right, degrees) with similarity(S) = left[S] @ right."""
+    if kind not in KINDS:
+        raise ValueError(f"unknown similarity {kind!r}; expected one of {KINDS}")
+    cites, refs = adjacency(graph, "citations"), adjacency(graph, "references")
+    if kind == "cocitation":
+        return cites, refs, graph.citation_counts()
+    return refs, cites, graph.reference_counts()
+
+
+def _top_k(row: np.ndarray, score: np.ndarray, col: np.ndarray,
+           top_k: Optional[int]) -> np.ndarray:
+    """Positions of each row's top_k entries, ordered by row, score desc, col."""
+    order = np.lexsort((col, -score, row))
+    if top_k is None:
+        return order
+    row = row[order]
+    first = np.searchsorted(row, row)
+    return order[np.arange(len(row)) - first < top_k]
+
+
+# =============================================================================
+# NEIGHBOURS
+# =============================================================================
+
+def neighbours(graph: CitationGraph, paper_indices: np.ndarray, kind: str = "cocitation",
+               top_k: Optional[int] = TOP_K, min_count: int = MIN_COUNT,
+               normalize: Optional[str] = "salton", within: bool = False,
+               chunk: int = ROW_CHUNK) -> pd.DataFrame:
+    """
+    Top-k co-citation or coupling neighbours of each paper in paper_indices.
+
+    One row per (paper_idx, neighbor_idx) pair with count >= min_count,
+    excluding the paper itself; neighbours are ranked by similarity
+    (salton, or the raw count with normalize=None). With within=True only
+    papers of paper_indices are considered as neighbours.
+    """
+    if normalize not in (None, "salton"):
+        raise ValueError(f"unknown normalization {normalize!r}")
+    paper_indices = np.asarray(paper_indices, dtype=np.int64)
+    left, right, degrees = _factors(graph, kind)
+    degrees = np.asarray(degrees, dtype=np.float64)
+    if within:
+        right = left[paper_indices].T.tocsr()
+        columns = paper_indices
+    else:
+        columns = np.arange(graph.n_papers)
+
+    parts = []
+    for start in range(0, len(paper_indices), chunk):
+        rows = paper_indices[start:start + chunk]
+        counts = (left[rows] @ right).tocoo()
+        keep = (counts.data >= min_count) & (columns[counts.col] != rows[counts.row])
+        r, c, n = counts.row[keep], counts.col[keep], counts.data[keep]
+        score = n.astype(np.float64)
+        if normalize == "salton":
+            score /= np.sqrt(degrees[rows[r]] * degrees[columns[c]])
+        top = _top_k(r, score, c, top_k)
+        parts.append(pd.DataFrame({
+            "paper_idx": rows[r[top]],
+            "neighbor_idx": columns[c[top]],
+            "count": n[top].astype(np.int64),
+            "similarity": score[top],
+        }))
+
+    df = (pd.concat(parts, ignore_index=True) if parts else
+          pd.DataFrame({"paper_idx": np.zeros(0, np.int64), "neighbor_idx": np.zeros(0, np.int64),
+                        "count": np.zeros(0, np.int64), "similarity": np.zeros(0)}))
+    df.insert(1, "kind", kind)
+    df.insert(2, "rank", df.groupby("paper_idx").cumcount() + 1)
+    return df
+
+
+def cluster_papers(graph: CitationGraph, paper_indices: np.ndarray,
+                   kinds=KINDS, top_k: Optional[int] = TOP_K, min_count: int = MIN_COUNT,
+                   min_similarity: float = MIN_SIMILARITY) -> pd.DataFrame:
+    """
+    Group papers by shared citing / cited literature.
+
+    Papers are linked when one is among the other's top-k within-set
+    neighbours of any kind with salton similarity >= min_similarity;
+    clusters are the connected components, numbered by size (0 = largest),
+    singletons included. Returns paper_idx, cluster, cluster_size.
+    """
+    paper_indices = np.asarray(paper_indices, dtype=np.int64)
+    n = len(paper_indices)
+    position = pd.Series(np.arange(n), index=paper_indices)
+    edges = pd.concat([neighbours(graph, paper_indices, kind, top_k=top_k, min_count=min_count,
+                                  within=True) for kind in kinds], ignore_index=True)
+    edges = edges[edges["similarity"] >= min_similarity]
+    a = position[edges["paper_idx"]].to_numpy()
+    b = position[edges["neighbor_idx"]].to_numpy()
+    links = sparse.csr_matrix((np.ones(len(a)), (a, b)), shape=(n, n))
+    _, labels = connected_components(links, directed=False)
+
+    # Renumber by decreasing size, ties by first member
+    sizes = np.bincount(labels)
+    first = np.full(len(sizes), n)
+    np.minimum.at(first, labels, np.arange(n))
+    order = np.lexsort((first, -sizes))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return pd.DataFrame({
+        "paper_idx": paper_indices,
+        "cluster": rank[labels],
+        "cluster_size": sizes[labels],
+    })
+
+
+if __name__ == "__main__":
+    import time
+
+    from sb_graph import load_citation_graph
+    from sb_index import load_paper_index
+
+    parser = argparse.ArgumentParser(description="Co-citation / coupling neighbours and clusters")
+    parser.add_argument("kg_path", type=Path)
+    parser.add_argument("candidates", type=Path, help="CSV with a paper_idx column")
+    parser.add_argument("out", type=Path, nargs="?", default=None)
+    parser.add_argument("--kind", choices=KINDS + ("both",), default="both")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT)
+    args = parser.parse_args()
+
+    graph = load_citation_graph(args.kg_path)
+    papers = pd.read_csv(args.candidates, usecols=["paper_idx"])["paper_idx"].to_numpy()
+    kinds = KINDS if args.kind == "both" else (args.kind,)
+
+    start = time.perf_counter()
+    df = pd.concat([neighbours(graph, papers, kind, top_k=args.top_k, min_count=args.min_count)
+                    for kind in kinds], ignore_index=True)
+    clusters = cluster_papers(graph, papers, kinds, top_k=args.top_k, min_count=args.min_count)
+    print(f"    {len(papers)} papers: {len(df)} neighbour pairs, "
+          f"{clusters['cluster'].nunique()} clusters in {time.perf_counter() - start:.1f}s")
+
+    index = load_paper_index(args.kg_path, years=np.asarray(graph.years))
+    clusters = index.join(clusters)
+    print(clusters[clusters["cluster_size"] > 1].sort_values(["cluster", "paper_idx"])
+          .head(30).to_string(index=False))
+    if args.out:
+        df = df.merge(clusters[["paper_idx", "cluster"]], on="paper_idx", how="left")
+        df.to_csv(args.out, index=False)
@@ -0,0 +1,275 @@
+"""
+Piecewise Slope Fitting
+
+Closed-form least-squares slopes of the early (ages 0-4) and late (ages 8+)
+segments of every paper's citation curve, computed in one pass over the
+age-aligned citation matrix. This is the step behind early_slope,
+late_slope and slope_ratio in sb_final.json.
+
+The fitted slopes are not clipped. sb_final.json appears to report
+negative early slopes as 0: 2007PhRvD..76d2007E has early_slope 0.0
+there but fits to -0.4, while the other 23 entries agree to the one
+decimal stored. slope_ratio is unaffected because the early slope is
+floored at SLOPE_FLOOR either way.
+
+Criteria for a true SB (README):
+    - early citations (ages 0-4) < 5
+    - late citations > 3x early citations
+    - late slope > 5x early slope
+
+Usage:
+    python sb_slopes.py /path/to/astro-ph-kg-full [output.csv]
+"""
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from sb_curves import CitationMatrix, age_aligned_counts
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+EARLY_END = 5         # Early segment = ages [0, EARLY_END)
+LATE_START = 8        # Late segment = ages [LATE_START, horizon]
+SLOPE_FLOOR = 0.1     # slope_ratio = late_slope / max(early_slope, SLOPE_FLOOR)
+SLOPES_VERSION = 1    # cache version of the slope_metrics() table (see sb_cache.py)
+
+SB_SLOPE_CRITERIA = {
+    "max_early": 5,         # early citations < max_early
+    "late_factor": 3.0,     # late citations > late_factor * early
+    "min_slope_ratio": 5.0, # slope_ratio > min_slope_ratio
+}
+
+# =============================================================================
+# DATA STRUCTURES
+# =============================================================================
+
+@dataclass
+class SlopeFit:
+    """Per-paper segment fits, all arrays aligned with the input rows."""
+    early_slope: np.ndarray
+    late_slope: np.ndarray
+    slope_ratio: np.ndarray
+    early_citations: np.ndarray
+    late_citations: np.ndarray
+    early_end: np.ndarray    # breakpoint used for each paper
+    late_start: np.ndarray
+
+
+# =============================================================================
+# LEAST SQUARES
+# =============================================================================
+
+def _sum_x(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Sum of integers in [a, b)."""
+    return (b * (b - 1) - a * (a - 1)) // 2
+
+
+def _sum_xx(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Sum of squares of integers in [a, b)."""
+    f = lambda k: (k - 1) * k * (2 * k - 1) // 6
+    return f(b) - f(a)
+
+
+def segment_slopes(cum_y: np.ndarray, cum_xy: np.ndarray, n_observed: np.ndarray,
+                   start, end) -> np.ndarray:
+    """
+    OLS slope of counts vs age over ages [start, end) for every row.
+
+    cum_y / cum_xy are row-wise prefix sums (leading zero column) of y and
+    age*y. The segment is truncated at each paper's observed horizon;
+    segments with fewer than two observed ages give NaN.
+    """
+    n_rows, width = cum_y.shape
+    a = np.broadcast_to(np.asarray(start, dtype=np.int64), (n_rows,))
+    b = np.minimum(np.broadcast_to(np.asarray(end, dtype=np.int64), (n_rows,)), n_observed)
+    b = np.clip(np.maximum(b, a), 0, width - 1)
+    a = np.minimum(a, b)
+
+    r = np.arange(n_rows)
+    return slopes_from_sums(cum_y[r, b] - cum_y[r, a], cum_xy[r, b] - cum_xy[r, a], a, b)
+
+
+def slopes_from_sums(sy: np.ndarray, sxy: np.ndarray,
+                     start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """
+    OLS slope over ages [start, end) from the segment sums of y and age*y.
+
+    The age sums are closed-form, so these two sums are all that has to be
+    kept per paper to refit a segment after new citations or a longer
+    horizon (see sb_update.py). Fewer than two ages give NaN.
+    """
+    a = np.asarray(start, dtype=np.int64)
+    b = np.asarray(end, dtype=np.int64)
+    n = (b - a).astype(np.float64)
+    sy = np.asarray(sy, dtype=np.float64)
+    sxy = np.asarray(sxy, dtype=np.float64)
+    sx = _sum_x(a, b).astype(np.float64)
+    sxx = _sum_xx(a, b).astype(np.float64)
+
+    denom = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(n >= 2, (n * sxy - sx * sy) / denom, np.nan)
+    return slope
+
+
+def _prefix_sums(counts: np.ndarray):
+    n_rows, n_ages = counts.shape
+    cum_y = np.zeros((n_rows, n_ages + 1), dtype=np.int64)
+    cum_xy = np.zeros((n_rows, n_ages + 1), dtype=np.int64)
+    np.cumsum(counts, axis=1, out=cum_y[:, 1:])
+    np.cumsum(counts * np.arange(n_ages, dtype=np.int64), axis=1, out=cum_xy[:, 1:])
+    return cum_y, cum_xy
+
+
+def slope_ratio(early_slope: np.ndarray, late_slope: np.ndarray,
+                floor: float = SLOPE_FLOOR) -> np.ndarray:
+    """late_slope / max(early_slope, floor), as reported in sb_final.json."""
+    return late_slope / np.maximum(np.nan_to_num(early_slope, nan=0.0), floor)
+
+
+def fit_piecewise_slopes(counts: np.ndarray, n_observed: np.ndarray,
+                         early_end: int = EARLY_END,
+                         late_start: int = LATE_START,
+                         late_end: Optional[int] = None,
+                         floor: float = SLOPE_FLOOR) -> SlopeFit:
+    """
+    Fit early [0, early_end) and late [late_start, late_end) slopes per row.
+
+    counts is age-aligned (column k = citations at age k), as returned by
+    sb_curves.age_aligned_counts(). late_end=None runs to each paper's
+    horizon.
+    """
+    cum_y, cum_xy = _prefix_sums(counts)
+    return _fit_from_prefix(cum_y, cum_xy, n_observed, early_end, late_start, floor,
+                            late_end=late_end)
+
+
+def _fit_from_prefix(cum_y, cum_xy, n_observed, early_end, late_start, floor,
+                     late_end: Optional[int] = None) -> SlopeFit:
+    n_rows, width = cum_y.shape
+    r = np.arange(n_rows)
+    early_end = np.broadcast_to(np.asarray(early_end, dtype=np.int64), (n_rows,))
+    late_start = np.broadcast_to(np.asarray(late_start, dtype=np.int64), (n_rows,))
+
+    early_slope = segment_slopes(cum_y, cum_xy, n_observed, 0, early_end)
+    late_end = width - 1 if late_end is None else late_end
+    late_slope = segment_slopes(cum_y, cum_xy, n_observed, late_start, late_end)
+
+    early_hi = np.clip(np.minimum(early_end, n_observed), 0, width - 1)
+    late_lo = np.clip(np.minimum(late_start, n_observed), 0, width - 1)
+    late_hi = np.clip(np.minimum(late_end, n_observed), late_lo, width - 1)
+    return SlopeFit(
+        early_slope=early_slope,
+        late_slope=late_slope,
+        slope_ratio=slope_ratio(early_slope, late_slope, floor),
+        early_citations=cum_y[r, early_hi],
+        late_citations=cum_y[r, late_hi] - cum_y[r, late_lo],
+        early_end=np.array(early_end),
+        late_start=np.array(late_start),
+    )
+
+
+def search_breakpoints(counts: np.ndarray, n_observed: np.ndarray,
+                       early_ends: Iterable[int] = range(3, 8),
+                       gap: int = LATE_START - EARLY_END,
+                       floor: float = SLOPE_FLOOR) -> SlopeFit:
+    """
+    Try each early_end (with late_start = early_end + gap) and keep, per
+    paper, the breakpoint with the largest slope_ratio.
+
+    Prefix sums are computed once; each candidate costs O(n_papers).
+    """
+    cum_y, cum_xy = _prefix_sums(counts)
+    best: Optional[SlopeFit] = None
+    for early_end in early_ends:
+        fit = _fit_from_prefix(cum_y, cum_xy, n_observed, early_end, early_end + gap, floor)
+        if best is None:
+            best = fit
+            continue
+        better = np.nan_to_num(fit.slope_ratio, nan=-np.inf) > \
+            np.nan_to_num(best.slope_ratio, nan=-np.inf)
+        for field in SlopeFit.__dataclass_fields__:
+            getattr(best, field)[better] = getattr(fit, field)[better]
+    return best
+
+
+# =============================================================================
+# CLASSIFICATION
+# =============================================================================
+
+def sb_slope_mask(fit: SlopeFit,
+                  max_early: float = SB_SLOPE_CRITERIA["max_early"],
+                  late_factor: float = SB_SLOPE_CRITERIA["late_factor"],
+                  min_slope_ratio: float = SB_SLOPE_CRITERIA["min_slope_ratio"]) -> np.ndarray:
+    """Boolean mask of papers meeting the three slope-fitting criteria."""
+    with np.errstate(invalid="ignore"):
+        return ((fit.early_citations < max_early) &
+                (fit.late_citations > late_factor * fit.early_citations) &
+                (fit.slope_ratio > min_slope_ratio))
+
+
+def slope_metrics(matrix: CitationMatrix, pub_years: np.ndarray,
+                  paper_indices: Optional[np.ndarray] = None,
+                  early_end: int = EARLY_END,
+                  late_start: int = LATE_START,
+                  late_end: Optional[int] = None,
+                  search: bool = False) -> pd.DataFrame:
+    """
+    Slope-fit table for the given papers (default: all rows of the matrix).
+
+    With search=True the breakpoint is chosen per paper by
+    search_breakpoints() instead of the fixed early_end / late_start.
+    """
+    if paper_indices is None:
+        paper_indices = np.arange(matrix.counts.shape[0])
+    pub_years = np.asarray(pub_years)[paper_indices]
+    counts, n_observed = age_aligned_counts(matrix, pub_years, rows=paper_indices)
+
+    if search:
+        fit = search_breakpoints(counts, n_observed, gap=late_start - early_end)
+    else:
+        fit = fit_piecewise_slopes(counts, n_observed, early_end, late_start, late_end)
+
+    return pd.DataFrame({
+        "paper_idx": paper_indices,
+        "year": pub_years,
+        "early": fit.early_citations,
+        "late": fit.late_citations,
+        "early_slope": fit.early_slope,
+        "late_slope": fit.late_slope,
+        "slope_ratio": fit.slope_ratio,
+        "early_end": fit.early_end,
+        "late_start": fit.late_start,
+        "is_sb": sb_slope_mask(fit),
+    })
+
+
+if __name__ == "__main__":
+    from sb_curves import build_citation_matrix
+    from sb_graph import load_citation_graph
+    from sb_index import load_paper_index
+
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+
+    kg_path = Path(sys.argv[1])
+    graph = load_citation_graph(kg_path)
+    paper_index = load_paper_index(kg_path, years=np.asarray(graph.years))
+    matrix = build_citation_matrix(graph)
+
+    df = slope_metrics(matrix, graph.years, np.flatnonzero(graph.has_record))
+    df = paper_index.join(df)
+    sb = df[df["is_sb"]].sort_values("slope_ratio", ascending=False, kind="stable")
+
+    print(f"    Papers fitted: {len(df)}")
+    print(f"    True SB candidates (slope criteria): {len(sb)}")
+    if len(sys.argv) == 3:
+        sb.to_csv(sys.argv[2], index=False)
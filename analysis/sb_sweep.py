@@ -0,0 +1,206 @@
+"""
+Threshold Sweep
+
+Interactive queries over precomputed slope metrics (see sb_slopes.py):
+
+    early < a,  late > b * early,  slope_ratio > c,  age >= d
+
+ThresholdIndex keeps one sort order per criterion. A query picks the
+criterion with the shortest passing prefix (a binary search per column)
+and checks the other three only on that prefix, so typical queries touch
+a few hundred rows. surface() counts every combination of a threshold grid
+at once from a 4-D histogram and cumulative sums, so a 10^4-point
+sensitivity surface costs one pass over the papers.
+
+Usage:
+    python sb_sweep.py /path/to/astro-ph-kg-full [surface.csv]
+"""
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from sb_metrics import horizon_year
+from sb_slopes import SB_SLOPE_CRITERIA
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_THRESHOLDS = {
+    "max_early": SB_SLOPE_CRITERIA["max_early"],
+    "late_factor": SB_SLOPE_CRITERIA["late_factor"],
+    "min_slope_ratio": SB_SLOPE_CRITERIA["min_slope_ratio"],
+    "min_age": 10,
+}
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+@dataclass
+class _SortedColumn:
+    order: np.ndarray   # row order, passing rows first for any threshold
+    keys: np.ndarray    # sort keys in that order (ascending)
+
+
+class ThresholdIndex:
+    """Per-column sort orders over the early/late/slope_ratio/age metrics."""
+
+    def __init__(self, paper_idx: np.ndarray, early: np.ndarray, late: np.ndarray,
+                 slope_ratio: np.ndarray, age: np.ndarray):
+        self.paper_idx = np.asarray(paper_idx, dtype=np.int64)
+        self.early = np.asarray(early, dtype=np.float64)
+        self.late = np.asarray(late, dtype=np.float64)
+        self.slope_ratio = np.asarray(slope_ratio, dtype=np.float64)
+        self.age = np.asarray(age, dtype=np.int64)
+
+        # late / early, with 0 early and some late -> +inf, 0 / 0 -> never passes
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = self.late / self.early
+        self.late_ratio = np.where(np.isnan(ratio), -np.inf, ratio)
+
+        # All keys ascending so that "passes" is always a prefix [0, k)
+        self._columns = {
+            "early": self._sorted(self.early),                                  # early < a
+            "late_ratio": self._sorted(-self.late_ratio),                       # ratio > b
+            "slope_ratio": self._sorted(-np.nan_to_num(self.slope_ratio, nan=-np.inf)),
+            "age": self._sorted(-self.age.astype(np.float64)),                  # age >= d
+        }
+
+    @staticmethod
+    def _sorted(keys: np.ndarray) -> _SortedColumn:
+        order = np.argsort(keys, kind="stable")
+        return _SortedColumn(order=order, keys=keys[order])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame,
+                   current_year: Optional[int] = None) -> "ThresholdIndex":
+        """
+        Build from a slope_metrics() frame (paper_idx, year, early, late, slope_ratio).
+
+        Ages are measured against current_year, by default the latest year
+        in the frame.
+        """
+        if current_year is None:
+            current_year = horizon_year(df["year"])
+        return cls(df["paper_idx"].to_numpy(), df["early"].to_numpy(), df["late"].to_numpy(),
+                   df["slope_ratio"].to_numpy(), current_year - df["year"].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.paper_idx)
+
+    # -- single queries ------------------------------------------------------
+
+    def _prefix_lengths(self, a, b, c, d):
+        cols = self._columns
+        return {
+            "early": np.searchsorted(cols["early"].keys, a, side="left"),
+            "late_ratio": np.searchsorted(cols["late_ratio"].keys, -b, side="left"),
+            "slope_ratio": np.searchsorted(cols["slope_ratio"].keys, -c, side="left"),
+            "age": np.searchsorted(cols["age"].keys, -d, side="right"),
+        }
+
+    def rows(self, max_early: float = DEFAULT_THRESHOLDS["max_early"],
+             late_factor: float = DEFAULT_THRESHOLDS["late_factor"],
+             min_slope_ratio: float = DEFAULT_THRESHOLDS["min_slope_ratio"],
+             min_age: int = DEFAULT_THRESHOLDS["min_age"]) -> np.ndarray:
+        """Row positions passing all four criteria, in ascending row order."""
+        lengths = self._prefix_lengths(max_early, late_factor, min_slope_ratio, min_age)
+        column = min(lengths, key=lengths.get)
+        rows = self._columns[column].order[:lengths[column]]
+
+        with np.errstate(invalid="ignore"):
+            keep = ((self.early[rows] < max_early) &
+                    (self.late[rows] > late_factor * self.early[rows]) &
+                    (self.slope_ratio[rows] > min_slope_ratio) &
+                    (self.age[rows] >= min_age))
+        return np.sort(rows[keep])
+
+    def query(self, max_early: float = DEFAULT_THRESHOLDS["max_early"],
+              late_factor: float = DEFAULT_THRESHOLDS["late_factor"],
+              min_slope_ratio: float = DEFAULT_THRESHOLDS["min_slope_ratio"],
+              min_age: int = DEFAULT_THRESHOLDS["min_age"]) -> np.ndarray:
+        """paper_idx of the papers passing all four criteria."""
+        return self.paper_idx[self.rows(max_early, late_factor, min_slope_ratio, min_age)]
+
+    def count(self, *args, **kwargs) -> int:
+        """Number of papers passing; same arguments as query()."""
+        return len(self.rows(*args, **kwargs))
+
+    # -- sensitivity surfaces ------------------------------------------------
+
+    def surface(self, max_early: Sequence[float], late_factor: Sequence[float],
+                min_slope_ratio: Sequence[float], min_age: Sequence[int]) -> np.ndarray:
+        """
+        Counts for every combination of the four threshold grids.
+
+        Returns an int64 array of shape (len(max_early), len(late_factor),
+        len(min_slope_ratio), len(min_age)). Each grid must be sorted
+        ascending. The late criterion is evaluated as late / early > b,
+        which equals late > b * early up to floating-point rounding.
+        """
+        a = np.asarray(max_early, dtype=np.float64)
+        b = np.asarray(late_factor, dtype=np.float64)
+        c = np.asarray(min_slope_ratio, dtype=np.float64)
+        d = np.asarray(min_age, dtype=np.float64)
+        for grid in (a, b, c, d):
+            if np.any(np.diff(grid) < 0):
+                raise ValueError("threshold grids must be sorted ascending")
+
+        # Per paper: first passing index along a, and number of passing
+        # indices along b, c, d (each criterion passes on a contiguous range)
+        ia = np.searchsorted(a, self.early, side="right")        # a[j] > early for j >= ia
+        nb = np.searchsorted(b, self.late_ratio, side="left")    # b[j] < ratio for j < nb
+        sr = np.nan_to_num(self.slope_ratio, nan=-np.inf)
+        nc = np.searchsorted(c, sr, side="left")                 # c[j] < sr for j < nc
+        nd = np.searchsorted(d, self.age, side="right")          # d[j] <= age for j < nd
+
+        shape = (len(a) + 1, len(b) + 1, len(c) + 1, len(d) + 1)
+        flat = np.ravel_multi_index((ia, nb, nc, nd), shape)
+        hist = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+
+        # count[ja, jb, jc, jd] = #(ia <= ja, nb > jb, nc > jc, nd > jd)
+        cum = np.cumsum(hist, axis=0)
+        for axis in (1, 2, 3):
+            cum = np.flip(np.cumsum(np.flip(cum, axis=axis), axis=axis), axis=axis)
+        return cum[:len(a), 1:, 1:, 1:]
+
+    def surface_frame(self, max_early: Sequence[float], late_factor: Sequence[float],
+                      min_slope_ratio: Sequence[float], min_age: Sequence[int]) -> pd.DataFrame:
+        """surface() as a long DataFrame with one row per threshold combination."""
+        counts = self.surface(max_early, late_factor, min_slope_ratio, min_age)
+        grid = np.meshgrid(max_early, late_factor, min_slope_ratio, min_age, indexing="ij")
+        return pd.DataFrame({
+            "max_early": grid[0].ravel(),
+            "late_factor": grid[1].ravel(),
+            "min_slope_ratio": grid[2].ravel(),
+            "min_age": grid[3].ravel(),
+            "n_papers": counts.ravel(),
+        })
+
+
+if __name__ == "__main__":
+    from sb_curves import build_citation_matrix
+    from sb_graph import load_citation_graph
+    from sb_slopes import slope_metrics
+
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+
+    graph = load_citation_graph(Path(sys.argv[1]))
+    matrix = build_citation_matrix(graph)
+    df = slope_metrics(matrix, graph.years, np.flatnonzero(graph.has_record))
+    index = ThresholdIndex.from_frame(df, horizon_year(graph.years))
+
+    print(f"    Papers indexed: {len(index)}")
+    print(f"    Passing default thresholds {DEFAULT_THRESHOLDS}: {index.count()}")
+    if len(sys.argv) == 3:
+        surface = index.surface_frame(np.arange(1, 11), np.arange(1, 11),
+                                      np.arange(1, 11), np.arange(5, 25, 2))
+        surface.to_csv(sys.argv[2], index=False)
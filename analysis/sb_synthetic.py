@@ -0,0 +1,214 @@
+"""
+Synthetic Knowledge Graph
+
+Writes a KG directory in the exact formats the analysis scripts read
+(papers_years.npy, papers_index_mapping.csv.gz, citations_indexed.jsonl.gz)
+so timings and candidate recovery can be measured reproducibly without the
+real astro-ph KG.
+
+    - paper counts grow exponentially per year; paper_idx follows
+      publication order and ids are arXiv-style (astro-ph/YYMMNNN before
+      2007, YYMM.NNNNN after);
+    - references per paper are Poisson; targets are drawn by preferential
+      attachment (citations so far + 1) with exponential ageing, giving the
+      usual heavy-tailed citation distribution;
+    - a set of injected sleeping beauties get almost no citations until an
+      awakening year 8-12 years after publication, then a linearly rising
+      number of citations per year (the step pattern of the README
+      slope criteria). Their paper_idx are written to
+      injected_sleeping_beauties.npy for recovery checks.
+
+Usage:
+    python sb_synthetic.py out_dir n_papers [n_sleeping_beauties]
+"""
+
+import gzip
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from sb_graph import CITATIONS_FILE, YEARS_FILE
+from sb_index import MAPPING_FILE
+
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+FIRST_YEAR = 1992
+LAST_YEAR = 2025
+GROWTH = 0.05           # yearly growth of the number of papers
+MEAN_REFERENCES = 20    # in-corpus references per paper
+AGEING_YEARS = 6.0      # e-folding time of a paper's attractiveness
+SB_MIN_SLEEP = 8        # awakening 8-12 years after publication
+SB_MAX_SLEEP = 12
+SB_SLEEP_RATE = 0.1     # expected citations per year while asleep
+SB_MIN_AGE = 15         # injected SBs are at least this old at LAST_YEAR
+SB_FILE = "injected_sleeping_beauties.npy"
+
+# =============================================================================
+# GENERATION
+# =============================================================================
+
+def paper_years(n_papers: int, rng: np.random.Generator,
+                first_year: int = FIRST_YEAR, last_year: int = LAST_YEAR,
+                growth: float = GROWTH) -> np.ndarray:
+    """Sorted publication years with exponential growth of papers per year."""
+    span = np.arange(first_year, last_year + 1)
+    weights = (1 + growth) ** (span - first_year)
+    per_year = rng.multinomial(n_papers, weights / weights.sum())
+    return np.repeat(span, per_year).astype(np.int64)
+
+
+def arxiv_ids(years: np.ndarray, rng: np.random.Generator) -> list:
+    """Unique arXiv-style ids, sequential within each year."""
+    ids = []
+    for year in np.unique(years):
+        n = int(np.sum(years == year))
+        months = np.sort(rng.integers(1, 13, n))
+        yy = year % 100
+        if year < 2007:
+            ids += [f"astro-ph/{yy:02d}{m:02d}{k:03d}" for k, m in enumerate(months)]
+        else:
+            ids += [f"{yy:02d}{m:02d}.{k:05d}" for k, m in enumerate(months)]
+    return ids
+
+
+def citation_edges(years: np.ndarray, rng: np.random.Generator,
+                   mean_refs: float = MEAN_REFERENCES, ageing: float = AGEING_YEARS,
+                   exclude: Optional[np.ndarray] = None):
+    """
+    (citing, cited) edges by yearly preferential attachment with ageing.
+
+    Papers cite earlier papers (lower paper_idx, same year allowed). Rows
+    in exclude are never drawn as targets. Duplicate edges are removed.
+    """
+    n = len(years)
+    received = np.zeros(n, dtype=np.float64)
+    blocked = np.zeros(n, dtype=bool)
+    if exclude is not None:
+        blocked[exclude] = True
+
+    citing_parts, cited_parts = [], []
+    bounds = np.searchsorted(years, np.unique(years), side="left").tolist() + [n]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi <= 1:
+            continue
+        age = years[lo] - years[:hi]
+        weight = (received[:hi] + 1.0) * np.exp(-age / ageing)
+        weight[blocked[:hi]] = 0.0
+        cum = np.cumsum(weight)
+
+        n_refs = rng.poisson(mean_refs, hi - lo)
+        citing = np.repeat(np.arange(lo, hi), n_refs)
+        cited = np.searchsorted(cum, rng.random(len(citing)) * cum[-1], side="right")
+        keep = cited < citing
+        citing, cited = citing[keep], cited[keep]
+
+        np.add.at(received, cited, 1)
+        citing_parts.append(citing)
+        cited_parts.append(cited)
+
+    citing = np.concatenate(citing_parts) if citing_parts else np.zeros(0, np.int64)
+    cited = np.concatenate(cited_parts) if cited_parts else np.zeros(0, np.int64)
+    edges = np.unique(citing * n + cited)
+    return edges // n, edges % n
+
+
+def sleeping_beauty_edges(years: np.ndarray, beauties: np.ndarray,
+                          rng: np.random.Generator, last_year: int = LAST_YEAR):
+    """
+    Edges for injected sleeping beauties: SB_SLEEP_RATE citations/year
+    while asleep, then ramp * (years since awakening + 1) per year. Citing
+    papers are drawn uniformly from the papers of each citing year.
+    """
+    starts = np.searchsorted(years, np.arange(years.min(), last_year + 2), side="left")
+    citing_parts, cited_parts = [], []
+    for paper in beauties:
+        pub = int(years[paper])
+        awake = pub + int(rng.integers(SB_MIN_SLEEP, SB_MAX_SLEEP + 1))
+        ramp = rng.uniform(1.0, 4.0)
+        for year in range(pub, last_year + 1):
+            rate = SB_SLEEP_RATE if year < awake else ramp * (year - awake + 1)
+            k = rng.poisson(rate)
+            lo = max(starts[year - years.min()], paper + 1)
+            hi = starts[year - years.min() + 1]
+            if k == 0 or hi <= lo:
+                continue
+            chosen = rng.choice(np.arange(lo, hi), size=min(k, hi - lo), replace=False)
+            citing_parts.append(chosen)
+            cited_parts.append(np.full(len(chosen), paper))
+    if not citing_parts:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(citing_parts), np.concatenate(cited_parts)
+
+
+def generate_kg(out_dir: Path, n_papers: int, n_sleeping: int = 50, seed: int = 0,
+                mean_refs: float = MEAN_REFERENCES, verbose: bool = True) -> Path:
+    """Write a synthetic KG with n_papers papers into out_dir."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    years = paper_years(n_papers, rng)
+    old_enough = np.flatnonzero(years <= LAST_YEAR - SB_MIN_AGE)
+    beauties = np.sort(rng.choice(old_enough, size=min(n_sleeping, len(old_enough)),
+                                  replace=False))
+
+    citing, cited = citation_edges(years, rng, mean_refs, exclude=beauties)
+    sb_citing, sb_cited = sleeping_beauty_edges(years, beauties, rng)
+    citing = np.concatenate([citing, sb_citing])
+    cited = np.concatenate([cited, sb_cited])
+    if verbose:
+        print(f"    {n_papers} papers, {len(citing)} citations, "
+              f"{len(beauties)} injected sleeping beauties")
+
+    np.save(out_dir / YEARS_FILE, years)
+    np.save(out_dir / SB_FILE, beauties)
+    pd.DataFrame({"paper_idx": np.arange(n_papers), "arxiv_id": arxiv_ids(years, rng)}) \
+        .to_csv(out_dir / MAPPING_FILE, index=False)
+
+    # Per-paper citation / reference lists via CSR offsets
+    by_cited = np.lexsort((citing, cited))
+    cit_ptr = np.concatenate([[0], np.cumsum(np.bincount(cited, minlength=n_papers))])
+    cit_list = citing[by_cited]
+    by_citing = np.lexsort((cited, citing))
+    ref_ptr = np.concatenate([[0], np.cumsum(np.bincount(citing, minlength=n_papers))])
+    ref_list = cited[by_citing]
+
+    with gzip.open(out_dir / CITATIONS_FILE, "wb", compresslevel=1) as f:
+        for i in range(n_papers):
+            refs = ref_list[ref_ptr[i]:ref_ptr[i + 1]].tolist()
+            f.write(_dumps({
+                "paper_idx": i,
+                "citations": cit_list[cit_ptr[i]:cit_ptr[i + 1]].tolist(),
+                "references": refs,
+                "num_references": len(refs),
+            }) + b"\n")
+    return out_dir
+
+
+def load_injected(kg_path: Path) -> np.ndarray:
+    """paper_idx of the sleeping beauties injected by generate_kg()."""
+    return np.load(Path(kg_path) / SB_FILE)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print(__doc__)
+        sys.exit(1)
+    generate_kg(Path(sys.argv[1]), int(sys.argv[2]),
+                n_sleeping=int(sys.argv[3]) if len(sys.argv) == 4 else 50)
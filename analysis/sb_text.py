@@ -0,0 +1,426 @@
+"""
+Rationale Text Pipeline
+
+Offline pre-classification of SB candidates into the awakening rationale
+categories of sb_identification.classify_by_rationale(), from titles,
+abstracts and concepts:
+
+    1. tokenize    lower-case words minus stop words, plus bigrams of
+                   neighbouring kept words, streamed per document
+    2. hash        tokens -> N_FEATURES columns (crc32), so there is no
+                   vocabulary to build or share between processes
+    3. tf-idf      sublinear tf x smoothed idf, rows L2-normalized, with
+                   the idf fitted on the whole corpus
+    4. classify    nearest centroid (cosine) against one centroid per
+                   rationale, seeded from RATIONALE_KEYWORDS and
+                   optionally refit on curated labels; documents scoring
+                   below MIN_SCORE stay unclassified
+
+Documents are tokenized and hashed in chunks over a process pool, and the
+term-count matrix of a corpus file is cached on disk by
+cached_term_counts() (an sb_cache entry keyed on the file's digest). For
+every classified document the evidence column lists the tokens
+contributing most to its centroid score, for manual review.
+
+The corpus is a .jsonl(.gz) file in the arXiv metadata layout (id or
+arxiv_id, title, abstract, categories / concepts) or a .csv(.gz) with the
+same columns. Nothing is fetched from the network.
+
+Usage:
+    python sb_text.py corpus.jsonl.gz [candidates.csv] [out.csv] \\
+        [--labels curated.csv] [--workers N] [--no-cache]
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from sb_cache import ArtifactCache, cache_key
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+N_FEATURES = 2 ** 18
+CHUNK_DOCS = 2_000        # documents per worker task
+MAX_PENDING = 4           # tasks in flight per worker while streaming
+MIN_SCORE = 0.01          # cosine to the best centroid; below = unclassified
+N_EVIDENCE = 5
+TERM_COUNTS_VERSION = 1   # cache version of cached_term_counts() (see sb_cache.py)
+
+UNCLASSIFIED = "unclassified"
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9]*(?:-[a-z0-9]+)*")
+
+STOP_WORDS = frozenset("""
+a about above after again all also am an and any are as at be been before being
+below between both but by can could did do does doing during each few for from
+further had has have having here how however i if in into is it its itself more
+most no nor not of off on once only or other our ours out over own same she
+should so some such than that the their theirs them then there these they this
+those through to too under until up very was we were what when where which while
+who whom why will with within would you your
+paper present presents presented show shows shown find found result results
+study studies use used using based here also new two one three well first
+""".split()) - {"no", "not", "new", "first"}
+
+# Seed text per rationale; hashed like documents into the initial centroids
+RATIONALE_KEYWORDS: Dict[str, str] = {
+    "premature_discovery": (
+        "predicted prediction predict ahead of its time overlooked neglected ignored "
+        "unrecognized first proposed early suggestion speculative proposal anticipated "
+        "later confirmed rediscovered forgotten conjecture idea proposed"),
+    "methodological_innovation": (
+        "new method technique algorithm approach code software pipeline numerical "
+        "scheme estimator statistical method calibration implementation efficient "
+        "fast accurate tool package machine learning inference method improved"),
+    "data_release": (
+        "catalog catalogue data release survey database archive public release "
+        "publicly available photometry spectroscopic sample dataset tables online "
+        "observations reduced data products"),
+    "theoretical_framework": (
+        "theory theoretical model analytic analytical framework formalism equations "
+        "derive derivation general relativity solution perturbation dynamics "
+        "mechanism predictions of the model hydrodynamic instability"),
+    "observational_discovery": (
+        "discovery discover discovered detection detected first detection observed "
+        "new source transient candidate identification serendipitous unexpected "
+        "evidence for we report the discovery observations reveal"),
+    "negative_results": (
+        "upper limit upper limits non-detection no evidence null result not detected "
+        "rule out ruled out exclude excluded absence constrain constraints no "
+        "significant lack of"),
+    "review_synthesis": (
+        "review we review overview summary recent progress status lectures introduction "
+        "perspective comprehensive tutorial current understanding open questions"),
+}
+RATIONALES = list(RATIONALE_KEYWORDS) + [UNCLASSIFIED]
+
+# =============================================================================
+# TOKENIZE AND HASH
+# =============================================================================
+
+def tokenize(text: str) -> Iterator[str]:
+    """Unigrams and bigrams of the non-stop words of text, in order."""
+    previous = None
+    for match in TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if word in STOP_WORDS or len(word) < 2:
+            previous = None
+            continue
+        yield word
+        if previous is not None:
+            yield f"{previous} {word}"
+        previous = word
+
+
+_HASHES: Dict[str, int] = {}
+
+
+def feature(token: str, n_features: int = N_FEATURES) -> int:
+    """Hashed column of a token (stable across processes, unlike hash())."""
+    h = _HASHES.get(token)
+    if h is None:
+        h = _HASHES[token] = zlib.crc32(token.encode("utf-8"))
+        if len(_HASHES) > 2_000_000:
+            _HASHES.clear()
+    return h % n_features
+
+
+def _count_chunk(task) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(row lengths, columns, counts) of the hashed term counts of some texts."""
+    texts, n_features = task
+    lengths, columns, counts = [], [], []
+    for text in texts:
+        row = Counter(feature(t, n_features) for t in tokenize(text or ""))
+        lengths.append(len(row))
+        columns.extend(row.keys())
+        counts.extend(row.values())
+    return (np.asarray(lengths, dtype=np.int64), np.asarray(columns, dtype=np.int32),
+            np.asarray(counts, dtype=np.int32))
+
+
+def _chunks(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def term_counts(texts: Iterable[str], n_features: int = N_FEATURES,
+                workers: Optional[int] = None, chunk: int = CHUNK_DOCS) -> sparse.csr_matrix:
+    """
+    (n_docs, n_features) int32 hashed term counts of texts, in order.
+
+    texts may be a generator; at most MAX_PENDING chunks per worker are
+    held in memory at a time.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = ((c, n_features) for c in _chunks(texts, chunk))
+    if workers <= 1:
+        parts = [_count_chunk(t) for t in tasks]
+    else:
+        parts, pending = [], deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for task in tasks:
+                pending.append(pool.submit(_count_chunk, task))
+                if len(pending) >= workers * MAX_PENDING:
+                    parts.append(pending.popleft().result())
+            parts.extend(f.result() for f in pending)
+
+    lengths = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0, np.int64)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    columns = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0, np.int32)
+    counts = np.concatenate([p[2] for p in parts]) if parts else np.zeros(0, np.int32)
+    return sparse.csr_matrix((counts, columns, indptr), shape=(len(lengths), n_features))
+
+
+# =============================================================================
+# CORPUS
+# =============================================================================
+
+def _open_text(path: Path):
+    path = Path(path)
+    return gzip.open(path, "rt", encoding="utf-8") if path.suffix == ".gz" \
+        else open(path, encoding="utf-8")
+
+
+def _record_text(record) -> str:
+    concepts = record.get("concepts") or record.get("categories") or ""
+    if not isinstance(concepts, str):
+        concepts = " ".join(concepts)
+    return " ".join(str(record.get(k) or "") for k in ("title", "abstract")) + " " + concepts
+
+
+def iter_corpus(path: Path) -> Iterator[Tuple[str, str]]:
+    """Stream (arxiv_id, text) pairs from a metadata .jsonl(.gz) or .csv(.gz)."""
+    path = Path(path)
+    if ".csv" in path.suffixes:
+        for frame in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=50_000):
+            id_col = "arxiv_id" if "arxiv_id" in frame.columns else "id"
+            for record in frame.to_dict("records"):
+                yield record[id_col], _record_text(record)
+        return
+    with _open_text(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield str(record.get("arxiv_id") or record.get("id")), _record_text(record)
+
+
+def corpus_counts(path: Path, n_features: int = N_FEATURES,
+                  workers: Optional[int] = None) -> Tuple[np.ndarray, sparse.csr_matrix]:
+    """(arxiv ids, term counts) of a corpus file."""
+    ids: List[str] = []
+
+    def texts():
+        for arxiv_id, text in iter_corpus(path):
+            ids.append(arxiv_id)
+            yield text
+
+    counts = term_counts(texts(), n_features, workers)
+    return np.asarray(ids, dtype=str), counts
+
+
+def cached_term_counts(cache: ArtifactCache, corpus_path: Path,
+                       n_features: int = N_FEATURES, workers: Optional[int] = None):
+    """(key, arxiv ids, csr term counts) of a text corpus."""
+    key = cache_key("term_counts", [cache.file_digest(corpus_path)],
+                    params={"n_features": n_features}, version=TERM_COUNTS_VERSION)
+
+    def compute():
+        ids, counts = corpus_counts(corpus_path, n_features, workers)
+        return {"ids": ids, "indptr": counts.indptr, "indices": counts.indices,
+                "data": counts.data}
+
+    arrays = cache.get_or_compute(key, compute)
+    counts = sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                               shape=(len(arrays["ids"]), n_features))
+    return key, np.asarray(arrays["ids"]), counts
+
+
+def paper_text(paper) -> str:
+    """Classifier text of an sb_identification.Paper."""
+    return " ".join([paper.title or "", paper.abstract or "", " ".join(paper.concepts or [])])
+
+
+# =============================================================================
+# TF-IDF AND CLASSIFIER
+# =============================================================================
+
+@dataclass
+class TfidfModel:
+    """Smoothed idf over hashed features; transform() gives L2-normalized rows."""
+    idf: np.ndarray
+
+    @classmethod
+    def fit(cls, counts: sparse.csr_matrix) -> "TfidfModel":
+        n_docs = counts.shape[0]
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        return cls(idf=np.log((1 + n_docs) / (1 + df)) + 1.0)
+
+    def transform(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        x = counts.astype(np.float64).tocsr(copy=True)
+        x.data = (1.0 + np.log(x.data)) * self.idf[x.indices]
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+        x = sparse.diags(1.0 / np.where(norms > 0, norms, 1.0)) @ x
+        return x.tocsr()
+
+
+@dataclass
+class NearestCentroid:
+    """One L2-normalized tf-idf centroid per rationale; cosine nearest wins."""
+    labels: List[str]
+    centroids: np.ndarray          # (n_labels, n_features)
+    min_score: float = MIN_SCORE
+
+    @classmethod
+    def fit(cls, x: sparse.csr_matrix, y: Sequence[str],
+            labels: Optional[Sequence[str]] = None, min_score: float = MIN_SCORE):
+        y = np.asarray(y, dtype=object)
+        labels = list(labels) if labels is not None else sorted(set(y) - {UNCLASSIFIED})
+        centroids = np.zeros((len(labels), x.shape[1]))
+        for k, label in enumerate(labels):
+            rows = np.flatnonzero(y == label)
+            if len(rows):
+                centroids[k] = np.asarray(x[rows].mean(axis=0)).ravel()
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        return cls(labels, centroids / np.where(norms > 0, norms, 1.0), min_score)
+
+    @classmethod
+    def from_keywords(cls, tfidf: TfidfModel, keywords: Dict[str, str] = RATIONALE_KEYWORDS,
+                      min_score: float = MIN_SCORE) -> "NearestCentroid":
+        x = tfidf.transform(term_counts(keywords.values(), len(tfidf.idf), workers=1))
+        return cls.fit(x, list(keywords), list(keywords), min_score)
+
+    def refit(self, x: sparse.csr_matrix, y: Sequence[str], weight: float = 1.0):
+        """Blend in curated examples: centroid = seed + weight * mean of labelled rows."""
+        curated = NearestCentroid.fit(x, y, self.labels)
+        blended = self.centroids + weight * curated.centroids
+        norms = np.linalg.norm(blended, axis=1, keepdims=True)
+        return NearestCentroid(self.labels, blended / np.where(norms > 0, norms, 1.0),
+                               self.min_score)
+
+    def scores(self, x: sparse.csr_matrix) -> np.ndarray:
+        return np.asarray(x @ self.centroids.T)
+
+    def predict(self, x: sparse.csr_matrix) -> pd.DataFrame:
+        """rationale, score (cosine) and margin over the runner-up per row."""
+        s = self.scores(x)
+        if s.shape[1] == 0:
+            return pd.DataFrame({"rationale": [UNCLASSIFIED] * x.shape[0],
+                                 "score": 0.0, "margin": 0.0})
+        order = np.argsort(-s, axis=1, kind="stable")
+        best = s[np.arange(len(s)), order[:, 0]]
+        second = s[np.arange(len(s)), order[:, 1]] if s.shape[1] > 1 else np.zeros(len(s))
+        rationale = np.asarray(self.labels, dtype=object)[order[:, 0]]
+        rationale[best < self.min_score] = UNCLASSIFIED
+        return pd.DataFrame({"rationale": rationale, "score": best, "margin": best - second})
+
+
+def evidence(text: str, centroid: np.ndarray, tfidf: TfidfModel,
+             n: int = N_EVIDENCE) -> List[str]:
+    """Tokens of text contributing most to its score against centroid."""
+    tokens = Counter(tokenize(text or ""))
+    n_features = len(tfidf.idf)
+    scored = []
+    for token, tf in tokens.items():
+        j = feature(token, n_features)
+        contribution = (1.0 + math.log(tf)) * tfidf.idf[j] * centroid[j]
+        if contribution > 0:
+            scored.append((-contribution, token))
+    return [token for _, token in sorted(scored)[:n]]
+
+
+def classify_texts(texts: Sequence[str], tfidf: Optional[TfidfModel] = None,
+                   model: Optional[NearestCentroid] = None,
+                   workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Rationale, score, margin and evidence for each text.
+
+    tfidf defaults to idf fitted on texts themselves (pass one fitted on
+    the whole corpus for stable weights); model defaults to the keyword
+    centroids.
+    """
+    texts = list(texts)
+    counts = term_counts(texts, len(tfidf.idf) if tfidf is not None else N_FEATURES, workers)
+    tfidf = tfidf or TfidfModel.fit(counts)
+    model = model or NearestCentroid.from_keywords(tfidf)
+    df = model.predict(tfidf.transform(counts))
+    position = {label: k for k, label in enumerate(model.labels)}
+    df["evidence"] = [
+        "; ".join(evidence(text, model.centroids[position[label]], tfidf))
+        if label != UNCLASSIFIED else ""
+        for text, label in zip(texts, df["rationale"])
+    ]
+    return df
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Pre-classify awakening rationale from text")
+    parser.add_argument("corpus", type=Path, help="metadata .jsonl(.gz) or .csv(.gz)")
+    parser.add_argument("candidates", type=Path, nargs="?", default=None,
+                        help="CSV with an arxiv_id column (default: whole corpus)")
+    parser.add_argument("out", type=Path, nargs="?", default=None)
+    parser.add_argument("--labels", type=Path, default=None,
+                        help="curated CSV with arxiv_id, rationale columns")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.no_cache:
+        ids, counts = corpus_counts(args.corpus, workers=args.workers)
+    else:
+        _, ids, counts = cached_term_counts(ArtifactCache(), args.corpus, workers=args.workers)
+    print(f"    {len(ids)} documents vectorized in {time.perf_counter() - start:.1f}s")
+
+    tfidf = TfidfModel.fit(counts)
+    model = NearestCentroid.from_keywords(tfidf)
+    position = pd.Index(ids)
+    if args.labels:
+        curated = pd.read_csv(args.labels, dtype=str)
+        rows = position.get_indexer(curated["arxiv_id"])
+        known = rows >= 0
+        model = model.refit(tfidf.transform(counts[rows[known]]),
+                            curated["rationale"].to_numpy()[known])
+
+    rows = np.arange(len(ids))
+    if args.candidates:
+        wanted = pd.read_csv(args.candidates, dtype=str, usecols=["arxiv_id"])["arxiv_id"]
+        rows = position.get_indexer(wanted)
+        rows = rows[rows >= 0]
+    df = model.predict(tfidf.transform(counts[rows]))
+    df.insert(0, "arxiv_id", ids[rows])
+
+    wanted = set(df["arxiv_id"])
+    texts = {a: text for a, text in iter_corpus(args.corpus) if a in wanted}
+    label_pos = {label: k for k, label in enumerate(model.labels)}
+    df["evidence"] = [
+        "; ".join(evidence(texts.get(a, ""), model.centroids[label_pos[r]], tfidf))
+        if r != UNCLASSIFIED else ""
+        for a, r in zip(df["arxiv_id"], df["rationale"])
+    ]
+    print(f"    classified {len(df)} in {time.perf_counter() - start:.1f}s")
+    print(df["rationale"].value_counts().to_string())
+    if args.out:
+        df.to_csv(args.out, index=False)
@@ -0,0 +1,213 @@
+"""
+Dashboard Tiles
+
+Static, pre-tiled export of the candidate table for index.html, so the
+dashboard can browse thousands of candidates while downloading only what
+is on screen:
+
+    tiles/index.json                 columns, row count, page size, sort keys
+    tiles/pages/<key>/<page>.json    one page of rows per sort order
+    tiles/curves/<shard>.sbc         curves in the sb_curvepack blob format
+
+Rows carry the curve shard and slot of their curve. Curves are sharded in
+the default sort order, so the first pages of the default view need a
+single curve shard. First paint needs index.json and one page (a few KB)
+regardless of the number of candidates. Any static file server works, e.g.
+`python -m http.server` from the repository root.
+
+Usage:
+    python sb_tiles.py /path/to/astro-ph-kg-full [tiles_dir]
+"""
+
+import json
+import math
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from sb_beauty import beauty_coefficients
+from sb_curvepack import CurveSet, from_matrix, write_blob
+from sb_curves import CitationMatrix, age_aligned_counts
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+TILES_DIR = Path(__file__).resolve().parent.parent / "tiles"
+PAGE_SIZE = 50
+CURVE_SHARD_SIZE = 500
+
+TILE_COLUMNS = ["id", "year", "early", "late", "total", "early_slope", "late_slope",
+                "slope_ratio", "beauty", "awakening_year", "is_sb"]
+
+# sort key -> ascending; the first key is the dashboard default
+SORT_KEYS = {
+    "slope_ratio": False,
+    "beauty": False,
+    "total": False,
+    "year": True,
+}
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def _json_value(v):
+    if isinstance(v, (float, np.floating)):
+        return None if not math.isfinite(v) else round(float(v), 4)
+    if isinstance(v, (np.integer,)):
+        return int(v)
+    if isinstance(v, (np.bool_,)):
+        return bool(v)
+    return v
+
+
+def _write_json(path: Path, payload):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, separators=(",", ":")))
+
+
+def export_tiles(df: pd.DataFrame, curves: CurveSet, out_dir: Path = TILES_DIR,
+                 sort_keys: Dict[str, bool] = SORT_KEYS,
+                 page_size: int = PAGE_SIZE,
+                 curve_shard_size: int = CURVE_SHARD_SIZE) -> Path:
+    """
+    Write index.json, per-sort-key pages and curve shards for df.
+
+    df needs an "id" column matching curves.ids plus the TILE_COLUMNS it
+    has (missing ones are skipped). Rows with equal keys keep df order.
+    """
+    out_dir = Path(out_dir)
+    for sub in ("pages", "curves"):
+        if (out_dir / sub).exists():
+            shutil.rmtree(out_dir / sub)
+
+    columns = [c for c in TILE_COLUMNS if c in df.columns]
+    default_key = next(iter(sort_keys))
+    df = df.sort_values(default_key, ascending=sort_keys[default_key],
+                        kind="stable", na_position="last").reset_index(drop=True)
+
+    # Curve shards follow the default order
+    positions = np.array([curves.position(i) for i in df["id"]], dtype=np.int64)
+    n_shards = max(1, math.ceil(len(df) / curve_shard_size))
+    for shard in range(n_shards):
+        rows = positions[shard * curve_shard_size:(shard + 1) * curve_shard_size]
+        subset = _subset(curves, rows)
+        (out_dir / "curves").mkdir(parents=True, exist_ok=True)
+        write_blob(subset, out_dir / "curves" / f"{shard:05d}.sbc")
+    shard_of = np.arange(len(df)) // curve_shard_size
+    slot_of = np.arange(len(df)) % curve_shard_size
+
+    values = df[columns].astype(object).to_numpy()
+    n_pages = max(1, math.ceil(len(df) / page_size))
+    for key, ascending in sort_keys.items():
+        order = df[key].sort_values(ascending=ascending, kind="stable",
+                                    na_position="last").index.to_numpy()
+        for page in range(n_pages):
+            rows = order[page * page_size:(page + 1) * page_size]
+            _write_json(out_dir / "pages" / key / f"{page:05d}.json", {
+                "rows": [[_json_value(v) for v in values[r]] for r in rows],
+                "curves": [[int(shard_of[r]), int(slot_of[r])] for r in rows],
+            })
+
+    _write_json(out_dir / "index.json", {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "n_rows": len(df),
+        "columns": columns,
+        "page_size": page_size,
+        "n_pages": n_pages,
+        "sort_keys": {k: {"ascending": a} for k, a in sort_keys.items()},
+        "default_sort": default_key,
+        "curve_shard_size": curve_shard_size,
+        "n_curve_shards": n_shards,
+    })
+    return out_dir
+
+
+def _subset(curves: CurveSet, rows: np.ndarray) -> CurveSet:
+    """Curves at the given positions, re-packed into their own byte array."""
+    starts, ends = curves.offsets[rows], curves.offsets[rows + 1]
+    lengths = ends - starts
+    data = (np.concatenate([curves.data[s:e] for s, e in zip(starts, ends)])
+            if len(rows) else np.zeros(0, dtype=np.uint8))
+    return CurveSet(ids=curves.ids[rows], base_year=curves.base_year[rows],
+                    offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                    data=data)
+
+
+def candidate_table(state, index, min_age: int = 10,
+                    min_slope_ratio: Optional[float] = 1.0) -> pd.DataFrame:
+    """
+    Browsable candidates from an sb_update.SnapshotState.
+
+    Keeps recorded papers at least min_age years old whose slope ratio
+    exceeds min_slope_ratio (None keeps all), with ids from the paper index
+    (idx_<n> for papers missing from the mapping).
+    """
+    df = state.table()
+    df["total"] = state.matrix.counts[df["paper_idx"]].sum(axis=1, dtype=np.int64)
+    keep = df["paper_age"] >= min_age
+    if min_slope_ratio is not None:
+        keep &= df["slope_ratio"] > min_slope_ratio
+    return _with_ids(df[keep].reset_index(drop=True), index)
+
+
+def slopes_table(slopes: pd.DataFrame, matrix: CitationMatrix, index, min_age: int = 10,
+                 min_slope_ratio: Optional[float] = 1.0) -> pd.DataFrame:
+    """
+    candidate_table() from the slope table of the sb.py identify stage.
+
+    Uses the pipeline's citation matrix instead of rebuilding a snapshot
+    state; beauty, peak and awakening years are computed for the kept rows
+    only.
+    """
+    keep = slopes["paper_age"] >= min_age
+    if min_slope_ratio is not None:
+        keep &= slopes["slope_ratio"] > min_slope_ratio
+    df = slopes.loc[keep, ["paper_idx", "year", "paper_age", "early", "late", "early_slope",
+                           "late_slope", "slope_ratio", "is_sb"]].reset_index(drop=True)
+    rows = df["paper_idx"].to_numpy()
+    pub_years = df["year"].to_numpy().astype(np.int64)
+    beauty = beauty_coefficients(*age_aligned_counts(matrix, pub_years, rows=rows))
+    df.insert(df.columns.get_loc("is_sb"), "beauty", beauty.beauty)
+    df.insert(df.columns.get_loc("is_sb"), "peak_year", pub_years + beauty.peak_age)
+    df.insert(df.columns.get_loc("is_sb"), "awakening_year", pub_years + beauty.awakening_age)
+    df["total"] = matrix.counts[rows].sum(axis=1, dtype=np.int64)
+    return _with_ids(df, index)
+
+
+def _with_ids(df: pd.DataFrame, index) -> pd.DataFrame:
+    """Insert the id column (idx_<n> for papers missing from the mapping)."""
+    ids = index.arxiv_ids(df["paper_idx"].to_numpy()).astype(object)
+    df.insert(0, "id", [a if isinstance(a, str) else f"idx_{p}"
+                        for a, p in zip(ids, df["paper_idx"])])
+    return df
+
+
+if __name__ == "__main__":
+    from sb_graph import load_citation_graph
+    from sb_index import load_paper_index
+    from sb_update import build_state
+
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+
+    kg_path = Path(sys.argv[1])
+    out_dir = Path(sys.argv[2]) if len(sys.argv) == 3 else TILES_DIR
+    graph = load_citation_graph(kg_path)
+    index = load_paper_index(kg_path, years=np.asarray(graph.years))
+    state = build_state(graph)
+
+    df = candidate_table(state, index)
+    curves = from_matrix(state.matrix, df["id"].tolist(), df["paper_idx"].to_numpy())
+    export_tiles(df, curves, out_dir)
+
+    size = sum(f.stat().st_size for f in out_dir.rglob("*") if f.is_file())
+    print(f"    Candidates: {len(df)}")
+    print(f"    Tiles: {out_dir} ({size / 1024:.1f} KB)")
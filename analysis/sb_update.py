@@ -0,0 +1,347 @@
+"""
+Incremental Snapshot Update
+
+Keeps the per-year citation matrix of a KG snapshot on disk together with
+the per-paper quantities the slope and beauty criteria are derived from,
+and folds a newer snapshot in by applying only its new papers and new
+citation edges:
+
+    - new papers append rows, a later citing year appends a column;
+    - new edges are added to the matrix and to the per-paper sums of c and
+      age*c over the early and late slope windows;
+    - slopes are refit for every paper from those sums (a longer horizon
+      changes every late fit, but only through closed-form age sums, so
+      this is O(n_papers) with no pass over the matrix);
+    - beauty coefficients are recomputed only for papers that received new
+      citations (trailing zero years cannot move the peak or B);
+    - candidate flags are re-evaluated against the new horizon.
+
+The current year is the snapshot horizon, i.e. the latest publication year
+in the data. An update assumes existing papers keep their indices and that
+every new edge comes from a new citing paper, which is how appended
+snapshots of the KG grow.
+
+Usage:
+    python sb_update.py init   /path/to/astro-ph-kg-full state_dir
+    python sb_update.py update /path/to/astro-ph-kg-new  state_dir
+"""
+
+import json
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sb_beauty import BeautyResult, beauty_coefficients
+from sb_curves import CitationMatrix, age_aligned_counts, build_citation_matrix
+from sb_graph import CitationGraph
+from sb_slopes import (EARLY_END, LATE_START, SlopeFit, sb_slope_mask, slope_ratio,
+                       slopes_from_sums)
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+STATE_ARRAYS = ("counts", "pub_years", "has_record",
+                "early_y", "early_xy", "late_y", "late_xy",
+                "beauty", "peak_age", "awakening_age", "peak_citations")
+META_FILE = "state.json"
+CHUNK_ROWS = 100_000  # rows per age-alignment block when building a state
+
+# =============================================================================
+# DATA STRUCTURES
+# =============================================================================
+
+@dataclass
+class SnapshotState:
+    """Citation matrix plus the per-paper sums behind slopes, beauty and flags."""
+    matrix: CitationMatrix
+    pub_years: np.ndarray
+    has_record: np.ndarray
+    early_y: np.ndarray     # sum of c over ages [0, early_end)
+    early_xy: np.ndarray    # sum of age * c over the same ages
+    late_y: np.ndarray      # sum of c over ages [late_start, horizon]
+    late_xy: np.ndarray
+    beauty: BeautyResult
+    early_end: int = EARLY_END
+    late_start: int = LATE_START
+
+    @property
+    def n_papers(self) -> int:
+        return len(self.pub_years)
+
+    @property
+    def current_year(self) -> int:
+        """Snapshot horizon: the last year of the citation matrix."""
+        return self.matrix.last_year
+
+    def n_observed(self) -> np.ndarray:
+        """Ages covered by the matrix for each paper (as in age_aligned_counts)."""
+        pub_col = self.pub_years.astype(np.int64) - self.matrix.first_year
+        return np.clip(self.matrix.n_years - pub_col, 0, self.matrix.n_years)
+
+    def slope_fit(self) -> SlopeFit:
+        """Early/late fits for every paper, identical to fit_piecewise_slopes()."""
+        n_observed = self.n_observed()
+        zero = np.zeros(self.n_papers, dtype=np.int64)
+        early_hi = np.minimum(self.early_end, n_observed)
+        late_lo = np.full(self.n_papers, self.late_start, dtype=np.int64)
+        late_hi = np.maximum(n_observed, late_lo)
+
+        early_slope = slopes_from_sums(self.early_y, self.early_xy, zero, early_hi)
+        late_slope = slopes_from_sums(self.late_y, self.late_xy, late_lo, late_hi)
+        return SlopeFit(
+            early_slope=early_slope,
+            late_slope=late_slope,
+            slope_ratio=slope_ratio(early_slope, late_slope),
+            early_citations=self.early_y,
+            late_citations=self.late_y,
+            early_end=np.full(self.n_papers, self.early_end, dtype=np.int64),
+            late_start=late_lo,
+        )
+
+    def table(self, records_only: bool = True) -> pd.DataFrame:
+        """Slope, beauty and flag columns per paper, ages against current_year."""
+        fit = self.slope_fit()
+        pub_years = self.pub_years.astype(np.int64)
+        df = pd.DataFrame({
+            "paper_idx": np.arange(self.n_papers),
+            "year": pub_years,
+            "paper_age": self.current_year - pub_years,
+            "early": fit.early_citations,
+            "late": fit.late_citations,
+            "early_slope": fit.early_slope,
+            "late_slope": fit.late_slope,
+            "slope_ratio": fit.slope_ratio,
+            "beauty": self.beauty.beauty,
+            "peak_year": pub_years + self.beauty.peak_age,
+            "awakening_year": pub_years + self.beauty.awakening_age,
+            "is_sb": sb_slope_mask(fit),
+        })
+        if records_only:
+            df = df[self.has_record].reset_index(drop=True)
+        return df
+
+
+# =============================================================================
+# SEGMENT SUMS
+# =============================================================================
+
+def _window_sums(ages: np.ndarray, values: np.ndarray, rows: np.ndarray, n_rows: int,
+                 start: int, end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row sums of values and age*values over ages [start, end)."""
+    keep = ages >= start
+    if end is not None:
+        keep &= ages < end
+    rows, ages, values = rows[keep], ages[keep], values[keep].astype(np.int64)
+    return (np.bincount(rows, weights=values, minlength=n_rows).astype(np.int64),
+            np.bincount(rows, weights=values * ages, minlength=n_rows).astype(np.int64))
+
+
+def _cell_sums(state_arrays: dict, rows: np.ndarray, ages: np.ndarray, values: np.ndarray,
+               n_rows: int, early_end: int, late_start: int):
+    """Add the early/late sums of (row, age, value) cells into state_arrays."""
+    ey, exy = _window_sums(ages, values, rows, n_rows, 0, early_end)
+    ly, lxy = _window_sums(ages, values, rows, n_rows, late_start)
+    state_arrays["early_y"] += ey
+    state_arrays["early_xy"] += exy
+    state_arrays["late_y"] += ly
+    state_arrays["late_xy"] += lxy
+
+
+def _nonzero_cells(matrix: CitationMatrix, pub_years: np.ndarray, rows: slice):
+    """(row, age, count) of the non-zero cells in a block of matrix rows."""
+    block = matrix.counts[rows]
+    r, c = np.nonzero(block)
+    ages = c - (pub_years[rows][r].astype(np.int64) - matrix.first_year)
+    return r + rows.start, ages, block[r, c]
+
+
+# =============================================================================
+# BUILD / UPDATE
+# =============================================================================
+
+def build_state(graph: CitationGraph, early_end: int = EARLY_END,
+                late_start: int = LATE_START) -> SnapshotState:
+    """Full build of the state for one snapshot."""
+    pub_years = np.asarray(graph.years)
+    matrix = build_citation_matrix(graph)
+    n = graph.n_papers
+
+    sums = {name: np.zeros(n, dtype=np.int64)
+            for name in ("early_y", "early_xy", "late_y", "late_xy")}
+    beauty = BeautyResult(beauty=np.zeros(n), peak_age=np.zeros(n, dtype=np.int64),
+                          awakening_age=np.zeros(n, dtype=np.int64),
+                          peak_citations=np.zeros(n, dtype=np.int64))
+    for start in range(0, n, CHUNK_ROWS):
+        rows = slice(start, min(start + CHUNK_ROWS, n))
+        r, ages, values = _nonzero_cells(matrix, pub_years, rows)
+        _cell_sums(sums, r, ages, values, n, early_end, late_start)
+
+        counts, n_observed = age_aligned_counts(matrix, pub_years[rows],
+                                                rows=np.arange(rows.start, rows.stop))
+        _set_beauty(beauty, np.arange(rows.start, rows.stop),
+                    beauty_coefficients(counts, n_observed))
+
+    return SnapshotState(matrix=matrix, pub_years=pub_years,
+                         has_record=np.asarray(graph.has_record, dtype=bool),
+                         beauty=beauty, early_end=early_end, late_start=late_start, **sums)
+
+
+def _set_beauty(target: BeautyResult, rows: np.ndarray, values: BeautyResult):
+    for field in BeautyResult.__dataclass_fields__:
+        getattr(target, field)[rows] = getattr(values, field)
+
+
+def new_edges(graph: CitationGraph, n_old: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(citing, cited) citation edges of graph whose citing paper is >= n_old."""
+    indptr = np.asarray(graph.citations_indptr)
+    citing = np.asarray(graph.citations_indices)
+    positions = np.flatnonzero(citing >= n_old)
+    cited = np.searchsorted(indptr, positions, side="right") - 1
+    return citing[positions].astype(np.int64), cited.astype(np.int64)
+
+
+def apply_update(state: SnapshotState, pub_years: np.ndarray,
+                 citing: np.ndarray, cited: np.ndarray,
+                 has_record: Optional[np.ndarray] = None) -> Tuple[SnapshotState, np.ndarray]:
+    """
+    Fold new papers and citation edges into state.
+
+    pub_years covers all papers of the new snapshot (the first
+    state.n_papers entries must be unchanged); citing/cited are the new
+    edges only. Returns the updated state and the rows whose citation
+    curves changed.
+    """
+    pub_years = np.asarray(pub_years)
+    n_old, n_new = state.n_papers, len(pub_years)
+    if n_new < n_old or not np.array_equal(pub_years[:n_old], state.pub_years):
+        raise ValueError("new snapshot must keep the existing papers and their years")
+
+    old = state.matrix
+    first_year = old.first_year
+    last_year = max(old.last_year, int(pub_years.max()))
+    n_years = last_year - first_year + 1
+
+    # Grow the matrix: new rows for new papers, new columns for new years
+    counts = np.zeros((n_new, n_years), dtype=np.int32)
+    counts[:n_old, :old.n_years] = old.counts
+    matrix = CitationMatrix(counts=counts, first_year=first_year)
+
+    citing = np.asarray(citing, dtype=np.int64)
+    cited = np.asarray(cited, dtype=np.int64)
+    cols = pub_years[citing].astype(np.int64) - first_year
+    keep = (cols >= 0) & (cols < n_years)
+    cells, added = np.unique(cited[keep] * n_years + cols[keep], return_counts=True)
+    rows, cols = cells // n_years, cells % n_years
+    counts[rows, cols] += added.astype(np.int32)
+
+    def grow(arr, dtype=np.int64):
+        out = np.zeros(n_new, dtype=dtype)
+        out[:n_old] = arr
+        return out
+
+    sums = {name: grow(getattr(state, name))
+            for name in ("early_y", "early_xy", "late_y", "late_xy")}
+    ages = cols - (pub_years[rows].astype(np.int64) - first_year)
+    _cell_sums(sums, rows, ages, added, n_new, state.early_end, state.late_start)
+
+    beauty = BeautyResult(beauty=grow(state.beauty.beauty, np.float64),
+                          peak_age=grow(state.beauty.peak_age),
+                          awakening_age=grow(state.beauty.awakening_age),
+                          peak_citations=grow(state.beauty.peak_citations))
+    changed = np.unique(rows)
+    if len(changed):
+        aligned, n_observed = age_aligned_counts(matrix, pub_years[changed], rows=changed)
+        _set_beauty(beauty, changed, beauty_coefficients(aligned, n_observed))
+
+    records = grow(state.has_record, bool) if has_record is None \
+        else np.asarray(has_record, dtype=bool)
+    updated = SnapshotState(matrix=matrix, pub_years=pub_years, has_record=records,
+                            beauty=beauty, early_end=state.early_end,
+                            late_start=state.late_start, **sums)
+    return updated, changed
+
+
+def update_from_graph(state: SnapshotState,
+                      graph: CitationGraph) -> Tuple[SnapshotState, np.ndarray]:
+    """apply_update() with the new papers and edges of a newer snapshot graph."""
+    citing, cited = new_edges(graph, state.n_papers)
+    return apply_update(state, np.asarray(graph.years), citing, cited,
+                        has_record=graph.has_record)
+
+
+# =============================================================================
+# PERSISTENCE
+# =============================================================================
+
+def _state_arrays(state: SnapshotState) -> dict:
+    arrays = {"counts": state.matrix.counts, "pub_years": state.pub_years,
+              "has_record": state.has_record}
+    for name in ("early_y", "early_xy", "late_y", "late_xy"):
+        arrays[name] = getattr(state, name)
+    for name in BeautyResult.__dataclass_fields__:
+        arrays[name] = getattr(state.beauty, name)
+    return arrays
+
+
+def save_state(state: SnapshotState, state_dir: Path):
+    """Write the state as .npy files plus state.json (each file replaced atomically)."""
+    state_dir = Path(state_dir)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    for name, arr in _state_arrays(state).items():
+        tmp = state_dir / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp, state_dir / f"{name}.npy")
+    meta = {"first_year": state.matrix.first_year, "current_year": state.current_year,
+            "early_end": state.early_end, "late_start": state.late_start,
+            "n_papers": state.n_papers}
+    (state_dir / META_FILE).write_text(json.dumps(meta, indent=2))
+
+
+def load_state(state_dir: Path) -> SnapshotState:
+    """Read a state written by save_state()."""
+    state_dir = Path(state_dir)
+    meta = json.loads((state_dir / META_FILE).read_text())
+    arrays = {name: np.load(state_dir / f"{name}.npy") for name in STATE_ARRAYS}
+    beauty = BeautyResult(**{name: arrays.pop(name)
+                             for name in BeautyResult.__dataclass_fields__})
+    matrix = CitationMatrix(counts=arrays.pop("counts"), first_year=meta["first_year"])
+    return SnapshotState(matrix=matrix, beauty=beauty, early_end=meta["early_end"],
+                         late_start=meta["late_start"], **arrays)
+
+
+if __name__ == "__main__":
+    import time
+
+    from sb_graph import load_citation_graph
+
+    if len(sys.argv) != 4 or sys.argv[1] not in ("init", "update"):
+        print(__doc__)
+        sys.exit(1)
+
+    mode, kg_path, state_dir = sys.argv[1], Path(sys.argv[2]), Path(sys.argv[3])
+    t0 = time.time()
+    graph = load_citation_graph(kg_path, convert=True)
+
+    if mode == "init":
+        state = build_state(graph)
+        print(f"    Built state for {state.n_papers} papers")
+    else:
+        old = load_state(state_dir)
+        state, changed = update_from_graph(old, graph)
+        print(f"    New papers: {state.n_papers - old.n_papers}")
+        print(f"    Papers with changed curves: {len(changed)}")
+        if state.current_year != old.current_year:
+            print(f"    Horizon moved: {old.current_year} -> {state.current_year}")
+
+    save_state(state, state_dir)
+    df = state.table()
+    print(f"    Current year (data horizon): {state.current_year}")
+    print(f"    SB candidates (slope criteria): {int(df['is_sb'].sum())}")
+    print(f"    Done in {time.time() - t0:.2f}s")
@@ -0,0 +1,157 @@
+"""
+sb_fetch against a local aiohttp.web mock of the ADS and Semantic Scholar
+endpoints: batching, retry on 429 / Retry-After, not-found caching and
+expiry, and that cached ids are never requested again.
+
+Usage:
+    python -m pytest test_sb_fetch.py
+"""
+
+import asyncio
+import re
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from sb_fetch import AdsFetcher, ResponseCache, SemanticScholarFetcher
+
+# arXiv id -> citing years (S2) / citing bibcodes (ADS); others are unknown
+KNOWN = {
+    "0802.0716": [2009, 2015, 2015],
+    "0901.0001": [2010],
+    "1001.0002": [],
+}
+BIBCODES = {"2008arXiv0802.0716H": "0802.0716"}
+FAST = {"rate": (10_000, 1.0), "backoff_base": 0.01, "verbose": False}
+
+
+class MockServer:
+    """Counts requests per path; the first `throttle` requests get a 429."""
+
+    def __init__(self, throttle: int = 0):
+        self.throttle = throttle
+        self.requests = []
+
+    def app(self) -> web.Application:
+        """A fresh application per event loop, sharing this server's state."""
+        app = web.Application()
+        app.router.add_post("/graph/v1/paper/batch", self.s2_batch)
+        app.router.add_get("/v1/search/query", self.ads_query)
+        app.router.add_post("/v1/search/bigquery", self.ads_bigquery)
+        return app
+
+    def _throttled(self, request) -> bool:
+        self.requests.append((request.path, dict(request.query)))
+        if self.throttle:
+            self.throttle -= 1
+            return True
+        return False
+
+    @staticmethod
+    def _ads_doc(arxiv_id):
+        return {"bibcode": f"{arxiv_id}-bib", "identifier": [f"arXiv:{arxiv_id}"],
+                "citation": [f"{y}ApJ...1....1X" for y in KNOWN[arxiv_id]]}
+
+    async def s2_batch(self, request):
+        if self._throttled(request):
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        ids = (await request.json())["ids"]
+        return web.json_response([
+            {"citations": [{"year": y} for y in KNOWN[pid[len("arXiv:"):]]]}
+            if pid[len("arXiv:"):] in KNOWN else None for pid in ids])
+
+    async def ads_query(self, request):
+        if self._throttled(request):
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        ids = re.findall(r'"arXiv:([^"]+)"', request.query["q"])
+        return web.json_response({"response": {"docs": [
+            self._ads_doc(pid) for pid in ids if pid in KNOWN]}})
+
+    async def ads_bigquery(self, request):
+        if self._throttled(request):
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        bibcodes = (await request.text()).split("\n")[1:]
+        docs = []
+        for bibcode in bibcodes:
+            if bibcode in BIBCODES:
+                doc = self._ads_doc(BIBCODES[bibcode])
+                docs.append(dict(doc, bibcode=bibcode))
+        return web.json_response({"response": {"docs": docs}})
+
+
+def fetch(server: MockServer, make_fetcher, ids):
+    """Run make_fetcher(base_url).fetch_async(ids) against the mock server."""
+    async def run():
+        runner = web.AppRunner(server.app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            fetcher = make_fetcher(f"http://127.0.0.1:{port}")
+            return fetcher, await fetcher.fetch_async(ids)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+
+IDS = ["0802.0716", "0901.0001", "1001.0002", "9999.9999", "9999.9998"]
+
+
+def test_s2_batches_and_cache(tmp_path):
+    server = MockServer()
+    cache = ResponseCache(tmp_path / "fetch.sqlite")
+    make = lambda url: SemanticScholarFetcher(base_url=url, batch_size=2, cache=cache, **FAST)
+
+    fetcher, curves = fetch(server, make, IDS)
+    assert fetcher.requests_sent == 3 and len(server.requests) == 3
+    assert curves["0802.0716"] == {2009: 1, 2015: 2}
+    assert curves["1001.0002"] == {}
+    assert curves["9999.9999"] is None
+
+    # Everything, including the not-found ids, now comes from the cache
+    fetcher, again = fetch(server, make, IDS)
+    assert fetcher.requests_sent == 0 and len(server.requests) == 3
+    assert again == curves
+
+
+def test_retry_after_429(tmp_path):
+    server = MockServer(throttle=2)
+    cache = ResponseCache(tmp_path / "fetch.sqlite")
+    fetcher, curves = fetch(server, lambda url: SemanticScholarFetcher(
+        base_url=url, batch_size=10, cache=cache, **FAST), IDS)
+    assert fetcher.requests_sent == 3
+    assert curves["0901.0001"] == {2010: 1}
+
+
+def test_ads_resolves_arxiv_ids(tmp_path):
+    server = MockServer()
+    cache = ResponseCache(tmp_path / "fetch.sqlite")
+    make = lambda url: AdsFetcher(token="x", base_url=url, query_batch_size=2,
+                                  cache=cache, **FAST)
+
+    fetcher, curves = fetch(server, make, IDS + ["2008arXiv0802.0716H"])
+    paths = [path for path, _ in server.requests]
+    assert paths.count("/v1/search/query") == 3 and paths.count("/v1/search/bigquery") == 1
+    assert curves["0802.0716"] == {2009: 1, 2015: 2}
+    assert curves["2008arXiv0802.0716H"] == {2009: 1, 2015: 2}
+    assert curves["9999.9998"] is None
+
+    fetcher, _ = fetch(server, make, IDS)
+    assert fetcher.requests_sent == 0
+
+
+def test_not_found_expires(tmp_path):
+    server = MockServer()
+    cache = ResponseCache(tmp_path / "fetch.sqlite")
+    fetch(server, lambda url: SemanticScholarFetcher(
+        base_url=url, batch_size=10, cache=cache, **FAST), IDS)
+
+    # miss_ttl=0: found ids stay cached, the two misses are asked for again
+    fetcher, curves = fetch(server, lambda url: SemanticScholarFetcher(
+        base_url=url, batch_size=10, cache=cache, miss_ttl=0, **FAST), IDS)
+    assert fetcher.requests_sent == 1
+    assert server.requests[-1][0] == "/graph/v1/paper/batch"
+    assert curves["9999.9999"] is None and curves["0901.0001"] == {2010: 1}